@@ -1,10 +1,11 @@
 from typing import Any, List
-from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.auth import get_current_active_user
+from app.core.principals import principal_cache
 from app.db.base import get_db
 from app.logger import logger
 from app.models.models import UserHomeAddress, User
@@ -108,6 +109,7 @@ def create_home_address(
     db.add(db_address)
     db.commit()
     db.refresh(db_address)
+    principal_cache.invalidate_home_fences(current_user.id)
     
     logger.info(
         "User %s created a new %s home address (ID: %d)", 
@@ -209,12 +211,13 @@ def update_home_address(
     for field, value in update_data.items():
         setattr(address, field, value)
     
-    # Update the updated_at timestamp
-    address.updated_at = datetime.now()
+    # Update the updated_at timestamp, from the database clock like the model default
+    address.updated_at = func.now()
     
     db.add(address)
     db.commit()
     db.refresh(address)
+    principal_cache.invalidate_home_fences(current_user.id)
     
     logger.info("User %s updated their %s home address (ID: %d)", 
                current_user.username, address.address_type, address.id)
@@ -252,6 +255,7 @@ def delete_home_address(
     
     db.delete(address)
     db.commit()
+    principal_cache.invalidate_home_fences(current_user.id)
     
     logger.info("User %s deleted their %s home address (ID: %d)", 
                current_user.username, address.address_type, address.id)
\ No newline at end of file
@@ -1,7 +1,14 @@
+import asyncio
+import json
+import threading
+import time
 from datetime import datetime
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from app.core.auth import (
@@ -9,22 +16,48 @@ from app.core.auth import (
     get_current_active_superadmin,
     get_password_hash,
 )
-from app.db.base import get_db
+from app.config import settings
+from app.core.check_in_search import check_ins_in_bounds, check_ins_within
+from app.core.coverage import analyze_coverage
+from app.core.events import event_bus
+from app.core.location_clusters import run_clustering, start_clustering_run
+from app.core.principals import principal_cache
+from app.core.profiling import (
+    PROFILE_TOKEN_HEADER,
+    ProfilingRoute,
+    create_profiling_token,
+    profile_store,
+)
+from app.db.base import SessionLocal, get_db
 from app.logger import logger
-from app.models.models import Office, User, UserLoginHistory, AttendanceRecord, UserHomeAddress
+from app.models.models import (
+    Office, User, UserLoginHistory, AttendanceRecord, UserHomeAddress, LocationCluster, LocationClusterRun,
+)
 from app.schemas.schemas import (
     AdminUserCreate,
+    AdminUserHomeAddressCreate,
+    AdminUserHomeAddressUpdate,
     AdminUserUpdate,
+    CheckInSearch,
+    GeofenceCoverage,
+    LocationCluster as LocationClusterSchema,
+    LocationClusterRun as LocationClusterRunSchema,
     LoginHistory,
+    MAX_CHECK_IN_SEARCH_RESULTS,
     OfficeCreate,
     OfficeUpdate,
+    ProfileSummary,
+    ProfilingToken,
     UserExtended,
-    UserHomeAddressCreate,
-    UserHomeAddressUpdate,
     UserHomeAddress as UserHomeAddressSchema,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
+
+# Dashboard statistics shared by the live feed streams of this worker
+_LIVE_STATS_TTL_SECONDS = 5.0
+_live_stats: Optional[Tuple[float, int, Dict[str, Any]]] = None  # (expires at, last event ID, stats)
+_live_stats_lock = threading.Lock()
 
 
 # User Management Endpoints (Admin only)
@@ -108,6 +141,7 @@ def create_user(
         is_admin=user_in.is_admin,
         is_super_admin=False,  # Only manually set in database for first super admin
         created_by=current_admin.id,
+        session_limit_hours=user_in.session_limit_hours,
     )
     
     db.add(db_user)
@@ -204,6 +238,7 @@ def update_user(
     db.add(user)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user.id)
     
     logger.info("Admin %s updated user %s", current_admin.username, user.username)
     return user
@@ -255,6 +290,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user.id)
     
     logger.info("Admin %s deleted user %s", current_admin.username, user.username)
 
@@ -304,7 +340,7 @@ def create_user_home_address(
     *,
     db: Session = Depends(get_db),
     user_id: int,
-    address_in: UserHomeAddressCreate,
+    address_in: AdminUserHomeAddressCreate,
     current_admin: User = Depends(get_current_active_admin),
 ) -> Any:
     """Create a new home address for a user (admin only).
@@ -358,12 +394,14 @@ def create_user_home_address(
         postal_code=address_in.postal_code,
         latitude=address_in.latitude,
         longitude=address_in.longitude,
+        radius=address_in.radius,
         is_current=address_in.is_current,
     )
     
     db.add(db_address)
     db.commit()
     db.refresh(db_address)
+    principal_cache.invalidate_home_fences(user_id)
     
     logger.info(
         "Admin %s created %s home address for user %s", 
@@ -428,7 +466,7 @@ def update_user_home_address(
     db: Session = Depends(get_db),
     user_id: int,
     address_id: int,
-    address_in: UserHomeAddressUpdate,
+    address_in: AdminUserHomeAddressUpdate,
     current_admin: User = Depends(get_current_active_admin),
 ) -> Any:
     """Update a home address for a user (admin only).
@@ -492,11 +530,12 @@ def update_user_home_address(
     for field, value in update_data.items():
         setattr(address, field, value)
     
-    address.updated_at = datetime.now()
+    address.updated_at = func.now()
     
     db.add(address)
     db.commit()
     db.refresh(address)
+    principal_cache.invalidate_home_fences(user_id)
     
     logger.info(
         "Admin %s updated %s home address for user %s", 
@@ -549,6 +588,7 @@ def delete_user_home_address(
     
     db.delete(address)
     db.commit()
+    principal_cache.invalidate_home_fences(user_id)
     
     logger.info(
         "Admin %s deleted %s home address for user %s", 
@@ -595,16 +635,11 @@ def get_login_history(
 
 
 # Dashboard Stats Endpoint
-@router.get("/dashboard-stats")
-def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_admin: User = Depends(get_current_active_admin),
-) -> Any:
-    """Get dashboard statistics (admin only).
+def _dashboard_stats(db: Session) -> Dict[str, Any]:
+    """Compute the dashboard statistics.
     
     Args:
         db: Database session
-        current_admin: Current authenticated admin user
     
     Returns:
         Dashboard statistics
@@ -677,6 +712,409 @@ def get_dashboard_stats(
             "today": today_logins
         }
     }
+    return stats
+
+
+@router.get("/dashboard-stats")
+def get_dashboard_stats(
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Get dashboard statistics (admin only).
+    
+    Args:
+        db: Database session
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Dashboard statistics
+    """
+    stats = _dashboard_stats(db)
     
     logger.info("Admin %s retrieved dashboard stats", current_admin.username)
-    return stats
\ No newline at end of file
+    return stats
+
+
+@router.get("/geofence-coverage", response_model=GeofenceCoverage)
+def get_geofence_coverage(
+    db: Session = Depends(get_db),
+    since: Optional[datetime] = None,
+    cell_meters: float = Query(200.0, ge=10, le=10000),
+    top: int = Query(20, ge=1, le=1000),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Analyze office geofences for overlaps and coverage of historical check-ins (admin only).
+    
+    Args:
+        db: Database session
+        since: Only analyze check-ins from this time on
+        cell_meters: Size of the grid cells uncovered check-ins are counted in
+        top: Number of uncovered cells to report
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Overlapping geofences, check-ins per office and the densest cells of
+        check-ins outside every geofence
+    """
+    coverage = analyze_coverage(db, cell_meters=cell_meters, top=top, since=since)
+    
+    logger.info("Admin %s analyzed geofence coverage of %d check-ins", current_admin.username, coverage.check_ins)
+    return coverage
+
+
+@router.get("/check-ins/nearby", response_model=CheckInSearch)
+def search_check_ins_nearby(
+    db: Session = Depends(get_db),
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(..., gt=0, le=100000),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(500, ge=1, le=MAX_CHECK_IN_SEARCH_RESULTS),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Find historical check-ins within a distance of a location (admin only).
+    
+    Args:
+        db: Database session
+        lat: Latitude of the location
+        lon: Longitude of the location
+        radius: Distance from the location in meters
+        since: Only find check-ins from this time on
+        until: Only find check-ins before this time
+        limit: Maximum number of check-ins to return
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Latest check-ins within the distance, with their distances
+    """
+    search = check_ins_within(db, lat, lon, radius, since=since, until=until, limit=limit)
+    
+    logger.info(
+        "Admin %s found %d check-ins within %.0fm of (%f, %f)",
+        current_admin.username, len(search.check_ins), radius, lat, lon
+    )
+    return search
+
+
+@router.get("/check-ins/in-bounds", response_model=CheckInSearch)
+def search_check_ins_in_bounds(
+    db: Session = Depends(get_db),
+    min_lat: float = Query(..., ge=-90, le=90),
+    max_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lon: float = Query(..., ge=-180, le=180),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(500, ge=1, le=MAX_CHECK_IN_SEARCH_RESULTS),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Find historical check-ins inside a bounding box (admin only).
+    
+    Args:
+        db: Database session
+        min_lat: Southern edge of the box
+        max_lat: Northern edge of the box
+        min_lon: Western edge of the box, greater than max_lon for boxes crossing the antimeridian
+        max_lon: Eastern edge of the box
+        since: Only find check-ins from this time on
+        until: Only find check-ins before this time
+        limit: Maximum number of check-ins to return
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Latest check-ins inside the box
+    
+    Raises:
+        HTTPException: If the southern edge is north of the northern edge
+    """
+    if min_lat > max_lat:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_lat must not be greater than max_lat",
+        )
+    
+    search = check_ins_in_bounds(db, min_lat, max_lat, min_lon, max_lon, since=since, until=until, limit=limit)
+    
+    logger.info(
+        "Admin %s found %d check-ins in (%f, %f, %f, %f)",
+        current_admin.username, len(search.check_ins), min_lat, max_lat, min_lon, max_lon
+    )
+    return search
+
+
+@router.post("/location-clusters", response_model=LocationClusterRunSchema, status_code=status.HTTP_202_ACCEPTED)
+def run_location_clustering(
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    eps_meters: float = Query(settings.LOCATION_CLUSTER_EPS_METERS, ge=10, le=10000),
+    min_check_ins: int = Query(settings.LOCATION_CLUSTER_MIN_CHECK_INS, ge=1),
+    since: Optional[datetime] = None,
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Start clustering check-ins at other locations, replacing the stored clusters (admin only).
+    
+    The run continues in the background after the response; its progress
+    is available from /admin/location-clusters/runs/{run_id}.
+    
+    Args:
+        background_tasks: Tasks run after the response is sent
+        db: Database session
+        eps_meters: Distance within which check-ins are neighbors
+        min_check_ins: Check-ins within eps_meters of each other needed to grow a cluster
+        since: Only cluster check-ins from this time on
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        The started clustering run
+    
+    Raises:
+        HTTPException: If a clustering run is already in progress
+    """
+    run = start_clustering_run(
+        db, eps_meters=eps_meters, min_check_ins=min_check_ins, since=since, requested_by=current_admin.id
+    )
+    background_tasks.add_task(run_clustering, run.id)
+    
+    logger.info("Admin %s started location clustering run %d", current_admin.username, run.id)
+    return run
+
+
+@router.get("/location-clusters/runs", response_model=List[LocationClusterRunSchema])
+def get_location_clustering_runs(
+    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=100),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Get the latest clustering runs (admin only).
+    
+    Args:
+        db: Database session
+        limit: Maximum number of runs to return
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Clustering runs, latest first
+    """
+    return db.query(LocationClusterRun).order_by(LocationClusterRun.id.desc()).limit(limit).all()
+
+
+@router.get("/location-clusters/runs/{run_id}", response_model=LocationClusterRunSchema)
+def get_location_clustering_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Get a clustering run (admin only).
+    
+    Args:
+        run_id: ID of the run
+        db: Database session
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        The clustering run
+    
+    Raises:
+        HTTPException: If the run is not found
+    """
+    run = db.query(LocationClusterRun).filter(LocationClusterRun.id == run_id).first()
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Clustering run not found"
+        )
+    return run
+
+
+@router.get("/location-clusters", response_model=List[LocationClusterSchema])
+def get_location_clusters(
+    db: Session = Depends(get_db),
+    min_check_ins: int = Query(1, ge=1),
+    min_users: int = Query(1, ge=1),
+    min_office_distance: Optional[float] = Query(None, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Get the clusters of check-ins at other locations from the latest run (admin only).
+    
+    Args:
+        db: Database session
+        min_check_ins: Only return clusters with at least this many check-ins
+        min_users: Only return clusters visited by at least this many users
+        min_office_distance: Only return clusters at least this many meters from every office geofence
+        limit: Maximum number of clusters to return
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Clusters, most check-ins first
+    """
+    query = db.query(LocationCluster).filter(
+        LocationCluster.check_ins >= min_check_ins,
+        LocationCluster.users >= min_users,
+    )
+    if min_office_distance is not None:
+        query = query.filter(or_(
+            LocationCluster.nearest_office_distance.is_(None),
+            LocationCluster.nearest_office_distance >= min_office_distance,
+        ))
+    clusters = query.order_by(LocationCluster.check_ins.desc(), LocationCluster.id).limit(limit).all()
+    
+    logger.info("Admin %s retrieved %d location clusters", current_admin.username, len(clusters))
+    return clusters
+
+
+def _live_snapshot() -> Tuple[int, Dict[str, Any]]:
+    """Get dashboard statistics for live feed snapshots.
+    
+    Shared by every stream of this worker for a few seconds as long as no
+    event was published meanwhile, so many open admin screens do not each
+    query the database and no stream is sent counters older than its deltas.
+    
+    Returns:
+        ID of the latest event published before the statistics were read,
+        and the statistics
+    """
+    global _live_stats
+    
+    with _live_stats_lock:
+        if (
+            _live_stats is None
+            or time.monotonic() >= _live_stats[0]
+            or _live_stats[1] != event_bus.last_id
+        ):
+            last_id = event_bus.last_id
+            db = SessionLocal()
+            try:
+                _live_stats = (time.monotonic() + _LIVE_STATS_TTL_SECONDS, last_id, _dashboard_stats(db))
+            finally:
+                db.close()
+        return _live_stats[1], _live_stats[2]
+
+
+@router.get("/live")
+async def live_feed(
+    db: Session = Depends(get_db),
+    current_admin: User = Depends(get_current_active_admin),
+) -> StreamingResponse:
+    """Stream live attendance and login events (admin only).
+    
+    A Server-Sent Events stream that starts with a "snapshot" event holding
+    the same statistics as /dashboard-stats, followed by "check_in",
+    "check_out", "login" and "logout" events carrying the counter deltas
+    they cause. Only this worker's events are streamed, so the snapshot is
+    repeated every LIVE_FEED_SNAPSHOT_SECONDS, and right away if the client
+    fell behind, to bring the counters back in line.
+    
+    Args:
+        db: Database session
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Event stream
+    """
+    # Return the connection to the pool; the session would otherwise keep it for the whole stream
+    db.close()
+    subscription = event_bus.subscribe()
+    loop = asyncio.get_running_loop()
+    
+    async def stream():
+        next_snapshot = loop.time()
+        snapshot_id = 0
+        try:
+            while True:
+                if subscription.overflowed or loop.time() >= next_snapshot:
+                    snapshot_id, stats = await run_in_threadpool(_live_snapshot)
+                    # Events published before the snapshot are already part of it
+                    subscription.discard_through(snapshot_id)
+                    yield f"event: snapshot\ndata: {json.dumps(stats)}\n\n"
+                    next_snapshot = loop.time() + settings.LIVE_FEED_SNAPSHOT_SECONDS
+                
+                timeout = min(settings.LIVE_FEED_HEARTBEAT_SECONDS, max(next_snapshot - loop.time(), 0.0))
+                event = await subscription.get(timeout)
+                if event is not None and event.id <= snapshot_id:
+                    # Delivered after the snapshot but counted in it
+                    continue
+                # A comment line keeps proxies from closing an idle stream
+                yield event.to_sse() if event is not None else ": keepalive\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+            logger.info("Admin %s closed the live feed", current_admin.username)
+    
+    logger.info("Admin %s opened the live feed", current_admin.username)
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Profiling Endpoints
+@router.post("/profiles/token", response_model=ProfilingToken)
+def create_profile_token(
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Issue a short-lived token for profiling the admin's own requests (admin only).
+    
+    Args:
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Profiling token and the header to send it in
+    
+    Raises:
+        HTTPException: If profiling is disabled
+    """
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled"
+        )
+    
+    logger.info("Admin %s requested a profiling token", current_admin.username)
+    return {
+        "profile_token": create_profiling_token(current_admin.id),
+        "header": PROFILE_TOKEN_HEADER,
+        "expires_in": settings.PROFILING_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+def get_profiles(
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """List stored request profiles, newest first (admin only).
+    
+    Args:
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Profile summaries
+    """
+    return profile_store.list()
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(
+    profile_id: str,
+    current_admin: User = Depends(get_current_active_admin),
+) -> Any:
+    """Get a request profile as collapsed stacks (admin only).
+    
+    The output can be rendered with flamegraph.pl or opened in speedscope.
+    
+    Args:
+        profile_id: Profile ID from the X-Profile-Id response header
+        current_admin: Current authenticated admin user
+    
+    Returns:
+        Collapsed stacks, one "frame;frame count" line per distinct stack
+    
+    Raises:
+        HTTPException: If the profile does not exist or was evicted
+    """
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    
+    return PlainTextResponse(profile.collapsed())
@@ -1,25 +1,36 @@
 from datetime import datetime, timedelta
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import and_
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.core.auth import get_current_active_user
+from app.core.events import attendance_event, event_bus
 from app.core.geofence import GeofenceService
+from app.core.idempotency import IdempotencyService
+from app.core.profiling import ProfilingRoute
+from app.core.occupancy import occupancy
+from app.core.principals import principal_cache
+from app.core.scheduler import session_expiry
 from app.db.base import get_db
 from app.logger import logger
 from app.models.models import AttendanceRecord, Office, User, UserHomeAddress
 from app.schemas.schemas import (
     AttendanceRecord as AttendanceRecordSchema,
+    AttendanceSyncRequest,
+    AttendanceSyncResult,
     CheckInCreate,
     CheckOutCreate,
     GeofenceStatus,
     LocationCheck,
     LocationType,
+    SyncEventStatus,
+    SyncEventType,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 
 @router.post("/check-location", response_model=List[GeofenceStatus])
@@ -51,18 +62,21 @@ def check_location(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Office not found"
             )
             
-        status = GeofenceService.check_within_geofence(
+        geofence_status = GeofenceService.check_within_geofence(
             location_data.latitude, location_data.longitude, office
         )
-        status.location_type = LocationType.OFFICE
-        results.append(status)
+        geofence_status.location_type = LocationType.OFFICE
+        results.append(geofence_status)
     
     # Check against home address if home_address_id is provided
     elif location_data.home_address_id:
-        home_address = db.query(UserHomeAddress).filter(
-            UserHomeAddress.id == location_data.home_address_id,
-            UserHomeAddress.user_id == current_user.id
-        ).first()
+        home_address = next(
+            (
+                home for home in principal_cache.home_fences(db, current_user.id)
+                if home.id == location_data.home_address_id
+            ),
+            None,
+        )
         
         if not home_address:
             logger.warning(
@@ -72,64 +86,51 @@ def check_location(
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Home address not found"
             )
+        if home_address.latitude is None or home_address.longitude is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Home address has no location"
+            )
             
-        status = GeofenceService.check_within_home_geofence(
+        geofence_status = GeofenceService.check_within_home_geofence(
             location_data.latitude, location_data.longitude, home_address
         )
-        status.location_type = LocationType.HOME
-        status.home_address_id = home_address.id
-        status.address_type = home_address.address_type
-        results.append(status)
+        geofence_status.location_type = LocationType.HOME
+        geofence_status.home_address_id = home_address.id
+        geofence_status.address_type = home_address.address_type
+        results.append(geofence_status)
     
     # Otherwise, check against all offices and user's home addresses
     else:
-        # Check all offices
-        office_results = GeofenceService.check_all_geofences(
-            db, location_data.latitude, location_data.longitude
+        results = GeofenceService.check_all_geofences(
+            db, location_data.latitude, location_data.longitude,
+            principal_cache.home_fences(db, current_user.id),
+            k=location_data.k,
+            max_distance=location_data.max_distance,
         )
-        for result in office_results:
-            result.location_type = LocationType.OFFICE
-            results.append(result)
-        
-        # Check user's home addresses
-        home_addresses = db.query(UserHomeAddress).filter(
-            UserHomeAddress.user_id == current_user.id,
-            UserHomeAddress.is_current == True
-        ).all()
-        
-        for home in home_addresses:
-            if home.latitude and home.longitude:
-                status = GeofenceService.check_within_home_geofence(
-                    location_data.latitude, location_data.longitude, home
-                )
-                status.location_type = LocationType.HOME
-                status.home_address_id = home.id
-                status.address_type = home.address_type
-                results.append(status)
     
-    logger.info(
+    logger.debug(
         "Location check for user %s at (%f, %f): %d locations checked",
         current_user.username, location_data.latitude, location_data.longitude, len(results)
     )
     return results
 
 
-@router.post("/check-in", response_model=AttendanceRecordSchema)
-def check_in(
-    *,
-    db: Session = Depends(get_db),
-    check_in_data: CheckInCreate,
-    current_user: User = Depends(get_current_active_user),
-) -> Any:
-    """Check in to an office or home location.
+def _build_check_in_record(
+    db: Session,
+    current_user: User,
+    check_in_data: Any,
+    check_in_time: datetime,
+) -> Tuple[AttendanceRecord, str]:
+    """Validate a check-in and build its attendance record.
     
     Args:
         db: Database session
-        check_in_data: Check-in data
         current_user: Current authenticated user
+        check_in_data: Check-in data (a CheckInCreate or a synced check-in event)
+        check_in_time: Time to record as the check-in time
     
     Returns:
-        Created attendance record
+        Tuple of the new (not yet added) attendance record and a location name for logging
     
     Raises:
         HTTPException: If location not found or user not within geofence
@@ -188,7 +189,7 @@ def check_in(
             user_id=current_user.id,
             office_id=office.id,
             location_type=LocationType.OFFICE,
-            check_in_time=datetime.now(),
+            check_in_time=check_in_time,
             check_in_latitude=check_in_data.latitude,
             check_in_longitude=check_in_data.longitude,
         )
@@ -239,7 +240,7 @@ def check_in(
             user_id=current_user.id,
             home_address_id=home_address.id,
             location_type=LocationType.HOME,
-            check_in_time=datetime.now(),
+            check_in_time=check_in_time,
             check_in_latitude=check_in_data.latitude,
             check_in_longitude=check_in_data.longitude,
         )
@@ -251,16 +252,203 @@ def check_in(
         attendance_record = AttendanceRecord(
             user_id=current_user.id,
             location_type=LocationType.OTHER,
-            check_in_time=datetime.now(),
+            check_in_time=check_in_time,
             check_in_latitude=check_in_data.latitude,
             check_in_longitude=check_in_data.longitude,
         )
         
         location_name = "Other location"
     
+    return attendance_record, location_name
+
+
+def _apply_check_out(
+    db: Session,
+    current_user: User,
+    check_out_data: Any,
+    check_out_time: datetime,
+) -> AttendanceRecord:
+    """Close the user's active attendance record.
+    
+    Args:
+        db: Database session
+        current_user: Current authenticated user
+        check_out_data: Check-out data (a CheckOutCreate or a synced check-out event)
+        check_out_time: Time to record as the check-out time
+    
+    Returns:
+        Updated (not yet committed) attendance record
+    
+    Raises:
+        HTTPException: If no active check-in found
+    """
+    # Find active attendance record
+    attendance_record = db.query(AttendanceRecord).filter(
+        AttendanceRecord.user_id == current_user.id,
+        AttendanceRecord.check_out_time.is_(None)
+    ).first()
+    
+    if not attendance_record:
+        logger.warning("User %s attempted check-out without active check-in", current_user.username)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active check-in found. Please check in first.",
+        )
+    
+    if check_out_time < attendance_record.check_in_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Check-out time cannot be earlier than the check-in time.",
+        )
+    
+    # Update the record with check-out data
+    attendance_record.check_out_time = check_out_time
+    attendance_record.check_out_latitude = check_out_data.latitude
+    attendance_record.check_out_longitude = check_out_data.longitude
+    
+    db.add(attendance_record)
+    return attendance_record
+
+
+def _location_name(record: AttendanceRecord) -> str:
+    """Get a human readable location name for an attendance record.
+    
+    Args:
+        record: Attendance record
+    
+    Returns:
+        Location name for logging
+    """
+    location_name = "Unknown"
+    if record.location_type == LocationType.OFFICE and record.office:
+        location_name = record.office.name
+    elif record.location_type == LocationType.HOME and record.home_address:
+        location_name = f"Home ({record.home_address.address_type})"
+    elif record.location_type == LocationType.OTHER:
+        location_name = "Other location"
+    return location_name
+
+
+def _local_time(timestamp: datetime) -> datetime:
+    """Convert a client timestamp to the naive local time used in the database.
+    
+    Args:
+        timestamp: Timestamp sent by the client, with or without timezone
+    
+    Returns:
+        Naive datetime in server local time
+    """
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+
+def _replay_after_conflict(
+    db: Session, current_user: User, idempotency_key: str, endpoint: str
+) -> AttendanceRecord:
+    """Resolve a lost race between two requests sharing an idempotency key.
+    
+    Args:
+        db: Database session
+        current_user: Current authenticated user
+        idempotency_key: Client-supplied idempotency key
+        endpoint: Name of the operation the key is used for
+    
+    Returns:
+        The attendance record written by the request that won the race
+    
+    Raises:
+        HTTPException: If the winning request's record cannot be found
+    """
+    db.rollback()
+    replay = IdempotencyService.get_replay(db, current_user.id, idempotency_key, endpoint)
+    
+    if replay is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A concurrent request is being processed. Please retry.",
+        )
+    return replay
+
+
+def _publish(record: AttendanceRecord, current_user: User) -> None:
+    """Announce a committed check-in or check-out on the live feed.
+    
+    Args:
+        record: Attendance record that was just checked in or out
+        current_user: Owner of the record
+    """
+    event_bus.publish(*attendance_event(record, current_user.username))
+
+
+def _track_session(record: AttendanceRecord, current_user: User) -> None:
+    """Keep the session expiry scheduler and occupancy counts in sync with a committed record.
+    
+    Args:
+        record: Attendance record that was just checked in or out
+        current_user: Owner of the record
+    """
+    occupancy.track(record)
+    if record.check_out_time is not None:
+        session_expiry.cancel(record.id)
+        return
+    
+    office_limit = record.office.session_limit_hours if record.office else None
+    session_expiry.schedule(
+        record.id,
+        session_expiry.deadline_for(
+            record.check_in_time, current_user.session_limit_hours, office_limit
+        ),
+    )
+
+
+@router.post("/check-in", response_model=AttendanceRecordSchema)
+def check_in(
+    *,
+    db: Session = Depends(get_db),
+    check_in_data: CheckInCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """Check in to an office or home location.
+    
+    Retried requests carrying the same Idempotency-Key header return the
+    originally created record instead of failing.
+    
+    Args:
+        db: Database session
+        check_in_data: Check-in data
+        idempotency_key: Optional client-supplied key to deduplicate retries
+        current_user: Current authenticated user
+    
+    Returns:
+        Created attendance record
+    
+    Raises:
+        HTTPException: If location not found or user not within geofence
+    """
+    if idempotency_key:
+        replay = IdempotencyService.get_replay(db, current_user.id, idempotency_key, "check_in")
+        if replay is not None:
+            return replay
+    
+    attendance_record, location_name = _build_check_in_record(
+        db, current_user, check_in_data, datetime.now()
+    )
+    
     db.add(attendance_record)
-    db.commit()
+    if idempotency_key:
+        IdempotencyService.remember(db, current_user.id, idempotency_key, "check_in", attendance_record)
+    
+    try:
+        db.commit()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        return _replay_after_conflict(db, current_user, idempotency_key, "check_in")
     db.refresh(attendance_record)
+    _track_session(attendance_record, current_user)
+    _publish(attendance_record, current_user)
     
     logger.info(
         "User %s checked in at %s (Record ID: %d)",
@@ -275,13 +463,18 @@ def check_out(
     *,
     db: Session = Depends(get_db),
     check_out_data: CheckOutCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64),
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """Check out from any location.
     
+    Retried requests carrying the same Idempotency-Key header return the
+    originally closed record instead of failing.
+    
     Args:
         db: Database session
         check_out_data: Check-out data
+        idempotency_key: Optional client-supplied key to deduplicate retries
         current_user: Current authenticated user
     
     Returns:
@@ -290,109 +483,180 @@ def check_out(
     Raises:
         HTTPException: If no active check-in found
     """
-    # Find active attendance record
-    attendance_record = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.check_out_time.is_(None)
-    ).first()
+    if idempotency_key:
+        replay = IdempotencyService.get_replay(db, current_user.id, idempotency_key, "check_out")
+        if replay is not None:
+            return replay
     
-    if not attendance_record:
-        logger.warning("User %s attempted check-out without active check-in", current_user.username)
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active check-in found. Please check in first.",
-        )
-    
-    # Update the record with check-out data
-    attendance_record.check_out_time = datetime.now()
-    attendance_record.check_out_latitude = check_out_data.latitude
-    attendance_record.check_out_longitude = check_out_data.longitude
+    attendance_record = _apply_check_out(db, current_user, check_out_data, datetime.now())
+    if idempotency_key:
+        IdempotencyService.remember(db, current_user.id, idempotency_key, "check_out", attendance_record)
     
-    db.add(attendance_record)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        if not idempotency_key:
+            raise
+        return _replay_after_conflict(db, current_user, idempotency_key, "check_out")
     db.refresh(attendance_record)
-    
-    # Determine location name for logging
-    location_name = "Unknown"
-    if attendance_record.location_type == LocationType.OFFICE and attendance_record.office:
-        location_name = attendance_record.office.name
-    elif attendance_record.location_type == LocationType.HOME and attendance_record.home_address:
-        location_name = f"Home ({attendance_record.home_address.address_type})"
-    elif attendance_record.location_type == LocationType.OTHER:
-        location_name = "Other location"
+    _track_session(attendance_record, current_user)
+    _publish(attendance_record, current_user)
     
     logger.info(
         "User %s checked out from %s (Record ID: %d)",
-        current_user.username, location_name, attendance_record.id
+        current_user.username, _location_name(attendance_record), attendance_record.id
     )
     
     return attendance_record
 
 
-@router.post("/auto-logout", response_model=List[AttendanceRecordSchema])
-async def auto_logout_expired_sessions(
+@router.post("/sync", response_model=List[AttendanceSyncResult])
+def sync_offline_events(
     *,
     db: Session = Depends(get_db),
+    sync_data: AttendanceSyncRequest,
+    current_user: User = Depends(get_current_active_user),
 ) -> Any:
-    """Automatically log out users whose sessions have been active for more than 2 hours.
+    """Apply a queue of attendance events captured while the client was offline.
     
-    This endpoint can be called by a scheduled task or cron job.
+    Events are applied in timestamp order within a single transaction. Every
+    event carries an idempotency key, so re-sending a queue that was partly or
+    fully applied before is safe: known keys are reported as duplicates.
+    Events that fail validation are reported as rejected and do not stop the
+    remaining events from being applied.
     
     Args:
         db: Database session
+        sync_data: Queued offline events
+        current_user: Current authenticated user
     
     Returns:
-        List of updated attendance records
+        One result per submitted event, in the order they were applied
+    
+    Raises:
+        HTTPException: If the queue is too large or conflicts with a concurrent sync
     """
-    # Calculate the cutoff time (2 hours ago)
-    cutoff_time = datetime.now() - timedelta(hours=2)
-    
-    # Find all active attendance records older than 2 hours
-    expired_records = db.query(AttendanceRecord).filter(
-        and_(
-            AttendanceRecord.check_out_time.is_(None),
-            AttendanceRecord.check_in_time < cutoff_time
+    if len(sync_data.events) > settings.ATTENDANCE_SYNC_MAX_EVENTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.ATTENDANCE_SYNC_MAX_EVENTS} events can be synced at once.",
         )
-    ).all()
     
-    updated_records = []
+    now = datetime.now()
+    oldest_allowed = now - timedelta(hours=settings.ATTENDANCE_SYNC_MAX_EVENT_AGE_HOURS)
+    newest_allowed = now + timedelta(seconds=settings.ATTENDANCE_SYNC_MAX_CLOCK_SKEW_SECONDS)
     
-    for record in expired_records:
-        # Update the record with auto-logout data
-        record.check_out_time = datetime.now()
-        # Maintain the same location as check-in for auto-logout
-        record.check_out_latitude = record.check_in_latitude
-        record.check_out_longitude = record.check_in_longitude
+    results = []
+    applied_records = []
+    seen_keys = set()
+    
+    for event in sorted(sync_data.events, key=lambda e: _local_time(e.timestamp)):
+        result = AttendanceSyncResult(
+            idempotency_key=event.idempotency_key,
+            event_type=event.event_type,
+            status=SyncEventStatus.REJECTED,
+        )
+        results.append(result)
+        
+        if event.idempotency_key in seen_keys:
+            result.status = SyncEventStatus.DUPLICATE
+            continue
+        seen_keys.add(event.idempotency_key)
         
-        db.add(record)
-        updated_records.append(record)
+        event_time = _local_time(event.timestamp)
+        if not oldest_allowed <= event_time <= newest_allowed:
+            result.detail = "Event timestamp is outside the accepted sync window."
+            continue
+        # Never record attendance in the future because of client clock skew
+        event_time = min(event_time, now)
         
-        # Determine location name for logging
-        location_name = "Unknown"
-        if record.location_type == LocationType.OFFICE and record.office:
-            location_name = record.office.name
-        elif record.location_type == LocationType.HOME and record.home_address:
-            location_name = f"Home ({record.home_address.address_type})"
-        elif record.location_type == LocationType.OTHER:
-            location_name = "Other location"
+        try:
+            replay = IdempotencyService.get_replay(
+                db, current_user.id, event.idempotency_key, event.event_type.value
+            )
+            if replay is not None:
+                result.status = SyncEventStatus.DUPLICATE
+                result.record = AttendanceRecordSchema.from_orm(replay)
+                continue
+            
+            if event.event_type == SyncEventType.CHECK_IN:
+                record, _ = _build_check_in_record(db, current_user, event, event_time)
+                db.add(record)
+            else:
+                record = _apply_check_out(db, current_user, event, event_time)
+            
+            IdempotencyService.remember(
+                db, current_user.id, event.idempotency_key, event.event_type.value, record
+            )
+            # Flush so that later events in the queue see this one
+            db.flush()
+        except HTTPException as e:
+            result.detail = e.detail
+            continue
         
+        result.status = SyncEventStatus.APPLIED
+        applied_records.append((result, record))
+    
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        logger.warning("Offline sync for user %s conflicted with a concurrent request", current_user.username)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A concurrent request is being processed. Please retry.",
+        )
+    
+    for result, record in applied_records:
+        db.refresh(record)
+        _track_session(record, current_user)
+        _publish(record, current_user)
+        result.record = AttendanceRecordSchema.from_orm(record)
+    
+    logger.info(
+        "Synced %d offline events for user %s (%d applied)",
+        len(results), current_user.username, len(applied_records)
+    )
+    return results
+
+
+@router.post("/auto-logout", response_model=List[AttendanceRecordSchema])
+async def auto_logout_expired_sessions(
+    *,
+    db: Session = Depends(get_db),
+) -> Any:
+    """Automatically log out users whose sessions have exceeded their session limit.
+    
+    The in-process session expiry scheduler normally closes sessions at their
+    deadline; this endpoint can still be called by an external cron job.
+    Sessions are closed at their deadline rather than at the time of the call.
+    
+    Args:
+        db: Database session
+    
+    Returns:
+        List of updated attendance records
+    """
+    updated_records = session_expiry.close_overdue(db)
+    
+    for record in updated_records:
+        session_expiry.cancel(record.id)
         logger.info(
-            "User %s auto-logged out from %s after 2 hours (Record ID: %d)",
+            "User %s auto-logged out from %s at session limit (Record ID: %d)",
             record.user.username,
-            location_name,
+            _location_name(record),
             record.id
         )
     
     if updated_records:
-        db.commit()
-        for record in updated_records:
-            db.refresh(record)
-        
         logger.info(
-            "Auto-logout completed for %d users after 2-hour session limit",
+            "Auto-logout completed for %d users after reaching their session limit",
             len(updated_records)
         )
     
+    # Piggyback on the periodic run to keep the dedupe table small
+    IdempotencyService.purge_expired(db)
+    
     return updated_records
 
 
@@ -423,6 +687,7 @@ async def check_out_with_auto_logout(
     return check_out(
         db=db,
         check_out_data=check_out_data,
+        idempotency_key=None,
         current_user=current_user
     )
 
@@ -463,7 +728,7 @@ def get_attendance_history(
         AttendanceRecord.check_in_time.desc()
     ).offset(skip).limit(limit).all()
     
-    logger.info(
+    logger.debug(
         "Retrieved %d attendance records for user %s%s",
         len(records), 
         current_user.username,
@@ -1,3 +1,4 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Any, Optional, List, Dict
 
@@ -12,15 +13,20 @@ from app.core.auth import (
     get_password_hash,
     verify_password,
     get_current_user,
-    get_current_active_admin
+    get_current_active_admin,
+    get_token_payload,
 )
 from app.db.base import get_db
+from app.core.audit import login_audit
+from app.core.events import event_bus
+from app.core.profiling import ProfilingRoute
 from app.core.ldap import LDAPAuth
+from app.core.revocation import revoked_tokens
 from app.logger import logger
 from app.models.models import User, UserLoginHistory
-from app.schemas.schemas import Token, User as UserSchema, UserCreate, LoginHistory
+from app.schemas.schemas import Token, TokenPayload, User as UserSchema, UserCreate, LoginHistory
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 
 @router.post("/register", response_model=UserSchema)
@@ -170,26 +176,28 @@ def login_for_access_token(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
 
-    # Update last login time and log login attempt
-    user.last_login = datetime.now()
-    client_host = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent")
+    # The session ID ties the token to its login history row
+    session_id = uuid.uuid4().hex
 
-    login_record = UserLoginHistory(
+    # Record the login and last login time through the batched audit writer
+    login_audit.record_login(
         user_id=user.id,
         login_time=datetime.now(),
-        ip_address=client_host,
-        user_agent=user_agent
+        ip_address=request.client.host if request.client else None,
+        user_agent=request.headers.get("user-agent"),
+        session_id=session_id,
     )
 
-    db.add(login_record)
-    db.add(user)
-    db.commit()
-
     # Issue JWT token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=user.id, expires_delta=access_token_expires
+        subject=user.id, expires_delta=access_token_expires, session_id=session_id
+    )
+
+    event_bus.publish(
+        "login",
+        {"user_id": user.id, "username": user.username, "session_id": session_id},
+        {"logins.active": 1, "logins.today": 1},
     )
 
     logger.info("User %s logged in successfully no LDAP", user.username)
@@ -199,28 +207,45 @@ def login_for_access_token(
 def logout(
     request: Request,
     db: Session = Depends(get_db),
+    token_data: TokenPayload = Depends(get_token_payload),
     current_user: User = Depends(get_current_active_user)
 ) -> Any:
     """Logout the current user.
     
+    Closes the login session the token belongs to and revokes the token, so
+    other devices of the same user stay logged in.
+    
     Args:
         request: Request object to get client info
         db: Database session
+        token_data: Decoded token of the current request
         current_user: Current authenticated user
     
     Returns:
         Success message
     """
-    # Find active login session
-    active_session = db.query(UserLoginHistory).filter(
-        UserLoginHistory.user_id == current_user.id,
-        UserLoginHistory.logout_time.is_(None)
-    ).order_by(UserLoginHistory.login_time.desc()).first()
+    closed_session = True
+    if token_data.sid:
+        revoked_tokens.revoke(db, token_data.sid, current_user.id, token_data.exp)
+        login_audit.record_logout(token_data.sid, datetime.now())
+    else:
+        # Tokens issued before session IDs existed: close the latest open session
+        active_session = db.query(UserLoginHistory).filter(
+            UserLoginHistory.user_id == current_user.id,
+            UserLoginHistory.logout_time.is_(None)
+        ).order_by(UserLoginHistory.login_time.desc()).first()
+        
+        if active_session:
+            active_session.logout_time = datetime.now()
+            db.add(active_session)
+            db.commit()
+        closed_session = active_session is not None
     
-    if active_session:
-        active_session.logout_time = datetime.now()
-        db.add(active_session)
-        db.commit()
+    event_bus.publish(
+        "logout",
+        {"user_id": current_user.id, "username": current_user.username, "session_id": token_data.sid},
+        {"logins.active": -1} if closed_session else {},
+    )
     
     logger.info("User logged out: %s", current_user.username)
     return {"detail": "Successfully logged out"}
@@ -1,15 +1,55 @@
-from typing import Any, List
+import json
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from app.core.auth import get_current_active_admin, get_current_active_user
+from app.core.coverage import find_overlaps
+from app.core.geofence import GeofenceService
+from app.core.geofence_index import office_geofences
+from app.core.occupancy import occupancy
+from app.core.profiling import ProfilingRoute
 from app.db.base import get_db
 from app.logger import logger
 from app.models.models import Office, User
-from app.schemas.schemas import Office as OfficeSchema, OfficeCreate, OfficeUpdate
+from app.schemas.schemas import (
+    MAX_NEAREST_OFFICES,
+    GeofenceStatus,
+    OccupancySummary,
+    Office as OfficeSchema,
+    OfficeCreate,
+    OfficeOccupancy,
+    OfficeUpdate,
+)
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
+
+
+def _warn_overlaps(db: Session, office: Office) -> None:
+    """Log a warning for every geofence overlapping an office's.
+    
+    Location checks inside an overlap report the location as within
+    several offices.
+    
+    Args:
+        db: Database session
+        office: Office that was just created or updated
+    """
+    index = office_geofences.index(db)
+    position = index.position(office.id)
+    if position is None:
+        return
+    for overlap in find_overlaps(index, position):
+        other_id, other_name = (
+            (overlap.other_office_id, overlap.other_office_name)
+            if overlap.office_id == office.id
+            else (overlap.office_id, overlap.office_name)
+        )
+        logger.warning(
+            "Geofence of office %s (ID: %d) overlaps office %s (ID: %d)",
+            office.name, office.id, other_name, other_id
+        )
 
 
 @router.get("/", response_model=List[OfficeSchema])
@@ -31,7 +71,7 @@ def read_offices(
         List of offices
     """
     offices = db.query(Office).order_by(Office.id).offset(skip).limit(limit).all()
-    logger.info("Retrieved %d offices", len(offices))
+    logger.debug("Retrieved %d offices", len(offices))
     return offices
 
 
@@ -52,17 +92,26 @@ def create_office(
     Returns:
         Created office
     """
+    boundary = office_in.boundary.dict() if office_in.boundary else None
+    radius = office_in.radius
+    if radius is None:
+        radius = GeofenceService.enclosing_radius(office_in.latitude, office_in.longitude, boundary)
+    
     office = Office(
         name=office_in.name,
         address=office_in.address,
         latitude=office_in.latitude,
         longitude=office_in.longitude,
-        radius=office_in.radius,
+        radius=radius,
+        boundary=json.dumps(boundary, separators=(",", ":")) if boundary else None,
+        session_limit_hours=office_in.session_limit_hours,
     )
     
     db.add(office)
     db.commit()
     db.refresh(office)
+    office_geofences.load(db)
+    _warn_overlaps(db, office)
     
     logger.info(
         "Office created: %s at (%f, %f) with radius %f meters", 
@@ -71,6 +120,104 @@ def create_office(
     return office
 
 
+@router.get("/occupancy", response_model=OccupancySummary)
+def read_occupancy(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """Get the number of people currently checked in, per office and location type.
+    
+    Counts come from the in-memory occupancy tracker; sessions opened or
+    closed by other workers are included after their next reconcile.
+    
+    Args:
+        db: Database session
+        current_user: Current authenticated user
+    
+    Returns:
+        Occupancy of every office and totals per location type
+    """
+    index = office_geofences.index(db)
+    counts = occupancy.by_office()
+    offices = [
+        OfficeOccupancy(
+            office_id=index.ids[position],
+            name=index.name(position),
+            count=counts.get(index.ids[position], 0),
+            reconciled_at=occupancy.reconciled_at,
+        )
+        for position in range(len(index))
+    ]
+    by_location_type = occupancy.by_location_type()
+    return OccupancySummary(
+        total=sum(by_location_type.values()),
+        by_location_type=by_location_type,
+        offices=offices,
+        reconciled_at=occupancy.reconciled_at,
+    )
+
+
+@router.get("/nearest", response_model=List[GeofenceStatus])
+def read_nearest_offices(
+    db: Session = Depends(get_db),
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=MAX_NEAREST_OFFICES),
+    max_distance: Optional[float] = Query(None, gt=0),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """Get the offices nearest to a location.
+    
+    Args:
+        db: Database session
+        lat: Latitude of the location
+        lon: Longitude of the location
+        k: Maximum number of offices to return
+        max_distance: Maximum distance in meters
+        current_user: Current authenticated user
+    
+    Returns:
+        Geofence status of up to k offices, closest first
+    """
+    return GeofenceService.nearest_offices(db, lat, lon, k, max_distance)
+
+
+@router.get("/{office_id}/occupancy", response_model=OfficeOccupancy)
+def read_office_occupancy(
+    office_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """Get the number of people currently checked in at an office.
+    
+    Args:
+        office_id: ID of the office
+        db: Database session
+        current_user: Current authenticated user
+    
+    Returns:
+        Occupancy of the office
+    
+    Raises:
+        HTTPException: If office not found
+    """
+    index = office_geofences.index(db)
+    position = index.position(office_id)
+    
+    if position is None:
+        logger.warning("Office not found for occupancy: ID %d", office_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Office not found"
+        )
+    
+    return OfficeOccupancy(
+        office_id=office_id,
+        name=index.name(position),
+        count=occupancy.office(office_id),
+        reconciled_at=occupancy.reconciled_at,
+    )
+
+
 @router.get("/{office_id}", response_model=OfficeSchema)
 def read_office(
     office_id: int,
@@ -134,12 +281,22 @@ def update_office(
     
     # Update office fields
     update_data = office_in.dict(exclude_unset=True)
+    if update_data.get("boundary") is not None:
+        update_data["boundary"] = json.dumps(update_data["boundary"], separators=(",", ":"))
     for field, value in update_data.items():
         setattr(office, field, value)
     
+    # Keep the radius of a polygon office enclosing its boundary unless one is given
+    if office.boundary and "radius" not in update_data and update_data.keys() & {"boundary", "latitude", "longitude"}:
+        office.radius = GeofenceService.enclosing_radius(
+            office.latitude, office.longitude, json.loads(office.boundary)
+        )
+    
     db.add(office)
     db.commit()
     db.refresh(office)
+    office_geofences.load(db)
+    _warn_overlaps(db, office)
     
     logger.info("Office updated: %s (ID: %d)", office.name, office.id)
     return office
@@ -172,5 +329,6 @@ def delete_office(
     
     db.delete(office)
     db.commit()
+    office_geofences.load(db)
     
     logger.info("Office deleted: %s (ID: %d)", office.name, office.id)
\ No newline at end of file
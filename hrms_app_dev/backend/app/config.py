@@ -1,4 +1,6 @@
+import hashlib
 import os
+import tempfile
 from typing import Any, Dict, List, Optional, Union
 
 from pydantic import AnyHttpUrl, AnyUrl, BaseSettings, validator
@@ -17,11 +19,31 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-development")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
 
+    # LOGIN AUDIT
+    # "async" buffers login history writes (lost on crash until flushed), "sync" writes them inline
+    LOGIN_AUDIT_MODE: str = "async"
+    LOGIN_AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LOGIN_AUDIT_BATCH_SIZE: int = 200
+    LOGIN_AUDIT_MAX_BUFFER: int = 10000
+
+    # TOKEN REVOCATION
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    REVOCATION_SYNC_INTERVAL_SECONDS: float = 5.0
+    REVOCATION_SYNC_OVERLAP_SECONDS: float = 60.0  # Syncs reread revocations this long before the latest seen
+    REVOCATION_PRUNE_INTERVAL_MINUTES: int = 60
+
     # DATABASE
     DATABASE_URL: str = os.getenv(
         "DATABASE_URL", ""
     )
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
+    # Statements slower than this are logged with their normalized SQL
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    # Capture the query plan of slow SELECT statements (PostgreSQL, MySQL, SQLite and SQL Server)
+    SLOW_QUERY_EXPLAIN: bool = False
+    # Report per-request DB time and query count in the Server-Timing header
+    SERVER_TIMING_ENABLED: bool = True
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True, always=True)
     def set_db_uri(cls, v: Optional[str], values: Dict[str, Any]) -> str:
@@ -31,8 +53,46 @@ class Settings(BaseSettings):
     AUTO_LOGOUT_ENABLED: bool = True
     AUTO_LOGOUT_INTERVAL_MINUTES: int = 10
     AUTO_LOGOUT_SESSION_HOURS: int = 2
+    AUTO_LOGOUT_BATCH_SIZE: int = 100
     INTERNAL_API_KEY: str = "your-secure-internal-api-key"
 
+    # Offline sync and idempotent attendance writes
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+    ATTENDANCE_SYNC_MAX_EVENTS: int = 50
+    ATTENDANCE_SYNC_MAX_EVENT_AGE_HOURS: int = 72
+    ATTENDANCE_SYNC_MAX_CLOCK_SKEW_SECONDS: int = 300
+
+    # LOGGING
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    # DEBUG messages allowed per second for each logger and message template, 0 disables the limit
+    LOG_RATE_LIMIT_PER_SECOND: float = 10.0
+    LOG_RATE_LIMIT_BURST: int = 50
+    # Per-logger overrides that also limit INFO messages, 0 disables the limit; keep audit loggers out
+    LOG_RATE_LIMITS: Dict[str, float] = {}
+    LOG_SAMPLE_RATES: Dict[str, float] = {}  # Per-logger fraction of DEBUG/INFO records kept
+
+    # METRICS
+    METRICS_ENABLED: bool = True
+
+    # LIVE FEED
+    LIVE_FEED_SNAPSHOT_SECONDS: float = 30.0  # Interval for resending full dashboard statistics
+    LIVE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    LIVE_FEED_MAX_QUEUED_EVENTS: int = 1000  # Per stream; a stream falling further behind is resynchronized
+
+    # OCCUPANCY
+    OCCUPANCY_RECONCILE_SECONDS: float = 30.0  # Interval for picking up sessions changed by other workers
+    OCCUPANCY_FULL_RECONCILE_SECONDS: float = 600.0  # Interval for rereading every open session, not just recent ones
+
+    # PROFILING
+    # Admins can sample single requests with a token from /admin/profiles/token
+    PROFILING_ENABLED: bool = True
+    PROFILING_SAMPLE_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_SAMPLES: int = 2000  # Per request
+    PROFILING_MAX_STORED: int = 20  # Oldest profiles are evicted first
+    PROFILING_MAX_CONCURRENT: int = 2
+    PROFILING_TOKEN_EXPIRE_MINUTES: int = 15
+
     # CORS
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
@@ -50,6 +110,43 @@ class Settings(BaseSettings):
 
     # GEOFENCE SETTINGS
     GEOFENCE_RADIUS_METERS: int = 100
+    HOME_GEOFENCE_RADIUS_METERS: float = 500.0  # For home addresses without a radius of their own
+    # Memory-mapped office geofence index shared by the workers of a host
+    GEOFENCE_INDEX_PATH: str = ""  # Defaults to a file per database in the temp directory
+    GEOFENCE_INDEX_CELL_DEGREES: float = 0.01
+    GEOFENCE_INDEX_REFRESH_SECONDS: float = 10.0  # Interval for comparing the index with the database
+    GEOFENCE_INDEX_OVERLAP_SECONDS: float = 60.0  # Changes this long before the latest seen are compared too
+    GEOFENCE_INDEX_MAX_AGE_SECONDS: float = 300.0  # The index is rebuilt at least this often
+    # Office decisions cached per grid cell for repeated checks from nearly the same spot
+    GEOFENCE_DECISION_CELL_METERS: float = 5.0  # 0 disables the cache; also the largest error of cached distances
+    GEOFENCE_DECISION_TTL_SECONDS: float = 30.0
+    GEOFENCE_DECISION_CACHE_SIZE: int = 2048
+    GEOFENCE_COVERAGE_CHUNK_SIZE: int = 5000  # Check-ins read per query by the coverage analysis
+    CHECK_IN_SEARCH_KEY_RANGES: int = 16  # Most spatial key ranges a check-in search is split into
+    # Density-based clustering of check-ins at other locations, started by admins from /admin/location-clusters
+    LOCATION_CLUSTER_EPS_METERS: float = 100.0  # Check-ins this close to each other are neighbors
+    LOCATION_CLUSTER_MIN_CHECK_INS: int = 20  # Neighbors, itself included, a check-in needs to grow a cluster
+    LOCATION_CLUSTER_CHUNK_SIZE: int = 20000  # Check-ins read per query
+    LOCATION_CLUSTER_RUN_TIMEOUT_SECONDS: float = 3600.0  # A run still in progress after this is taken as abandoned
+
+    # WARM STATE
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_REFRESH_SECONDS: float = 5.0  # Interval for picking up users changed by other workers
+    PRINCIPAL_CACHE_OVERLAP_SECONDS: float = 60.0  # Refreshes reread changes this long before the latest seen
+    PRINCIPAL_CACHE_MAX_AGE_SECONDS: float = 300.0  # The cache starts over this often
+    # Periodic snapshot of the principal cache and open sessions, restored at startup
+    WARM_SNAPSHOT_ENABLED: bool = True
+    WARM_SNAPSHOT_PATH: str = ""  # Defaults to a file per database in the temp directory
+    WARM_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+
+    @validator("GEOFENCE_INDEX_PATH", "WARM_SNAPSHOT_PATH", pre=True, always=True)
+    def set_local_state_path(cls, v: str, values: Dict[str, Any], field) -> str:
+        if v:
+            return v
+        # One file per database, so deployments sharing a host never share state
+        digest = hashlib.sha1(values.get("DATABASE_URL", "").encode()).hexdigest()[:12]
+        name = {"GEOFENCE_INDEX_PATH": "geofence-{}.idx", "WARM_SNAPSHOT_PATH": "warm-{}.snapshot"}[field.name]
+        return os.path.join(tempfile.gettempdir(), "hrms-" + name.format(digest))
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,260 @@
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from sqlalchemy import bindparam, insert, update
+
+from app.config import settings
+from app.core.metrics import scheduler_job_duration, scheduler_job_items
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import User, UserLoginHistory
+
+
+class LoginEvent(NamedTuple):
+    """A successful login waiting to be written to the audit tables."""
+
+    user_id: int
+    session_id: Optional[str]
+    login_time: datetime
+    ip_address: Optional[str]
+    user_agent: Optional[str]
+
+
+class LogoutEvent(NamedTuple):
+    """A logout waiting to be written to the audit tables."""
+
+    session_id: str
+    logout_time: datetime
+
+
+AuditEvent = Union[LoginEvent, LogoutEvent]
+
+
+class LoginAuditWriter:
+    """Write login history and last_login updates in batches off the request path.
+
+    In "async" mode events are buffered in memory and a background thread
+    bulk-inserts UserLoginHistory rows and coalesces last_login updates to one
+    per user. Logouts go through the same queue so they are always applied
+    after the login row they close. Buffered events are lost if the process
+    crashes before the next flush; "sync" mode writes each event before the
+    request returns.
+    """
+
+    def __init__(
+        self,
+        mode: str = "async",
+        flush_interval_seconds: float = 1.0,
+        batch_size: int = 200,
+        max_buffer: int = 10000,
+    ):
+        """Initialize the audit writer.
+
+        Args:
+            mode: "async" to buffer events or "sync" to write them immediately
+            flush_interval_seconds: Maximum time an event stays buffered
+            batch_size: Number of buffered events that triggers an early flush
+            max_buffer: Maximum number of buffered events before writes become synchronous
+        """
+        self.mode = mode
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[AuditEvent]" = queue.Queue(maxsize=max_buffer)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the background flush thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def record_login(
+        self,
+        user_id: int,
+        login_time: datetime,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> None:
+        """Record a successful login.
+
+        Args:
+            user_id: ID of the user who logged in
+            login_time: Time of the login
+            ip_address: Client IP address (optional)
+            user_agent: Client user agent (optional)
+            session_id: Session ID embedded in the issued token (optional)
+        """
+        self._submit(LoginEvent(user_id, session_id, login_time, ip_address, user_agent))
+
+    def record_logout(self, session_id: str, logout_time: datetime) -> None:
+        """Record the logout of a login session.
+
+        Args:
+            session_id: Session ID of the login being closed
+            logout_time: Time of the logout
+        """
+        self._submit(LogoutEvent(session_id, logout_time))
+
+    def _submit(self, event: AuditEvent) -> None:
+        """Buffer an event, or write it immediately when not running asynchronously."""
+        if self.mode != "async" or not self.is_running:
+            self._write([event])
+            return
+
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Apply backpressure rather than dropping audit rows
+            logger.warning("Login audit buffer is full; writing synchronously")
+            self._write([event])
+
+    @staticmethod
+    def _write(events: List[AuditEvent]) -> None:
+        """Write a batch of audit events in one transaction.
+
+        Login rows are inserted before logouts are applied, so a logout in the
+        same batch as its login still finds the row.
+
+        Args:
+            events: Login and logout events to write
+        """
+        logins = [event for event in events if isinstance(event, LoginEvent)]
+        logouts = [event for event in events if isinstance(event, LogoutEvent)]
+
+        last_logins: Dict[int, datetime] = {}
+        for event in logins:
+            if event.login_time > last_logins.get(event.user_id, datetime.min):
+                last_logins[event.user_id] = event.login_time
+
+        db = SessionLocal()
+        try:
+            if logins:
+                db.execute(
+                    insert(UserLoginHistory),
+                    [
+                        {
+                            "user_id": event.user_id,
+                            "session_id": event.session_id,
+                            "login_time": event.login_time,
+                            "ip_address": event.ip_address,
+                            "user_agent": event.user_agent,
+                        }
+                        for event in logins
+                    ],
+                )
+                # Keep updated_at as it is: a login is no change the principal cache has to reload
+                users = User.__table__
+                db.execute(
+                    update(users)
+                    .where(users.c.id == bindparam("b_user_id"))
+                    .values(last_login=bindparam("b_last_login"), updated_at=users.c.updated_at),
+                    [
+                        {"b_user_id": user_id, "b_last_login": login_time}
+                        for user_id, login_time in last_logins.items()
+                    ],
+                )
+            if logouts:
+                # Point updates through the unique session_id index
+                login_history = UserLoginHistory.__table__
+                db.execute(
+                    update(login_history)
+                    .where(login_history.c.session_id == bindparam("b_session_id"))
+                    .where(login_history.c.logout_time.is_(None))
+                    .values(logout_time=bindparam("b_logout_time")),
+                    [
+                        {"b_session_id": event.session_id, "b_logout_time": event.logout_time}
+                        for event in logouts
+                    ],
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        logger.debug("Wrote %d login and %d logout audit events", len(logins), len(logouts))
+
+    def _drain(self, limit: int) -> List[AuditEvent]:
+        """Take up to `limit` buffered events without blocking."""
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self) -> int:
+        """Write all buffered events.
+
+        Returns:
+            Number of events written
+        """
+        written = 0
+        while True:
+            events = self._drain(self.batch_size)
+            if not events:
+                return written
+            self._flush_batch(events)
+            written += len(events)
+
+    def _flush_batch(self, events: List[AuditEvent]) -> None:
+        """Write a batch, logging instead of raising so the thread keeps running."""
+        try:
+            with scheduler_job_duration.time("login_audit_flush"):
+                self._write(events)
+            scheduler_job_items.inc("login_audit_flush", amount=len(events))
+        except Exception as e:
+            logger.error("Failed to write %d login audit events: %s", len(events), str(e))
+
+    def _run(self) -> None:
+        """Flush buffered events every interval or whenever a batch fills up."""
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval_seconds)
+            except queue.Empty:
+                continue
+
+            # Give the batch a chance to fill up before writing it
+            self._stopping.wait(self.flush_interval_seconds if self._queue.qsize() < self.batch_size else 0)
+            self._flush_batch([first] + self._drain(self.batch_size - 1))
+
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self.mode != "async":
+            logger.info("Login audit writer running in %s mode", self.mode)
+            return
+        if self.is_running:
+            logger.warning("Login audit writer is already running")
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="login-audit-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Login audit writer started with %.1fs flush interval and batch size %d",
+            self.flush_interval_seconds, self.batch_size
+        )
+
+    def stop(self) -> None:
+        """Stop the background thread and flush everything still buffered."""
+        if self.is_running:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+        flushed = self.flush()
+        logger.info("Login audit writer stopped (%d buffered events flushed)", flushed)
+
+
+# Shared instance used by the auth endpoints and started on application startup
+login_audit = LoginAuditWriter(
+    mode=settings.LOGIN_AUDIT_MODE,
+    flush_interval_seconds=settings.LOGIN_AUDIT_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.LOGIN_AUDIT_BATCH_SIZE,
+    max_buffer=settings.LOGIN_AUDIT_MAX_BUFFER,
+)
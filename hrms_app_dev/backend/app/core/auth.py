@@ -3,14 +3,13 @@ from typing import Any, Optional, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
-from ldap3 import Server, Connection, ALL, SUBTREE
-from ldap3.core.exceptions import LDAPException, LDAPBindError
 
 from app.config import settings
 from app.db.base import get_db
+from app.core.principals import principal_cache
+from app.core.revocation import revoked_tokens
 from app.logger import logger
 from app.models.models import User
 from app.schemas.schemas import TokenPayload
@@ -20,12 +19,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 # JWT token functions
-def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(
+    subject: Union[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    session_id: Optional[str] = None,
+) -> str:
     """Create a new JWT access token.
     
     Args:
         subject: Token subject (typically user ID)
         expires_delta: Optional expiration time delta
+        session_id: Optional login session ID, stored as the "sid" claim
     
     Returns:
         JWT token string
@@ -38,6 +42,11 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
         )
     
     to_encode = {"exp": expire, "sub": str(subject)}
+    if session_id:
+        to_encode["sid"] = session_id
+    # jose is imported on first use to keep it out of worker boot
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
@@ -67,29 +76,40 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def get_current_user(
+def _credentials_exception() -> HTTPException:
+    """Build the exception returned for any invalid or revoked token."""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def get_token_payload(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
-    """Get the current authenticated user.
+) -> TokenPayload:
+    """Decode and validate the bearer token of the current request.
     
     Args:
-        db: Database session
+        db: Database session, only used to confirm revocation filter hits
         token: JWT token
     
     Returns:
-        User object
+        Decoded token payload
     
     Raises:
-        HTTPException: If token is invalid or user not found
+        HTTPException: If token is invalid, expired or revoked
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    from jose import JWTError, jwt
+
+    credentials_exception = _credentials_exception()
     
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+        # Profiling tokens issued before they had their own key are not access tokens
+        if "purpose" in payload:
+            logger.warning("Token of purpose %s used as a bearer token", payload["purpose"])
+            raise credentials_exception
         token_data = TokenPayload(**payload)
         
         # Convert the exp timestamp to datetime for comparison
@@ -101,7 +121,31 @@ def get_current_user(
         logger.error("JWT error: %s", str(e))
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == token_data.sub).first()
+    if token_data.sid and revoked_tokens.is_revoked(db, token_data.sid):
+        logger.warning("Revoked session used for subject: %s", token_data.sub)
+        raise credentials_exception
+    
+    return token_data
+
+
+def get_current_user(
+    db: Session = Depends(get_db), token_data: TokenPayload = Depends(get_token_payload)
+) -> User:
+    """Get the current authenticated user.
+    
+    Args:
+        db: Database session
+        token_data: Decoded token payload
+    
+    Returns:
+        User object
+    
+    Raises:
+        HTTPException: If token is invalid or user not found
+    """
+    credentials_exception = _credentials_exception()
+    
+    user = principal_cache.get(db, token_data.sub)
     
     if user is None:
         logger.warning("User not found for token subject: %s", token_data.sub)
@@ -113,7 +157,7 @@ def get_current_user(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
         
-    logger.info("User authenticated: %s", user.username)
+    logger.debug("User authenticated: %s", user.username)
     return user
 
 
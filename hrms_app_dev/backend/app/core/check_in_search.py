@@ -0,0 +1,169 @@
+import math
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.geofence_index import METERS_PER_DEGREE, Bounds, CircleFence
+from app.core.spatial_key import key_ranges
+from app.logger import logger
+from app.models.models import AttendanceRecord
+from app.schemas.schemas import CheckInMatch, CheckInSearch
+
+# Widens the bounding box of a search circle to absorb the spherical approximation and float rounding
+_BOUNDS_MARGIN = 1.01
+
+
+def _split_antimeridian(lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> List[Bounds]:
+    """Split a rectangle crossing the antimeridian into one on either side.
+
+    Longitudes may run past ±180, or lon_min may be east of lon_max.
+    """
+    if lon_max - lon_min >= 360:
+        return [(lat_min, lat_max, -180.0, 180.0)]
+    if lon_min < -180:
+        lon_min += 360
+    if lon_max > 180:
+        lon_max -= 360
+    if lon_min > lon_max:
+        return [(lat_min, lat_max, lon_min, 180.0), (lat_min, lat_max, -180.0, lon_max)]
+    return [(lat_min, lat_max, lon_min, lon_max)]
+
+
+def _circle_bounds(lat: float, lon: float, radius: float) -> List[Bounds]:
+    """Get the rectangles covering a search circle."""
+    dlat = radius * _BOUNDS_MARGIN / METERS_PER_DEGREE
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Longitude span is widest at the edge closest to a pole
+    cos_edge = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if lat_min <= -90 or lat_max >= 90 or radius * _BOUNDS_MARGIN >= METERS_PER_DEGREE * 180 * cos_edge:
+        return [(lat_min, lat_max, -180.0, 180.0)]
+
+    dlon = radius * _BOUNDS_MARGIN / (METERS_PER_DEGREE * cos_edge)
+    return _split_antimeridian(lat_min, lat_max, lon - dlon, lon + dlon)
+
+
+def _search(
+    db: Session,
+    boxes: List[Bounds],
+    circle: Optional[CircleFence],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    limit: int,
+    max_ranges: int,
+) -> CheckInSearch:
+    """Find check-ins inside rectangles, and a circle if given, latest first.
+
+    Each rectangle becomes a few range scans of the check_in_cell index,
+    narrowed down to the rectangle by the coordinates. Check-ins of a circle
+    are then filtered by their exact distance.
+    """
+    conditions = []
+    ranges = 0
+    for lat_min, lat_max, lon_min, lon_max in boxes:
+        cells = key_ranges(lat_min, lat_max, lon_min, lon_max, max(max_ranges // len(boxes), 1))
+        ranges += len(cells)
+        conditions.append(and_(
+            or_(*(AttendanceRecord.check_in_cell.between(first, last) for first, last in cells)),
+            AttendanceRecord.check_in_latitude.between(lat_min, lat_max),
+            AttendanceRecord.check_in_longitude.between(lon_min, lon_max),
+        ))
+
+    query = db.query(AttendanceRecord).filter(or_(*conditions))
+    if since is not None:
+        query = query.filter(AttendanceRecord.check_in_time >= since)
+    if until is not None:
+        query = query.filter(AttendanceRecord.check_in_time < until)
+
+    matches = []
+    scanned = 0
+    truncated = False
+    for record in query.order_by(AttendanceRecord.check_in_time.desc(), AttendanceRecord.id.desc()).yield_per(1000):
+        scanned += 1
+        distance = None
+        if circle is not None:
+            distance = circle.haversine(record.check_in_latitude, record.check_in_longitude)
+            if distance > circle.radius:
+                continue
+        if len(matches) == limit:
+            truncated = True
+            break
+        match = CheckInMatch.from_orm(record)
+        match.distance = distance
+        matches.append(match)
+
+    return CheckInSearch(check_ins=matches, key_ranges=ranges, scanned=scanned, truncated=truncated)
+
+
+def check_ins_within(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius: float,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 500,
+    max_ranges: int = settings.CHECK_IN_SEARCH_KEY_RANGES,
+) -> CheckInSearch:
+    """Find check-ins within a distance of a point.
+
+    Args:
+        db: Database session
+        lat: Latitude of the center
+        lon: Longitude of the center
+        radius: Distance from the center in meters
+        since: Only find check-ins from this time on
+        until: Only find check-ins before this time
+        limit: Most check-ins to return
+        max_ranges: Most spatial key ranges to scan
+
+    Returns:
+        Latest check-ins within the distance, with their distances
+    """
+    search = _search(
+        db, _circle_bounds(lat, lon, radius), CircleFence(lat, lon, radius), since, until, limit, max_ranges
+    )
+    logger.debug(
+        "Found %d check-ins within %.0fm of (%f, %f) in %d key ranges, %d scanned",
+        len(search.check_ins), radius, lat, lon, search.key_ranges, search.scanned
+    )
+    return search
+
+
+def check_ins_in_bounds(
+    db: Session,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 500,
+    max_ranges: int = settings.CHECK_IN_SEARCH_KEY_RANGES,
+) -> CheckInSearch:
+    """Find check-ins inside a bounding box.
+
+    Args:
+        db: Database session
+        lat_min: Southern edge of the box
+        lat_max: Northern edge of the box
+        lon_min: Western edge of the box, east of lon_max for boxes crossing the antimeridian
+        lon_max: Eastern edge of the box
+        since: Only find check-ins from this time on
+        until: Only find check-ins before this time
+        limit: Most check-ins to return
+        max_ranges: Most spatial key ranges to scan
+
+    Returns:
+        Latest check-ins inside the box
+    """
+    search = _search(
+        db, _split_antimeridian(lat_min, lat_max, lon_min, lon_max), None, since, until, limit, max_ranges
+    )
+    logger.debug(
+        "Found %d check-ins in (%f, %f, %f, %f) in %d key ranges, %d scanned",
+        len(search.check_ins), lat_min, lat_max, lon_min, lon_max, search.key_ranges, search.scanned
+    )
+    return search
@@ -0,0 +1,225 @@
+import math
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.geofence_index import METERS_PER_DEGREE, GeofenceIndex, PreparedPolygon, office_geofences
+from app.logger import logger
+from app.models.models import AttendanceRecord, LocationType
+from app.schemas.schemas import CoverageCell, FenceOverlap, GeofenceCoverage, OfficeCoverage
+
+# (latitude, longitude, latitude, longitude) of an edge
+_Edge = Tuple[float, float, float, float]
+# Points this close to an edge count as on it
+_EDGE_TOLERANCE_METERS = 0.01
+
+
+def _segments_cross(first: _Edge, second: _Edge) -> bool:
+    """Check whether two edges intersect, treating latitude/longitude as a plane."""
+    def side(lat1: float, lon1: float, lat2: float, lon2: float, lat: float, lon: float) -> float:
+        return (lat2 - lat1) * (lon - lon1) - (lon2 - lon1) * (lat - lat1)
+
+    d1 = side(*second, *first[:2])
+    d2 = side(*second, *first[2:])
+    d3 = side(*first, *second[:2])
+    d4 = side(*first, *second[2:])
+    # Edges that merely touch, like those of adjacent fences, do not count
+    return d1 * d2 < 0 and d3 * d4 < 0
+
+
+def _within(edge: _Edge, bounds: Tuple[float, float, float, float]) -> bool:
+    lat_min, lat_max, lon_min, lon_max = bounds
+    return not (
+        max(edge[0], edge[2]) < lat_min or min(edge[0], edge[2]) > lat_max
+        or max(edge[1], edge[3]) < lon_min or min(edge[1], edge[3]) > lon_max
+    )
+
+
+def _strictly_inside(polygon: PreparedPolygon, lat: float, lon: float) -> bool:
+    """Check whether a point is inside a boundary and not on its edges."""
+    return polygon.contains(lat, lon) and polygon.boundary_distance(lat, lon) > _EDGE_TOLERANCE_METERS
+
+
+def _interior_point(polygon: PreparedPolygon) -> Optional[Tuple[float, float]]:
+    """Get a point just inside a boundary, next to the middle of one of its edges."""
+    for lat1, lon1, lat2, lon2 in polygon.edges:
+        length = math.hypot(lat2 - lat1, lon2 - lon1)
+        if not length:
+            continue
+        offset = _EDGE_TOLERANCE_METERS / METERS_PER_DEGREE / length
+        for side in (1, -1):
+            lat = (lat1 + lat2) / 2 - side * (lon2 - lon1) * offset
+            lon = (lon1 + lon2) / 2 + side * (lat2 - lat1) * offset
+            if polygon.contains(lat, lon):
+                return lat, lon
+    return None
+
+
+def _polygons_overlap(first: PreparedPolygon, second: PreparedPolygon) -> bool:
+    """Check whether two boundaries share any area.
+
+    Either one has a vertex strictly inside the other, their edges cross,
+    or they coincide, which is caught with a point just inside the first.
+    Boundaries that only share edges, like those of adjacent buildings, do
+    not overlap. Only edges inside the other boundary's bounding box are
+    compared.
+    """
+    a, b = first.bounds, second.bounds
+    if a[1] < b[0] or b[1] < a[0] or a[3] < b[2] or b[3] < a[2]:
+        return False
+    if any(_strictly_inside(second, edge[0], edge[1]) for edge in first.edges):
+        return True
+    if any(_strictly_inside(first, edge[0], edge[1]) for edge in second.edges):
+        return True
+    first_edges = [edge for edge in first.edges if _within(edge, b)]
+    second_edges = [edge for edge in second.edges if _within(edge, a)]
+    if any(_segments_cross(edge, other) for edge in first_edges for other in second_edges):
+        return True
+    point = _interior_point(first)
+    return point is not None and second.contains(*point)
+
+
+def fences_overlap(index: GeofenceIndex, first: int, second: int) -> Tuple[bool, Optional[float]]:
+    """Check whether two fences of an index overlap.
+
+    Args:
+        index: Geofence index
+        first: Position of one fence
+        second: Position of the other fence
+
+    Returns:
+        Whether the fences share any area, and for two circles how many
+        meters they overlap by
+    """
+    first_polygon, second_polygon = index.polygon(first), index.polygon(second)
+    if first_polygon is None and second_polygon is None:
+        overlap = index.radii[first] + index.radii[second] - index.distance(
+            first, index.latitudes[second], index.longitudes[second]
+        )
+        return overlap > 0, overlap
+
+    if first_polygon is not None and second_polygon is not None:
+        return _polygons_overlap(first_polygon, second_polygon), None
+
+    polygon, circle = (first_polygon, second) if first_polygon is not None else (second_polygon, first)
+    lat, lon, radius = index.latitudes[circle], index.longitudes[circle], index.radii[circle]
+    return polygon.contains(lat, lon) or polygon.boundary_distance(lat, lon) < radius, None
+
+
+def find_overlaps(index: GeofenceIndex, position: Optional[int] = None) -> List[FenceOverlap]:
+    """Find overlapping office fences.
+
+    Candidates come from the grid join of GeofenceIndex.candidate_pairs, so
+    only fences near each other are compared.
+
+    Args:
+        index: Geofence index
+        position: Only report overlaps with the fence at this position
+
+    Returns:
+        Overlapping pairs, deepest circle overlaps first
+    """
+    overlaps = []
+    for first, second in index.candidate_pairs():
+        if position is not None and position not in (first, second):
+            continue
+        overlapping, overlap = fences_overlap(index, first, second)
+        if overlapping:
+            overlaps.append(FenceOverlap(
+                office_id=index.ids[first],
+                office_name=index.name(first),
+                other_office_id=index.ids[second],
+                other_office_name=index.name(second),
+                center_distance=index.distance(first, index.latitudes[second], index.longitudes[second]),
+                overlap=overlap,
+            ))
+    overlaps.sort(key=lambda item: (item.overlap is None, -(item.overlap or 0.0), item.office_id))
+    return overlaps
+
+
+def analyze_coverage(
+    db: Session,
+    cell_meters: float = 200.0,
+    top: int = 20,
+    since: Optional[datetime] = None,
+    chunk_size: int = settings.GEOFENCE_COVERAGE_CHUNK_SIZE,
+) -> GeofenceCoverage:
+    """Analyze office geofences against historical check-ins.
+
+    Check-in locations are streamed in chunks by primary key, so memory
+    stays flat however long the history is. Each location is matched to the
+    current fences through the index grid; locations outside every fence
+    are counted per grid cell. Home check-ins are left out, since they are
+    expected outside office fences.
+
+    Args:
+        db: Database session
+        cell_meters: Size of the cells uncovered check-ins are counted in
+        top: Number of uncovered cells to report
+        since: Only analyze check-ins from this time on
+        chunk_size: Number of check-ins read per query
+
+    Returns:
+        Overlapping fences, check-ins per office and the densest uncovered cells
+    """
+    index = office_geofences.index(db)
+    overlaps = find_overlaps(index)
+
+    cell_degrees = cell_meters / METERS_PER_DEGREE
+    inside: Counter = Counter()
+    uncovered: Counter = Counter()
+    check_ins = 0
+    last_id = 0
+    while True:
+        query = db.query(
+            AttendanceRecord.id, AttendanceRecord.check_in_latitude, AttendanceRecord.check_in_longitude
+        ).filter(
+            AttendanceRecord.id > last_id,
+            AttendanceRecord.location_type != LocationType.HOME,
+        )
+        if since is not None:
+            query = query.filter(AttendanceRecord.check_in_time >= since)
+        rows = query.order_by(AttendanceRecord.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        for _, lat, lon in rows:
+            containing = index.containing(lat, lon)
+            if containing:
+                inside.update(containing)
+            else:
+                uncovered[(math.floor((lat + 90) / cell_degrees), math.floor((lon + 180) / cell_degrees))] += 1
+        check_ins += len(rows)
+        last_id = rows[-1][0]
+
+    offices = sorted(
+        (
+            OfficeCoverage(office_id=index.ids[position], name=index.name(position), check_ins=inside[position])
+            for position in range(len(index))
+        ),
+        key=lambda office: (office.check_ins, office.office_id),
+    )
+    logger.info(
+        "Analyzed %d check-ins against %d office geofences: %d overlapping pairs, %d uncovered check-ins",
+        check_ins, len(index), len(overlaps), sum(uncovered.values())
+    )
+    return GeofenceCoverage(
+        check_ins=check_ins,
+        uncovered_check_ins=sum(uncovered.values()),
+        cell_meters=cell_meters,
+        overlaps=overlaps,
+        offices=offices,
+        unused_office_ids=[office.office_id for office in offices if not office.check_ins],
+        uncovered_cells=[
+            CoverageCell(
+                latitude=(row + 0.5) * cell_degrees - 90,
+                longitude=(column + 0.5) * cell_degrees - 180,
+                check_ins=count,
+            )
+            for (row, column), count in uncovered.most_common(top)
+        ],
+        analyzed_at=datetime.now(),
+    )
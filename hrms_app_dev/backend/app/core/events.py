@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import json
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.logger import logger
+from app.models.models import AttendanceRecord
+
+
+@dataclass(frozen=True)
+class Event:
+    """A live event with the dashboard counter changes it causes."""
+
+    id: int
+    kind: str
+    data: Dict[str, Any]
+    deltas: Dict[str, int] = field(default_factory=dict)
+    time: datetime = field(default_factory=datetime.now)
+
+    def to_sse(self) -> str:
+        """Encode the event as a Server-Sent Events message."""
+        payload = {"time": self.time.isoformat(), **self.data, "deltas": self.deltas}
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+class Subscription:
+    """Queue of events for one subscriber, consumed on its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queued: int):
+        self._loop = loop
+        self._queue: "asyncio.Queue[Event]" = asyncio.Queue(max_queued)
+        # Set when events had to be dropped; the subscriber must resynchronize
+        self.overflowed = False
+        # ID of the latest dropped event
+        self._dropped_id = 0
+
+    def _put(self, event: Event) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self._dropped_id = event.id
+
+    def push(self, event: Event) -> None:
+        """Queue an event. Safe to call from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop is closed; it is about to unsubscribe
+            pass
+
+    def discard_through(self, last_id: int) -> None:
+        """Drop queued events a snapshot already covers.
+
+        The overflow flag is reset unless an event newer than the snapshot
+        was dropped as well.
+
+        Args:
+            last_id: ID of the latest event covered by the snapshot
+        """
+        newer = []
+        while not self._queue.empty():
+            event = self._queue.get_nowait()
+            if event.id > last_id:
+                newer.append(event)
+        for event in newer:
+            self._queue.put_nowait(event)
+        if self._dropped_id <= last_id:
+            self.overflowed = False
+
+    async def get(self, timeout: float) -> Optional[Event]:
+        """Wait for the next event.
+
+        Args:
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            The next event, or None if none arrived in time
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """In-process publish/subscribe channel for live attendance and login events.
+
+    Routers publish from request threads after their changes are committed;
+    subscribers (live feed streams) consume on the event loop. Publishing
+    with no subscribers costs a single check. A subscriber that falls too far
+    behind is marked as overflowed instead of slowing publishers down.
+
+    Only events of the current process are delivered. With several workers
+    each stream sees its own worker's events and relies on periodic
+    snapshots for the rest.
+    """
+
+    def __init__(self, max_queued: int = 1000):
+        """Initialize the bus.
+
+        Args:
+            max_queued: Maximum number of undelivered events per subscriber
+        """
+        self.max_queued = max_queued
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # ID of the most recently published event, 0 before the first one
+        self.last_id = 0
+
+    def publish(self, kind: str, data: Dict[str, Any], deltas: Optional[Dict[str, int]] = None) -> None:
+        """Publish an event to every subscriber.
+
+        Args:
+            kind: Event type, e.g. "check_in" or "login"
+            data: JSON-serializable event details
+            deltas: Changes to dashboard counters, keyed by dotted stat path
+        """
+        if not self._subscribers:
+            return
+
+        with self._lock:
+            event = Event(next(self._ids), kind, data, deltas or {})
+            self.last_id = event.id
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self) -> Subscription:
+        """Subscribe to events. Must be called on the subscriber's event loop."""
+        subscription = Subscription(asyncio.get_running_loop(), self.max_queued)
+        with self._lock:
+            self._subscribers.add(subscription)
+            count = len(self._subscribers)
+        logger.debug("Live feed subscriber added, %d subscribed", count)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Stop delivering events to a subscription."""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+def attendance_event(
+    record: AttendanceRecord, username: Optional[str] = None, auto: bool = False
+) -> Tuple[str, Dict[str, Any], Dict[str, int]]:
+    """Describe a committed check-in or check-out for the live feed.
+
+    Args:
+        record: Attendance record that was just checked in or out
+        username: Username of the record's owner, if known
+        auto: Whether the session was closed by auto-logout
+
+    Returns:
+        Event kind, data and counter deltas, the arguments of EventBus.publish
+    """
+    location_type = record.location_type.value
+    data = {
+        "record_id": record.id,
+        "user_id": record.user_id,
+        "username": username,
+        "location_type": location_type,
+        "office_id": record.office_id,
+        "check_in_time": record.check_in_time.isoformat(),
+    }
+    if record.check_out_time is not None:
+        data["check_out_time"] = record.check_out_time.isoformat()
+        data["auto"] = auto
+        return "check_out", data, {}
+
+    # Synced check-ins can be from earlier days, which the counters do not cover
+    deltas = {}
+    if record.check_in_time.date() == datetime.now().date():
+        deltas = {"attendance.today.total": 1, f"attendance.today.{location_type}": 1}
+    return "check_in", data, deltas
+
+
+event_bus = EventBus(settings.LIVE_FEED_MAX_QUEUED_EVENTS)
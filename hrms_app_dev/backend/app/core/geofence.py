@@ -1,11 +1,22 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Union
 
 import math
 from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.core.geofence_cache import geofence_decisions
+from app.core.geofence_index import (
+    EARTH_RADIUS_METERS,
+    boundary_rings,
+    office_geofences,
+    prepare_boundary,
+    prepare_circle,
+)
+from app.core.metrics import geofence_evaluations
+from app.core.principals import HomeFence
 from app.logger import logger
 from app.models.models import Office, UserHomeAddress
-from app.schemas.schemas import GeofenceStatus
+from app.schemas.schemas import GeofenceStatus, LocationType
 
 
 class GeofenceService:
@@ -36,18 +47,37 @@ class GeofenceService:
         a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
         c = 2 * math.asin(math.sqrt(a))
         
-        # Radius of Earth in meters
-        earth_radius = 6371000
-        
         # Calculate distance
-        distance = earth_radius * c
+        distance = EARTH_RADIUS_METERS * c
         
         return distance
 
+    @classmethod
+    def enclosing_radius(cls, lat: float, lon: float, boundary: Dict[str, Any]) -> float:
+        """Calculate the radius of the smallest circle around a center that encloses a boundary.
+        
+        Args:
+            lat: Latitude of the center
+            lon: Longitude of the center
+            boundary: GeoJSON Polygon or MultiPolygon
+            
+        Returns:
+            Radius in meters
+        """
+        return max(
+            cls.haversine_distance(lat, lon, vertex_lat, vertex_lon)
+            for ring in boundary_rings(boundary)
+            for vertex_lat, vertex_lon in ring
+        )
+
     @classmethod
     def check_within_geofence(cls, lat: float, lon: float, office: Office) -> GeofenceStatus:
         """Check if a location is within the geofence of an office.
         
+        Offices with a boundary use a point-in-polygon test and report the
+        distance to the boundary; the others use the circle around their
+        center.
+        
         Args:
             lat: Latitude of the location to check
             lon: Longitude of the location to check
@@ -56,11 +86,15 @@ class GeofenceService:
         Returns:
             GeofenceStatus object with check results
         """
-        # Calculate distance between location and office
-        distance = cls.haversine_distance(lat, lon, office.latitude, office.longitude)
-        
-        # Check if within geofence radius
-        is_within_geofence = distance <= office.radius
+        if office.boundary:
+            polygon = prepare_boundary(office.boundary)
+            distance = polygon.distance(lat, lon)
+            is_within_geofence = distance == 0.0
+        else:
+            # Planar approximation, with the exact haversine distance near the edge
+            circle = prepare_circle(office.latitude, office.longitude, office.radius)
+            is_within_geofence, distance = circle.check(lat, lon)
+        geofence_evaluations.inc("office", "inside" if is_within_geofence else "outside")
         
         logger.debug(
             "Geofence check for office %s: distance = %f meters, within geofence = %s",
@@ -75,25 +109,28 @@ class GeofenceService:
         )
     
     @classmethod
-    def check_within_home_geofence(cls, lat: float, lon: float, home_address: UserHomeAddress) -> GeofenceStatus:
+    def check_within_home_geofence(
+        cls, lat: float, lon: float, home_address: Union[UserHomeAddress, HomeFence]
+    ) -> GeofenceStatus:
         """Check if a location is within the geofence of a home address.
         
+        Addresses without a radius of their own use HOME_GEOFENCE_RADIUS_METERS.
+        
         Args:
             lat: Latitude of the location to check
             lon: Longitude of the location to check
-            home_address: UserHomeAddress object with location data
+            home_address: UserHomeAddress object or cached HomeFence with location data
             
         Returns:
             GeofenceStatus object with check results
         """
-        # Calculate distance between location and home address
-        distance = cls.haversine_distance(lat, lon, home_address.latitude, home_address.longitude)
-
-        # Using a default radius of 500 meters for home address geofence
-        home_radius = 500  # meters
+        home_radius = home_address.radius or settings.HOME_GEOFENCE_RADIUS_METERS
         
-        # Check if within geofence radius
-        is_within_geofence = distance <= home_radius
+        # Planar approximation, with the exact haversine distance near the edge
+        is_within_geofence, distance = prepare_circle(
+            home_address.latitude, home_address.longitude, home_radius
+        ).check(lat, lon)
+        geofence_evaluations.inc("home", "inside" if is_within_geofence else "outside")
         
         logger.debug(
             "Geofence check for home address %s: distance = %f meters, within geofence = %s",
@@ -108,29 +145,96 @@ class GeofenceService:
         )
 
     @classmethod
-    def check_all_geofences(cls, db: Session, lat: float, lon: float) -> List[GeofenceStatus]:
-        """Check a location against all office geofences.
+    def nearest_offices(
+        cls, db: Session, lat: float, lon: float, k: int, max_distance: Optional[float] = None
+    ) -> List[GeofenceStatus]:
+        """Find the offices nearest to a location.
+        
+        Uses a best-first search of the shared geofence index, so only the
+        offices that may be among the nearest are checked.
+        
+        Args:
+            db: Database session
+            lat: Latitude of the location
+            lon: Longitude of the location
+            k: Maximum number of offices
+            max_distance: Maximum distance in meters, unlimited if None
+            
+        Returns:
+            List of GeofenceStatus objects, closest first
+        """
+        index = office_geofences.index(db)
+        return [
+            GeofenceStatus(
+                is_within_geofence=is_within_geofence,
+                location_type=LocationType.OFFICE,
+                office_id=index.ids[position],
+                office_name=index.name(position),
+                distance=distance
+            )
+            for position, is_within_geofence, distance in index.nearest(lat, lon, k, max_distance)
+        ]
+
+    @classmethod
+    def check_all_geofences(
+        cls,
+        db: Session,
+        lat: float,
+        lon: float,
+        home_fences: Sequence[HomeFence] = (),
+        k: Optional[int] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[GeofenceStatus]:
+        """Check a location against all office geofences and a user's current home addresses.
+        
+        Offices are read from the shared geofence index, so this only queries
+        the database when the index is due to be compared with it. Repeated
+        checks from the same grid cell reuse its decisions; see
+        GeofenceDecisionCache. With k or max_distance only the nearest
+        offices are checked: those the cell keeps as possibly nearest, found
+        by a best-first search of the index on a miss. Offices containing
+        the location are always included.
         
         Args:
             db: Database session
             lat: Latitude of the location to check
             lon: Longitude of the location to check
+            home_fences: The user's cached home addresses
+            k: Maximum number of nearest offices to report
+            max_distance: Maximum distance in meters of reported offices and home addresses
             
         Returns:
-            List of GeofenceStatus objects for all offices
+            List of GeofenceStatus objects for the offices and the current
+            home addresses with a location, closest first
         """
-        from app.models.models import Office
+        index = office_geofences.index(db)
+        if k is None and max_distance is None:
+            checked = [
+                (position, inside, distance)
+                for position, (inside, distance) in enumerate(geofence_decisions.check(index, lat, lon))
+            ]
+        else:
+            checked = geofence_decisions.nearest(index, lat, lon, len(index) if k is None else k, max_distance)
         
-        # Get all offices
-        offices = db.query(Office).all()
-        
-        # Check against each office
         results = []
-        for office in offices:
-            status = cls.check_within_geofence(lat, lon, office)
-            results.append(status)
-        
-        # Sort by distance (closest first)
+        for position, is_within_geofence, distance in checked:
+            geofence_evaluations.inc("office", "inside" if is_within_geofence else "outside")
+            results.append(GeofenceStatus(
+                is_within_geofence=is_within_geofence,
+                location_type=LocationType.OFFICE,
+                office_id=index.ids[position],
+                office_name=index.name(position),
+                distance=distance
+            ))
+        
+        for home in home_fences:
+            if home.is_current and home.latitude and home.longitude:
+                status = cls.check_within_home_geofence(lat, lon, home)
+                if max_distance is not None and status.distance > max_distance and not status.is_within_geofence:
+                    continue
+                status.location_type = LocationType.HOME
+                results.append(status)
+        
+        # Sort offices and home addresses together by distance (closest first)
         results.sort(key=lambda x: x.distance)
-        
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,263 @@
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from app.config import settings
+from app.core.geofence_index import DISTANCE_TOLERANCE_METERS, METERS_PER_DEGREE, GeofenceIndex
+from app.core.metrics import cache_requests
+
+# Decisions of a cell for each fence
+_OUTSIDE, _INSIDE, _AMBIGUOUS = 0, 1, 2
+
+
+class _CellDecisions(NamedTuple):
+    expires: float
+    # _OUTSIDE, _INSIDE or _AMBIGUOUS per fence position
+    decisions: bytes
+    # Distance from the center of the cell per fence position
+    distances: array
+    ambiguous: Tuple[int, ...]
+
+
+class _CellNearest(NamedTuple):
+    expires: float
+    # Positions of the fences that may be among the nearest from, or contain, any point of the cell
+    candidates: Tuple[int, ...]
+
+
+_CachedCell = Union[_CellDecisions, _CellNearest]
+
+
+def _steps(low: float, high: float, step: float) -> List[float]:
+    """Get values from low to high, both included, at most step apart."""
+    values = [low]
+    while values[-1] + step < high:
+        values.append(values[-1] + step)
+    values.append(high)
+    return values
+
+
+class GeofenceDecisionCache:
+    """Short-lived cache of office geofence decisions per grid cell.
+
+    Phones waiting for a better location fix send many checks from nearly
+    the same spot. Points are quantized to square cells of a fixed size in
+    degrees, and each cell is classified once against every office fence:
+    wholly inside, wholly outside, or ambiguous when the fence edge may
+    cross the cell. Any point of a cell is within cell_meters of its center
+    (half a cell along the meridian plus half a cell along the parallel), so
+    a fence is decided for the whole cell when the exact distance from the
+    center to the fence edge is larger than that.
+
+    Cached checks answer decided fences from the cell and evaluate only the
+    ambiguous ones exactly. Distances of decided fences are those of the
+    cell center, off by at most cell_meters, well within the accuracy of a
+    phone's location. Searches for the nearest offices keep, per cell, the
+    few fences that may answer them from any point of the cell, see
+    nearest. Office decisions are the same for every user, so the
+    cache is shared; its entries belong to one generation of the geofence
+    index and are dropped as soon as office changes publish a new one.
+    """
+
+    def __init__(self, cell_meters: float = 5.0, ttl_seconds: float = 30.0, max_size: int = 2048):
+        """Initialize an empty cache.
+
+        Args:
+            cell_meters: Size of the cells, 0 disables the cache
+            ttl_seconds: Time a classified cell is reused for
+            max_size: Maximum number of cached cells, least recently used are evicted
+        """
+        self.cell_meters = cell_meters
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._cell_degrees = cell_meters / METERS_PER_DEGREE
+        self._cells: "OrderedDict[tuple, _CachedCell]" = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether checks go through the cache."""
+        return self.cell_meters > 0 and self.max_size > 0
+
+    def clear(self) -> None:
+        """Drop every cached cell."""
+        with self._lock:
+            self._cells.clear()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        """Get the row and column of the cell holding a point."""
+        return math.floor((lat + 90) / self._cell_degrees), math.floor((lon + 180) / self._cell_degrees)
+
+    def _lookup(self, key: tuple, index: GeofenceIndex) -> Optional[_CachedCell]:
+        """Get a cached cell that has not expired, dropping cells of older index generations."""
+        now = time.monotonic()
+        with self._lock:
+            if self._generation != index.generation:
+                self._cells.clear()
+                self._generation = index.generation
+            cell = self._cells.get(key)
+            if cell is None or cell.expires <= now:
+                return None
+            self._cells.move_to_end(key)
+            return cell
+
+    def _store(self, key: tuple, cell: _CachedCell, index: GeofenceIndex) -> None:
+        """Cache a cell unless the index has been replaced meanwhile."""
+        with self._lock:
+            if self._generation == index.generation:
+                self._cells[key] = cell
+                self._cells.move_to_end(key)
+                while len(self._cells) > self.max_size:
+                    self._cells.popitem(last=False)
+
+    def _decide(self, index: GeofenceIndex, position: int, lat: float, lon: float) -> Tuple[int, float]:
+        """Decide a fence for a cell, given its center, and measure its distance from the center."""
+        polygon = index.polygon(position)
+        if polygon is not None:
+            inside = polygon.contains(lat, lon)
+            edge = polygon.boundary_distance(lat, lon)
+            distance = 0.0 if inside else edge
+        else:
+            circle = index.circle(position)
+            distance = circle.haversine(lat, lon)
+            inside = distance <= circle.radius
+            edge = abs(distance - circle.radius)
+
+        # Slightly wider, for the planar distances to polygon edges and float rounding
+        if edge <= self.cell_meters * 1.01:
+            return _AMBIGUOUS, distance
+        return (_INSIDE if inside else _OUTSIDE), distance
+
+    def _classify(self, index: GeofenceIndex, lat: float, lon: float) -> _CellDecisions:
+        """Classify a cell, given its center, against every fence of an index."""
+        decisions = bytearray(len(index))
+        distances = array("d", bytes(8 * len(index)))
+        ambiguous = []
+        for position in range(len(index)):
+            decisions[position], distances[position] = self._decide(index, position, lat, lon)
+            if decisions[position] == _AMBIGUOUS:
+                ambiguous.append(position)
+        return _CellDecisions(time.monotonic() + self.ttl_seconds, bytes(decisions), distances, tuple(ambiguous))
+
+    def check(self, index: GeofenceIndex, lat: float, lon: float) -> List[Tuple[bool, float]]:
+        """Check a point against every fence of an index.
+
+        Args:
+            index: Current office geofence index
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside and its distance in meters, per fence position
+        """
+        if not self.enabled:
+            return [index.check(position, lat, lon) for position in range(len(index))]
+
+        row, column = self._cell(lat, lon)
+        cell = self._lookup((row, column), index)
+        if cell is None:
+            cache_requests.inc("geofence_cells", "miss")
+            cell = self._classify(
+                index, (row + 0.5) * self._cell_degrees - 90, (column + 0.5) * self._cell_degrees - 180
+            )
+            self._store((row, column), cell, index)
+        else:
+            cache_requests.inc("geofence_cells", "hit")
+
+        results = [
+            (decision == _INSIDE, distance) for decision, distance in zip(cell.decisions, cell.distances)
+        ]
+        for position in cell.ambiguous:
+            results[position] = index.check(position, lat, lon)
+        return results
+
+    def _nearest_candidates(
+        self, index: GeofenceIndex, row: int, column: int, k: int, max_distance: Optional[float]
+    ) -> _CellNearest:
+        """Find the fences that may be among the nearest from, or contain, any point of a cell."""
+        lat = (row + 0.5) * self._cell_degrees - 90
+        lon = (column + 0.5) * self._cell_degrees - 180
+        # Reported distances from any point of the cell differ from those of the center by at most this
+        slack = self.cell_meters * 1.01 + 2 * DISTANCE_TOLERANCE_METERS
+        nearest = index.nearest(lat, lon, k)
+        reach = max_distance + slack if max_distance is not None else math.inf
+        if 0 < k == len(nearest):
+            # The k nearest fences of the center are within this distance of every point of the cell
+            reach = min(reach, nearest[-1][2] + 2 * slack)
+        if math.isinf(reach):
+            candidates = set(range(len(index)))
+        else:
+            candidates = {position for position, _, _ in index.nearest(lat, lon, len(index), reach)}
+
+        # Fences that may contain a point of the cell are listed in the index grid cells it overlaps
+        for grid_lat in _steps(row * self._cell_degrees - 90, (row + 1) * self._cell_degrees - 90, index.cell_degrees):
+            for grid_lon in _steps(
+                column * self._cell_degrees - 180, (column + 1) * self._cell_degrees - 180, index.cell_degrees
+            ):
+                for position in index.candidates(max(min(grid_lat, 90.0), -90.0), grid_lon):
+                    if position not in candidates and self._decide(index, position, lat, lon)[0] != _OUTSIDE:
+                        candidates.add(position)
+        return _CellNearest(time.monotonic() + self.ttl_seconds, tuple(candidates))
+
+    def nearest(
+        self, index: GeofenceIndex, lat: float, lon: float, k: int, max_distance: Optional[float] = None
+    ) -> List[Tuple[int, bool, float]]:
+        """Find the fences nearest to a point and the fences containing it.
+
+        Each cell keeps, per k and max_distance, the few fences that may be
+        among the nearest from any of its points, those whose distance from
+        the center is within twice the cell's error of the center's k-th
+        nearest, and the fences that may contain any of its points. Cached
+        checks measure only these exactly instead of searching the index.
+
+        Args:
+            index: Current office geofence index
+            lat: Latitude of the point
+            lon: Longitude of the point
+            k: Maximum number of nearest fences
+            max_distance: Maximum distance in meters of the nearest fences, unlimited if None
+
+        Returns:
+            Position, whether the point is inside and distance, for up to k
+            nearest fences, nearest first, followed by any other fences
+            containing the point
+        """
+        if not self.enabled:
+            found = index.nearest(lat, lon, k, max_distance)
+            listed = {position for position, _, _ in found}
+            for position in index.candidates(lat, lon):
+                if position not in listed:
+                    inside, distance = index.check(position, lat, lon)
+                    if inside:
+                        found.append((position, inside, distance))
+            return found
+
+        row, column = self._cell(lat, lon)
+        key = (row, column, k, max_distance)
+        cell = self._lookup(key, index)
+        if cell is None:
+            cache_requests.inc("geofence_nearest_cells", "miss")
+            cell = self._nearest_candidates(index, row, column, k, max_distance)
+            self._store(key, cell, index)
+        else:
+            cache_requests.inc("geofence_nearest_cells", "hit")
+
+        checked = sorted(
+            ((position, *index.check(position, lat, lon)) for position in cell.candidates),
+            key=lambda fence: fence[2],
+        )
+        found = [fence for fence in checked[:k] if max_distance is None or fence[2] <= max_distance]
+        # Fences containing the point are reported beyond k and max_distance too
+        found.extend(fence for fence in checked[len(found):] if fence[1])
+        return found
+
+# Shared instance used by the location checks
+geofence_decisions = GeofenceDecisionCache(
+    settings.GEOFENCE_DECISION_CELL_METERS,
+    settings.GEOFENCE_DECISION_TTL_SECONDS,
+    settings.GEOFENCE_DECISION_CACHE_SIZE,
+)
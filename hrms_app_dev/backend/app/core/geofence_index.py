@@ -0,0 +1,1052 @@
+import bisect
+import functools
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import Office
+
+# Mean radius of Earth in meters
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_METERS / 360
+
+# (count, max id, checksum of the recent updated_at stamps) of the offices table
+Watermark = Tuple[int, int, int]
+# (min latitude, max latitude, min longitude, max longitude)
+Bounds = Tuple[float, float, float, float]
+
+_MAGIC = b"HRGF"
+_FORMAT_VERSION = 2
+# magic, version, generation, watermark (3), cell size, fences, cells, cell entries, oversize fences,
+# boundary rings, boundary vertices, name bytes
+_HEADER = struct.Struct("<4sIqqqqdIIIIIII")
+_HEADER_SIZE = (_HEADER.size + 7) // 8 * 8
+# Fences whose bounding box spans more cells than this are checked for every point instead
+_MAX_CELLS_PER_FENCE = 4096
+# Widens bounding boxes to absorb the spherical approximation and float rounding
+_BOUNDS_MARGIN = 1.01
+# The planar approximation is only trusted while u = A / cos(lat0) stays below this
+_PLANAR_MAX_U = 0.01
+# Reported distances may come from the planar approximation when its error bound is below
+# this, far less than the accuracy of a phone's location
+DISTANCE_TOLERANCE_METERS = 0.5
+
+
+def _cell_columns(cell_degrees: float) -> int:
+    return math.ceil(360 / cell_degrees)
+
+
+def _cell_key(lat: float, lon: float, cell_degrees: float, columns: int) -> int:
+    """Get the key of the grid cell containing a point."""
+    row = math.floor((lat + 90) / cell_degrees)
+    column = math.floor((lon + 180) / cell_degrees) % columns
+    return row * columns + column
+
+
+def _circle_bounds(lat: float, lon: float, radius: float) -> Optional[Bounds]:
+    """Get the bounding box of a circular fence.
+
+    Returns:
+        The bounding box, or None if the circle reaches a pole or wraps around
+    """
+    dlat = radius * _BOUNDS_MARGIN / METERS_PER_DEGREE
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    # Longitude span is widest at the bounding box edge closest to a pole
+    cos_edge = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if lat_min <= -90 or lat_max >= 90 or radius * _BOUNDS_MARGIN >= METERS_PER_DEGREE * 180 * cos_edge:
+        return None
+
+    dlon = radius * _BOUNDS_MARGIN / (METERS_PER_DEGREE * cos_edge)
+    return lat_min, lat_max, lon - dlon, lon + dlon
+
+
+def _fence_cells(bounds: Optional[Bounds], cell_degrees: float) -> Optional[List[int]]:
+    """Get the keys of all grid cells overlapping a fence's bounding box.
+
+    Returns:
+        Sorted cell keys, or None if the fence covers too many cells to list
+    """
+    if bounds is None:
+        return None
+
+    lat_min, lat_max, lon_min, lon_max = bounds
+    columns = _cell_columns(cell_degrees)
+    first_row = math.floor((lat_min + 90) / cell_degrees)
+    last_row = math.floor((lat_max + 90) / cell_degrees)
+    first_column = math.floor((lon_min + 180) / cell_degrees)
+    last_column = math.floor((lon_max + 180) / cell_degrees)
+    if (last_row - first_row + 1) * (last_column - first_column + 1) > _MAX_CELLS_PER_FENCE:
+        return None
+
+    # Columns wrap around, so fences crossing the antimeridian land in both edge columns
+    return sorted(
+        row * columns + column % columns
+        for row in range(first_row, last_row + 1)
+        for column in range(first_column, last_column + 1)
+    )
+
+
+def boundary_rings(boundary: Dict[str, Any]) -> List[List[Tuple[float, float]]]:
+    """Get the rings of a GeoJSON Polygon or MultiPolygon as (latitude, longitude) vertices.
+
+    Outer rings and holes of every polygon are returned together, without
+    the closing vertex; PreparedPolygon treats them with the even-odd rule.
+
+    Args:
+        boundary: GeoJSON geometry with [longitude, latitude] positions
+
+    Returns:
+        List of rings
+    """
+    polygons = [boundary["coordinates"]] if boundary["type"] == "Polygon" else boundary["coordinates"]
+    rings = []
+    for polygon in polygons:
+        for ring in polygon:
+            vertices = [(position[1], position[0]) for position in ring]
+            if len(vertices) > 1 and vertices[0] == vertices[-1]:
+                vertices.pop()
+            rings.append(vertices)
+    return rings
+
+
+class PreparedPolygon:
+    """Polygon or multipolygon prepared for repeated point-in-polygon tests.
+
+    Edges are treated as straight lines in latitude/longitude, which is
+    accurate at campus scale. The bounding box rejects distant points
+    outright; edges are bucketed into horizontal slabs of equal height, so a
+    point is only tested against the edges of its own slab. All rings use the
+    even-odd rule, which handles holes and the parts of a multipolygon alike.
+    """
+
+    # Slabs per edge; more slabs mean fewer edges tested per point but more memory
+    SLABS_PER_EDGE = 0.5
+    MAX_SLABS = 1024
+
+    def __init__(self, rings: Iterable[Sequence[Tuple[float, float]]]):
+        """Prepare the edges of a polygon.
+
+        Args:
+            rings: Rings of (latitude, longitude) vertices, without closing vertices
+
+        Raises:
+            ValueError: If there are no edges
+        """
+        edges = []
+        for ring in rings:
+            for i in range(len(ring)):
+                (lat1, lon1), (lat2, lon2) = ring[i - 1], ring[i]
+                edges.append((lat1, lon1, lat2, lon2))
+        if not edges:
+            raise ValueError("Polygon has no edges")
+        self.edges = edges
+
+        self.lat_min = min(min(edge[0], edge[2]) for edge in edges)
+        self.lat_max = max(max(edge[0], edge[2]) for edge in edges)
+        self.lon_min = min(min(edge[1], edge[3]) for edge in edges)
+        self.lon_max = max(max(edge[1], edge[3]) for edge in edges)
+
+        self._slab_count = max(1, min(int(len(edges) * self.SLABS_PER_EDGE), self.MAX_SLABS))
+        self._slab_height = (self.lat_max - self.lat_min) / self._slab_count or 1.0
+        self._slabs: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(self._slab_count)]
+        for edge in edges:
+            # Horizontal edges never cross a ray cast along the latitude
+            if edge[0] == edge[2]:
+                continue
+            first = self._slab(min(edge[0], edge[2]))
+            last = self._slab(max(edge[0], edge[2]))
+            for slab in range(first, last + 1):
+                self._slabs[slab].append(edge)
+
+    @property
+    def bounds(self) -> Bounds:
+        """Bounding box as (min latitude, max latitude, min longitude, max longitude)."""
+        return self.lat_min, self.lat_max, self.lon_min, self.lon_max
+
+    def _slab(self, lat: float) -> int:
+        return min(max(int((lat - self.lat_min) / self._slab_height), 0), self._slab_count - 1)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Check whether a point lies inside the polygon.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside
+        """
+        if not (self.lat_min <= lat <= self.lat_max and self.lon_min <= lon <= self.lon_max):
+            return False
+
+        inside = False
+        for lat1, lon1, lat2, lon2 in self._slabs[self._slab(lat)]:
+            if (lat1 > lat) != (lat2 > lat):
+                if lon < lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1):
+                    inside = not inside
+        return inside
+
+    def distance(self, lat: float, lon: float) -> float:
+        """Distance in meters from a point to the polygon, 0 for points inside.
+
+        Uses an equirectangular projection around the point, which is
+        accurate for points near the polygon.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Distance in meters
+        """
+        if self.contains(lat, lon):
+            return 0.0
+        return self.boundary_distance(lat, lon)
+
+    def boundary_distance(self, lat: float, lon: float) -> float:
+        """Distance in meters from a point to the nearest edge, inside or outside.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Distance in meters
+        """
+        kx = METERS_PER_DEGREE * math.cos(math.radians(lat))
+        ky = METERS_PER_DEGREE
+        nearest = math.inf
+        for lat1, lon1, lat2, lon2 in self.edges:
+            x1, y1 = (lon1 - lon) * kx, (lat1 - lat) * ky
+            dx, dy = (lon2 - lon1) * kx, (lat2 - lat1) * ky
+            length = dx * dx + dy * dy
+            t = max(0.0, min(1.0, -(x1 * dx + y1 * dy) / length)) if length else 0.0
+            nearest = min(nearest, math.hypot(x1 + t * dx, y1 + t * dy))
+        return nearest
+
+
+@functools.lru_cache(maxsize=256)
+def prepare_boundary(boundary: str) -> PreparedPolygon:
+    """Prepare a stored office boundary, memoizing the result.
+
+    Args:
+        boundary: GeoJSON Polygon or MultiPolygon as stored on the office
+
+    Returns:
+        The prepared polygon
+    """
+    return PreparedPolygon(boundary_rings(json.loads(boundary)))
+
+
+class CircleFence:
+    """Circular fence prepared for a tiered containment test.
+
+    Most points are decided without trigonometry:
+
+    1. Points outside the bounding box are rejected.
+    2. A local equirectangular projection, scaling longitude by the cosine
+       of the center latitude, gives the angular distance A. With
+       u = A / cos(lat0), the great circle distance differs from A by at
+       most A * (u + u^2) for u <= 0.01: the point's own cos(lat) differs
+       from cos(lat0) by at most |dlat| <= A, a relative change of the
+       east-west term of at most u, and replacing the haversines and the
+       central angle by their arguments adds at most
+       dlat^2/12 + dlon^2/12 + A^2/3 <= u^2. Points whose distance is
+       decided by that bound are answered from precomputed thresholds on A^2.
+    3. Only points within the error bound of the edge, or where u is too
+       large to trust the projection, use the exact haversine distance.
+
+    Longitude differences are wrapped, so fences on the antimeridian need no
+    special case. Near the poles cos(lat0) is small and the exact distance
+    is used more often.
+    """
+
+    __slots__ = (
+        "latitude", "longitude", "radius", "cos_lat", "_lat_reach", "_lon_reach",
+        "_inside2", "_outside2", "_valid2", "_tolerance2",
+    )
+
+    def __init__(self, latitude: float, longitude: float, radius: float):
+        """Precompute the bounding box and thresholds of a fence.
+
+        Args:
+            latitude: Latitude of the center
+            longitude: Longitude of the center
+            radius: Radius in meters
+        """
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        self.cos_lat = cos_lat = math.cos(math.radians(latitude))
+
+        bounds = _circle_bounds(latitude, longitude, radius)
+        if bounds is None:
+            self._lat_reach = self._lon_reach = math.inf
+        else:
+            self._lat_reach = max(latitude - bounds[0], bounds[1] - latitude)
+            self._lon_reach = max(longitude - bounds[2], bounds[3] - longitude)
+
+        # Thresholds on the squared projected distance in degrees
+        radius_degrees = radius / METERS_PER_DEGREE
+        u_radius = radius / EARTH_RADIUS_METERS / cos_lat if cos_lat > 0 else math.inf
+        self._valid2 = (math.degrees(_PLANAR_MAX_U * cos_lat)) ** 2
+        if 2 * u_radius <= _PLANAR_MAX_U:
+            # The bound grows with A, so the one at A = r covers every point inside...
+            self._inside2 = (radius_degrees / (1 + u_radius + u_radius ** 2)) ** 2
+            # ...and A * (1 - bound) grows with A, so one point beyond r decides all farther ones
+            u_outer = 2 * u_radius
+            self._outside2 = (radius_degrees / (1 - u_outer - u_outer ** 2)) ** 2
+        else:
+            self._inside2, self._outside2 = -1.0, math.inf
+
+        # Largest A whose error bound is within the reporting tolerance, from u^2 * (1 + u) <= k
+        k = DISTANCE_TOLERANCE_METERS / (EARTH_RADIUS_METERS * cos_lat) if cos_lat > 0 else 0.0
+        u_tolerance = min(math.sqrt(k / (1 + math.sqrt(k))), _PLANAR_MAX_U)
+        self._tolerance2 = math.degrees(u_tolerance * cos_lat) ** 2
+
+    def _projected2(self, lat: float, lon: float) -> float:
+        """Squared projected distance in degrees."""
+        dlat = lat - self.latitude
+        dlon = lon - self.longitude
+        if dlon > 180:
+            dlon -= 360
+        elif dlon < -180:
+            dlon += 360
+        dlon *= self.cos_lat
+        return dlat * dlat + dlon * dlon
+
+    def haversine(self, lat: float, lon: float) -> float:
+        """Exact great circle distance in meters from a point to the center."""
+        a = (
+            math.sin(math.radians(lat - self.latitude) / 2) ** 2
+            + math.cos(math.radians(lat)) * self.cos_lat * math.sin(math.radians(lon - self.longitude) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_METERS * math.asin(min(math.sqrt(a), 1.0))
+
+    def approximate(self, lat: float, lon: float) -> Tuple[float, float]:
+        """Projected distance in meters from a point to the center, with its error bound.
+
+        Returns:
+            Approximate distance and a bound on its absolute error, infinite
+            where the projection is not trusted
+        """
+        distance = math.sqrt(self._projected2(lat, lon)) * METERS_PER_DEGREE
+        u = distance / EARTH_RADIUS_METERS / self.cos_lat if self.cos_lat > 0 else math.inf
+        if u > _PLANAR_MAX_U:
+            return distance, math.inf
+        return distance, distance * (u + u * u)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Check whether a point lies inside the fence.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside
+        """
+        dlat = lat - self.latitude
+        if dlat > self._lat_reach or dlat < -self._lat_reach:
+            return False
+        dlon = lon - self.longitude
+        if dlon > 180:
+            dlon -= 360
+        elif dlon < -180:
+            dlon += 360
+        if dlon > self._lon_reach or dlon < -self._lon_reach:
+            return False
+
+        dlon *= self.cos_lat
+        projected2 = dlat * dlat + dlon * dlon
+        if projected2 <= self._inside2:
+            return True
+        if self._outside2 < projected2 <= self._valid2:
+            return False
+        return self.haversine(lat, lon) <= self.radius
+
+    def check(self, lat: float, lon: float) -> Tuple[bool, float]:
+        """Check a point and measure its distance to the center, as reported to users.
+
+        The projected distance is only reported where its error bound is
+        within DISTANCE_TOLERANCE_METERS.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside and its distance in meters
+        """
+        dlat = lat - self.latitude
+        dlon = lon - self.longitude
+        if dlon > 180:
+            dlon -= 360
+        elif dlon < -180:
+            dlon += 360
+        dlon *= self.cos_lat
+        projected2 = dlat * dlat + dlon * dlon
+        if projected2 <= self._tolerance2:
+            if projected2 <= self._inside2:
+                return True, math.sqrt(projected2) * METERS_PER_DEGREE
+            if self._outside2 < projected2:
+                return False, math.sqrt(projected2) * METERS_PER_DEGREE
+        distance = self.haversine(lat, lon)
+        return distance <= self.radius, distance
+
+
+@functools.lru_cache(maxsize=4096)
+def prepare_circle(latitude: float, longitude: float, radius: float) -> CircleFence:
+    """Prepare a circular fence, memoizing the result.
+
+    Args:
+        latitude: Latitude of the center
+        longitude: Longitude of the center
+        radius: Radius in meters
+
+    Returns:
+        The prepared fence
+    """
+    return CircleFence(latitude, longitude, radius)
+
+
+def build_index(
+    fences: Iterable[Tuple[int, str, float, float, float, Optional[List[List[Tuple[float, float]]]]]],
+    watermark: Watermark,
+    cell_degrees: float,
+) -> bytes:
+    """Serialize office geofences into the flat index format read by GeofenceIndex.
+
+    The layout is a fixed header followed by packed little-endian arrays:
+    office IDs, latitudes, longitudes, radii, latitudes and longitudes in
+    radians and cosines of latitude, boundary vertex latitudes and longitudes
+    (float64), sorted grid cell keys (int64), per-cell offsets into the cell
+    entries, the cell entries themselves (positions of the fences overlapping
+    each cell), fences too large for the grid, per-fence offsets into the
+    boundary rings, per-ring offsets into the vertices, name offsets (uint32)
+    and finally the UTF-8 office names. Circular fences have no rings.
+
+    Args:
+        fences: (office ID, name, latitude, longitude, radius, boundary rings
+            or None) per office, rings as returned by boundary_rings
+        watermark: Office table watermark the fences were read at
+        cell_degrees: Grid cell size in degrees
+
+    Returns:
+        The serialized index
+    """
+    fences = sorted(fences, key=lambda fence: fence[0])
+    ids, names = array("q"), bytearray()
+    latitudes, longitudes, radii = array("d"), array("d"), array("d")
+    lat_rads, lon_rads, cos_lats = array("d"), array("d"), array("d")
+    vertex_lats, vertex_lons = array("d"), array("d")
+    fence_rings, ring_offsets = array("I", [0]), array("I", [0])
+    name_offsets, oversize = array("I", [0]), array("I")
+    cells = {}
+
+    for position, (office_id, name, latitude, longitude, radius, rings) in enumerate(fences):
+        ids.append(office_id)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        radii.append(radius)
+        lat_rads.append(math.radians(latitude))
+        lon_rads.append(math.radians(longitude))
+        cos_lats.append(math.cos(math.radians(latitude)))
+        names += name.encode()
+        name_offsets.append(len(names))
+
+        if rings:
+            for ring in rings:
+                for vertex_lat, vertex_lon in ring:
+                    vertex_lats.append(vertex_lat)
+                    vertex_lons.append(vertex_lon)
+                ring_offsets.append(len(vertex_lats))
+            bounds = PreparedPolygon(rings).bounds
+        else:
+            bounds = _circle_bounds(latitude, longitude, radius)
+        fence_rings.append(len(ring_offsets) - 1)
+
+        keys = _fence_cells(bounds, cell_degrees)
+        if keys is None:
+            oversize.append(position)
+        else:
+            for key in keys:
+                cells.setdefault(key, []).append(position)
+
+    cell_keys, cell_offsets, cell_entries = array("q"), array("I", [0]), array("I")
+    for key in sorted(cells):
+        cell_keys.append(key)
+        cell_entries.extend(cells[key])
+        cell_offsets.append(len(cell_entries))
+
+    header = _HEADER.pack(
+        _MAGIC, _FORMAT_VERSION, time.time_ns(), *watermark, cell_degrees,
+        len(ids), len(cell_keys), len(cell_entries), len(oversize), len(ring_offsets) - 1,
+        len(vertex_lats), len(names),
+    )
+    # Eight-byte arrays first so every array starts aligned to its item size
+    return b"".join([
+        header.ljust(_HEADER_SIZE, b"\0"),
+        ids.tobytes(), latitudes.tobytes(), longitudes.tobytes(), radii.tobytes(),
+        lat_rads.tobytes(), lon_rads.tobytes(), cos_lats.tobytes(),
+        vertex_lats.tobytes(), vertex_lons.tobytes(), cell_keys.tobytes(),
+        cell_offsets.tobytes(), cell_entries.tobytes(), oversize.tobytes(),
+        fence_rings.tobytes(), ring_offsets.tobytes(), name_offsets.tobytes(),
+        bytes(names),
+    ])
+
+
+class NearestFences:
+    """Best-first nearest neighbor search over the fences of an index.
+
+    Fence centers are stored as unit vectors in a k-d tree, so there is no
+    special case at the antimeridian or the poles. Every node keeps the
+    bounding box of its centers and the largest reach of its fences: 0 for
+    circles, whose distance is measured to the center, and the farthest
+    vertex for boundaries, whose distance is measured to the nearest edge.
+    The chord from a point to a node's box bounds the distance to every
+    center in it, so the great circle distance of that chord minus the reach
+    bounds the distance to every fence in the node.
+
+    A search pops nodes and fences from a heap ordered by those bounds and
+    measured distances; a fence popped before every remaining bound is the
+    next nearest. Only nodes that may hold a nearer fence are opened, so a
+    query evaluates a few leaves instead of every fence.
+    """
+
+    LEAF_SIZE = 8
+
+    def __init__(self, index: "GeofenceIndex"):
+        """Build the tree over the fences of an index.
+
+        Args:
+            index: Index whose fences are searched
+        """
+        self._index = index
+        self._points: List[Tuple[float, float, float]] = []
+        self._reaches: List[float] = []
+        for position in range(len(index)):
+            cos_lat = index._cos_lats[position]
+            lon_rad = index._lon_rads[position]
+            self._points.append((
+                cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(index._lat_rads[position])
+            ))
+            reach = 0.0
+            polygon = index.polygon(position)
+            if polygon is not None:
+                circle = index.circle(position)
+                farthest = max(
+                    circle.haversine(lat, lon) for edge in polygon.edges for lat, lon in (edge[:2], edge[2:])
+                )
+                # Edges are straight in latitude/longitude and measured on a plane
+                reach = farthest * _BOUNDS_MARGIN
+            self._reaches.append(reach)
+
+        # (box minimum, box maximum, largest reach, children or fence positions, is leaf) per node
+        self._nodes: List[Tuple[Tuple[float, ...], Tuple[float, ...], float, Tuple[int, ...], bool]] = []
+        if len(index):
+            self._build(list(range(len(index))))
+
+    def _build(self, positions: List[int]) -> int:
+        """Add the subtree over some fences and return its node number."""
+        points = [self._points[position] for position in positions]
+        low = tuple(min(point[axis] for point in points) for axis in range(3))
+        high = tuple(max(point[axis] for point in points) for axis in range(3))
+        reach = max(self._reaches[position] for position in positions)
+        node = len(self._nodes)
+        self._nodes.append((low, high, reach, (), True))
+        if len(positions) <= self.LEAF_SIZE:
+            self._nodes[node] = (low, high, reach, tuple(positions), True)
+            return node
+
+        axis = max(range(3), key=lambda axis: high[axis] - low[axis])
+        positions.sort(key=lambda position: self._points[position][axis])
+        middle = len(positions) // 2
+        children = (self._build(positions[:middle]), self._build(positions[middle:]))
+        self._nodes[node] = (low, high, reach, children, False)
+        return node
+
+    def _bound(self, node: int, point: Tuple[float, float, float]) -> float:
+        """Lower bound in meters of the distance from a point to any fence of a node."""
+        low, high, reach, _, _ = self._nodes[node]
+        chord2 = 0.0
+        for axis in range(3):
+            value = point[axis]
+            if value < low[axis]:
+                chord2 += (low[axis] - value) ** 2
+            elif value > high[axis]:
+                chord2 += (value - high[axis]) ** 2
+        distance = 2 * EARTH_RADIUS_METERS * math.asin(min(math.sqrt(chord2) / 2, 1.0))
+        # Reported distances may be off by the tolerance
+        return max(distance - reach - DISTANCE_TOLERANCE_METERS, 0.0)
+
+    def search(
+        self, lat: float, lon: float, k: int, max_distance: Optional[float] = None
+    ) -> List[Tuple[int, bool, float]]:
+        """Find the fences nearest to a point.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+            k: Maximum number of fences to return
+            max_distance: Maximum distance in meters, unlimited if None
+
+        Returns:
+            Position, whether the point is inside and distance as reported by
+            GeofenceIndex.check, for up to k fences, nearest first
+        """
+        if not self._nodes or k <= 0:
+            return []
+
+        lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+        point = (math.cos(lat_rad) * math.cos(lon_rad), math.cos(lat_rad) * math.sin(lon_rad), math.sin(lat_rad))
+        # (bound or distance, tie breaker, node number or -1 for a fence, fence result)
+        heap: List[Tuple[float, int, int, Optional[Tuple[int, bool, float]]]] = [(self._bound(0, point), 0, 0, None)]
+        ties = itertools.count(1)
+        found = []
+        while heap and len(found) < k:
+            bound, _, node, fence = heapq.heappop(heap)
+            if max_distance is not None and bound > max_distance:
+                break
+            if fence is not None:
+                found.append(fence)
+                continue
+
+            _, _, _, children, leaf = self._nodes[node]
+            if leaf:
+                for position in children:
+                    inside, distance = self._index.check(position, lat, lon)
+                    heapq.heappush(heap, (distance, next(ties), -1, (position, inside, distance)))
+            else:
+                for child in children:
+                    heapq.heappush(heap, (self._bound(child, point), next(ties), child, None))
+        return found
+
+
+class GeofenceIndex:
+    """Read-only view of a serialized geofence index.
+
+    All arrays are memoryviews into the underlying buffer, usually a
+    read-only memory map shared by every worker on the host, so reading the
+    index copies nothing but the values actually used.
+    """
+
+    def __init__(self, buffer):
+        """Parse the header and map the arrays.
+
+        Args:
+            buffer: Buffer holding an index produced by build_index
+
+        Raises:
+            ValueError: If the buffer does not hold a supported index
+        """
+        view = memoryview(buffer)
+        if len(view) < _HEADER_SIZE:
+            raise ValueError("Geofence index is truncated")
+        (
+            magic, version, self.generation, count, max_id, recent, self.cell_degrees,
+            fences, cells, entries, oversize, rings, vertices, name_bytes,
+        ) = _HEADER.unpack_from(view)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported geofence index format {magic!r} version {version}")
+        self.watermark: Watermark = (count, max_id, recent)
+        self._columns = _cell_columns(self.cell_degrees)
+
+        offset = _HEADER_SIZE
+
+        def take(fmt: str, length: int) -> memoryview:
+            nonlocal offset
+            size = length * struct.calcsize(fmt)
+            if offset + size > len(view):
+                raise ValueError("Geofence index is truncated")
+            section = view[offset:offset + size].cast(fmt)
+            offset += size
+            return section
+
+        self.ids = take("q", fences)
+        self.latitudes = take("d", fences)
+        self.longitudes = take("d", fences)
+        self.radii = take("d", fences)
+        self._lat_rads = take("d", fences)
+        self._lon_rads = take("d", fences)
+        self._cos_lats = take("d", fences)
+        self._vertex_lats = take("d", vertices)
+        self._vertex_lons = take("d", vertices)
+        self._cell_keys = take("q", cells)
+        self._cell_offsets = take("I", cells + 1)
+        self._cell_entries = take("I", entries)
+        self._oversize = take("I", oversize)
+        self._fence_rings = take("I", fences + 1)
+        self._ring_offsets = take("I", rings + 1)
+        self._name_offsets = take("I", fences + 1)
+        self._names = take("B", name_bytes)
+        # Fences are prepared on first use by each process
+        self._polygons: Dict[int, PreparedPolygon] = {}
+        self._circles: Dict[int, CircleFence] = {}
+        self._nearest: Optional[NearestFences] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def name(self, position: int) -> str:
+        """Get the office name of the fence at a position."""
+        return bytes(self._names[self._name_offsets[position]:self._name_offsets[position + 1]]).decode()
+
+    def position(self, office_id: int) -> Optional[int]:
+        """Get the position of an office's fence, or None if the office is not indexed."""
+        position = bisect.bisect_left(self.ids, office_id)
+        if position < len(self.ids) and self.ids[position] == office_id:
+            return position
+        return None
+
+    def distance(self, position: int, lat: float, lon: float) -> float:
+        """Great circle distance in meters from a point to the center of a fence.
+
+        Args:
+            position: Position of the fence in the index
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Distance in meters
+        """
+        lat_rad = math.radians(lat)
+        a = (
+            math.sin((lat_rad - self._lat_rads[position]) / 2) ** 2
+            + math.cos(lat_rad) * self._cos_lats[position]
+            * math.sin((math.radians(lon) - self._lon_rads[position]) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+    def polygon(self, position: int) -> Optional[PreparedPolygon]:
+        """Get the prepared boundary of a fence, or None for circular fences."""
+        polygon = self._polygons.get(position)
+        if polygon is None:
+            first, last = self._fence_rings[position], self._fence_rings[position + 1]
+            if first == last:
+                return None
+            polygon = PreparedPolygon([
+                list(zip(
+                    self._vertex_lats[self._ring_offsets[ring]:self._ring_offsets[ring + 1]],
+                    self._vertex_lons[self._ring_offsets[ring]:self._ring_offsets[ring + 1]],
+                ))
+                for ring in range(first, last)
+            ])
+            self._polygons[position] = polygon
+        return polygon
+
+    def circle(self, position: int) -> CircleFence:
+        """Get the prepared circle of a fence."""
+        circle = self._circles.get(position)
+        if circle is None:
+            circle = CircleFence(self.latitudes[position], self.longitudes[position], self.radii[position])
+            self._circles[position] = circle
+        return circle
+
+    def contains(self, position: int, lat: float, lon: float) -> bool:
+        """Check whether a fence contains a point.
+
+        Fences with a boundary use a point-in-polygon test, the others the
+        tiered test of CircleFence.
+
+        Args:
+            position: Position of the fence in the index
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside the fence
+        """
+        polygon = self.polygon(position)
+        if polygon is not None:
+            return polygon.contains(lat, lon)
+        return self.circle(position).contains(lat, lon)
+
+    def check(self, position: int, lat: float, lon: float) -> Tuple[bool, float]:
+        """Check a point against a fence and measure the distance reported to users.
+
+        The distance is to the center for circular fences and to the
+        boundary, 0 inside, for fences with a boundary.
+
+        Args:
+            position: Position of the fence in the index
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Whether the point is inside the fence and its distance in meters
+        """
+        polygon = self.polygon(position)
+        if polygon is not None:
+            distance = polygon.distance(lat, lon)
+            return distance == 0.0, distance
+        return self.circle(position).check(lat, lon)
+
+    def candidates(self, lat: float, lon: float) -> Sequence[int]:
+        """Get the positions of the fences that may contain a point.
+
+        Every fence containing the point is returned, along with fences whose
+        bounding box contains it but whose circle or polygon does not.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Fence positions, in no particular order
+        """
+        key = _cell_key(lat, lon, self.cell_degrees, self._columns)
+        i = bisect.bisect_left(self._cell_keys, key)
+        if i < len(self._cell_keys) and self._cell_keys[i] == key:
+            in_cell = self._cell_entries[self._cell_offsets[i]:self._cell_offsets[i + 1]]
+            return list(in_cell) + list(self._oversize) if len(self._oversize) else in_cell
+        return self._oversize
+
+    def containing(self, lat: float, lon: float) -> List[int]:
+        """Get the positions of the fences containing a point.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+
+        Returns:
+            Fence positions
+        """
+        return [position for position in self.candidates(lat, lon) if self.contains(position, lat, lon)]
+
+    def candidate_pairs(self) -> Set[Tuple[int, int]]:
+        """Get the pairs of fences whose bounding boxes share a grid cell.
+
+        This is a spatial join over the grid: every pair of fences that
+        overlap is returned, along with pairs that are merely close. Fences
+        too large to list their cells are paired with every other fence.
+
+        Returns:
+            Pairs of fence positions, the lower position first
+        """
+        pairs: Set[Tuple[int, int]] = set()
+        for i in range(len(self._cell_keys)):
+            in_cell = sorted(self._cell_entries[self._cell_offsets[i]:self._cell_offsets[i + 1]])
+            for j, first in enumerate(in_cell):
+                for second in in_cell[j + 1:]:
+                    pairs.add((first, second))
+        for oversize in self._oversize:
+            for position in range(len(self)):
+                if position != oversize:
+                    pairs.add((min(oversize, position), max(oversize, position)))
+        return pairs
+
+    def nearest(
+        self, lat: float, lon: float, k: int, max_distance: Optional[float] = None
+    ) -> List[Tuple[int, bool, float]]:
+        """Find the fences nearest to a point, see NearestFences.
+
+        The search tree is built on first use, once per index generation.
+
+        Args:
+            lat: Latitude of the point
+            lon: Longitude of the point
+            k: Maximum number of fences to return
+            max_distance: Maximum distance in meters, unlimited if None
+
+        Returns:
+            Position, whether the point is inside and distance, for up to k
+            fences, nearest first
+        """
+        if self._nearest is None:
+            self._nearest = NearestFences(self)
+        return self._nearest.search(lat, lon, k, max_distance)
+
+
+class SharedGeofenceIndex:
+    """Office geofence index shared by all workers on a host through a file.
+
+    The index is written to a flat binary file that every worker memory-maps
+    read-only, so the data exists once in the page cache no matter how many
+    workers run. A new generation is written to a temporary file and renamed
+    over the old one; workers notice the new file on their next lookup and
+    map it, while lookups still using the previous mapping finish on it.
+
+    The database stays the source of truth: every refresh interval a worker
+    compares a cheap watermark of the offices table with the one recorded in
+    the index and rebuilds the index when they differ. updated_at is stamped
+    by the database clock, and the watermark checksums the stamps of every
+    office changed within overlap_seconds before the latest one, so a change
+    that committed after a later-stamped one still alters it. As a backstop
+    for anything the overlap missed, an index older than max_age_seconds is
+    rebuilt. Office changes made through the API publish a new generation
+    right away. If the file cannot be written the index is kept in process
+    memory instead.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cell_degrees: float = 0.01,
+        refresh_interval_seconds: float = 10.0,
+        overlap_seconds: float = 60.0,
+        max_age_seconds: float = 300.0,
+    ):
+        """Initialize the shared index.
+
+        Args:
+            path: Path of the index file
+            cell_degrees: Grid cell size in degrees
+            refresh_interval_seconds: Interval for comparing the index with the database
+            overlap_seconds: How long before the latest change the watermark covers changes
+            max_age_seconds: Age at which the index is rebuilt even if the watermark is unchanged
+        """
+        self.path = path
+        self.cell_degrees = cell_degrees
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_age_seconds = max_age_seconds
+        self._index: Optional[GeofenceIndex] = None
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def _watermark(self, db: Session) -> Watermark:
+        count, max_id, max_updated = db.query(
+            func.count(Office.id), func.max(Office.id), func.max(Office.updated_at)
+        ).one()
+        if max_updated is None:
+            return count, max_id or 0, 0
+
+        # The maximum alone misses a change stamped before it that committed after it
+        recent = db.query(Office.id, Office.updated_at).filter(
+            Office.updated_at > max_updated - timedelta(seconds=self.overlap_seconds)
+        ).order_by(Office.id).all()
+        stamps = array("q")
+        for office_id, updated_at in recent:
+            stamps.extend((office_id, int(updated_at.timestamp() * 1_000_000)))
+        return count, max_id or 0, zlib.crc32(stamps.tobytes())
+
+    def _map_file(self) -> bool:
+        """Map the index file if it changed since it was last mapped.
+
+        Returns:
+            Whether a mapped index is available
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._index is not None
+        file_id = (stat.st_ino, stat.st_mtime_ns)
+        if file_id == self._file_id:
+            return True
+
+        try:
+            with open(self.path, "rb") as f:
+                index = GeofenceIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable geofence index %s: %s", self.path, str(e))
+            return self._index is not None
+
+        # The previous mapping is released once no lookup uses it any more
+        self._index, self._file_id = index, file_id
+        logger.debug("Mapped geofence index generation %d with %d fences", index.generation, len(index))
+        return True
+
+    def _publish(self, data: bytes) -> None:
+        """Atomically replace the index file and map the new generation."""
+        directory = os.path.dirname(self.path) or "."
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix=".geofence-", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logger.warning("Keeping geofence index in memory, cannot write %s: %s", self.path, str(e))
+            # Count the stale file as mapped, so only a newer file another process publishes replaces this index
+            try:
+                stat = os.stat(self.path)
+                file_id: Optional[Tuple[int, int]] = (stat.st_ino, stat.st_mtime_ns)
+            except OSError:
+                file_id = None
+            self._index, self._file_id = GeofenceIndex(data), file_id
+            return
+        self._map_file()
+
+    def load(self, db: Optional[Session] = None) -> int:
+        """Rebuild the index from the database and publish it.
+
+        Args:
+            db: Database session, a new one is used if not given
+
+        Returns:
+            Number of fences in the index
+        """
+        session = db if db is not None else SessionLocal()
+        try:
+            with self._lock:
+                watermark = self._watermark(session)
+                rows = session.query(
+                    Office.id, Office.name, Office.latitude, Office.longitude, Office.radius, Office.boundary
+                ).all()
+                fences = [
+                    (*row[:5], boundary_rings(json.loads(row[5])) if row[5] else None)
+                    for row in rows
+                ]
+                self._publish(build_index(fences, watermark, self.cell_degrees))
+                self._next_check = time.monotonic() + self.refresh_interval_seconds
+        finally:
+            if db is None:
+                session.close()
+
+        logger.info("Built geofence index with %d fences", len(rows))
+        return len(rows)
+
+    def index(self, db: Session) -> GeofenceIndex:
+        """Get the current index, rebuilding it if it is missing or out of date.
+
+        Args:
+            db: Database session used to check and rebuild the index
+
+        Returns:
+            The current geofence index
+        """
+        mapped = self._map_file()
+        if mapped and time.monotonic() < self._next_check:
+            return self._index
+
+        with self._lock:
+            self._next_check = time.monotonic() + self.refresh_interval_seconds
+            watermark = self._watermark(db)
+        if not mapped or self._index.watermark != watermark or self._expired():
+            self.load(db)
+        return self._index
+
+    def _expired(self) -> bool:
+        """Whether the mapped index is older than the maximum age."""
+        return time.time_ns() - self._index.generation > self.max_age_seconds * 1_000_000_000
+
+
+office_geofences = SharedGeofenceIndex(
+    settings.GEOFENCE_INDEX_PATH,
+    cell_degrees=settings.GEOFENCE_INDEX_CELL_DEGREES,
+    refresh_interval_seconds=settings.GEOFENCE_INDEX_REFRESH_SECONDS,
+    overlap_seconds=settings.GEOFENCE_INDEX_OVERLAP_SECONDS,
+    max_age_seconds=settings.GEOFENCE_INDEX_MAX_AGE_SECONDS,
+)
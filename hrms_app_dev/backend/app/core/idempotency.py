@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.metrics import cache_requests
+from app.logger import logger
+from app.models.models import AttendanceRecord, IdempotencyKey
+
+
+class IdempotencyService:
+    """Deduplicate retried attendance writes using client-supplied keys.
+
+    A key is remembered together with the attendance record it produced, so a
+    retried request replays the original result instead of failing with
+    "already checked in" or "no active check-in".
+    """
+
+    @staticmethod
+    def get_replay(
+        db: Session, user_id: int, key: str, endpoint: str
+    ) -> Optional[AttendanceRecord]:
+        """Look up the record produced by an earlier request with the same key.
+
+        Args:
+            db: Database session
+            user_id: ID of the user sending the request
+            key: Client-supplied idempotency key
+            endpoint: Name of the operation the key is used for
+
+        Returns:
+            The previously produced attendance record, or None if the key is new
+
+        Raises:
+            HTTPException: If the key was already used for a different operation
+        """
+        entry = db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key
+        ).first()
+
+        if not entry:
+            cache_requests.inc("idempotency", "miss")
+            return None
+
+        # Expired keys are dropped so the client may reuse them
+        if entry.expires_at < datetime.now():
+            db.delete(entry)
+            db.flush()
+            cache_requests.inc("idempotency", "miss")
+            return None
+
+        if entry.endpoint != endpoint:
+            logger.warning(
+                "Idempotency key %s for user %d reused for %s (originally %s)",
+                key, user_id, endpoint, entry.endpoint
+            )
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency key was already used for a different operation",
+            )
+
+        cache_requests.inc("idempotency", "hit")
+        logger.debug("Replaying %s for user %d with idempotency key %s", endpoint, user_id, key)
+        return entry.attendance_record
+
+    @staticmethod
+    def remember(
+        db: Session, user_id: int, key: str, endpoint: str, record: AttendanceRecord
+    ) -> None:
+        """Store a key for the record it produced.
+
+        The entry is added to the current transaction, so it is committed
+        together with the attendance write it protects.
+
+        Args:
+            db: Database session
+            user_id: ID of the user sending the request
+            key: Client-supplied idempotency key
+            endpoint: Name of the operation the key is used for
+            record: Attendance record produced by the operation
+        """
+        now = datetime.now()
+        db.add(IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            endpoint=endpoint,
+            attendance_record=record,
+            created_at=now,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+        ))
+
+    @staticmethod
+    def purge_expired(db: Session) -> int:
+        """Delete all expired keys.
+
+        Args:
+            db: Database session
+
+        Returns:
+            Number of deleted keys
+        """
+        deleted = db.query(IdempotencyKey).filter(
+            IdempotencyKey.expires_at < datetime.now()
+        ).delete(synchronize_session=False)
+        db.commit()
+
+        if deleted:
+            logger.info("Purged %d expired idempotency keys", deleted)
+        return deleted
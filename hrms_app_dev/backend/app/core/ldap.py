@@ -1,7 +1,5 @@
 import ssl
 from typing import Tuple, Optional, Dict, Any
-from ldap3 import Server, Connection, ALL, SIMPLE
-from ldap3.core.exceptions import LDAPException
 
 from app.config import settings
 from app.logger import logger
@@ -22,6 +20,10 @@ class LDAPAuth:
         Returns:
             Tuple of (True, DN string) if successful, else (False, None)
         """
+        # ldap3 is only needed once someone logs in, so keep it out of startup
+        from ldap3 import ALL, SIMPLE, Connection, Server
+        from ldap3.core.exceptions import LDAPException
+
         try:
             # Build full user UPN
             user_upn = f"{username}@{settings.LDAP_DOMAIN}"
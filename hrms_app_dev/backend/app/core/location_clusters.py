@@ -0,0 +1,435 @@
+import math
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.geofence import GeofenceService
+from app.core.geofence_index import EARTH_RADIUS_METERS, METERS_PER_DEGREE, office_geofences
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import AttendanceRecord, LocationCluster, LocationClusterRun, LocationType
+
+# (row, column) of a grid cell
+_CellKey = Tuple[int, int]
+
+
+class _Grid:
+    """Grid of cells about half eps_meters on each side.
+
+    Rows are cell_degrees of latitude high. Each row has as many columns as
+    fit at its edge nearest the equator, so cells are never wider than high
+    and every two check-ins of a cell are within eps_meters of each other.
+    Rows near the poles have few columns, which keeps the neighbors of a
+    cell few there as well.
+    """
+
+    def __init__(self, eps_meters: float):
+        self.eps_meters = eps_meters
+        self.cell_degrees = eps_meters / 2 / METERS_PER_DEGREE
+        self._columns: Dict[int, int] = {}
+
+    def columns(self, row: int) -> int:
+        """Get the number of columns of a row."""
+        columns = self._columns.get(row)
+        if columns is None:
+            south, north = row * self.cell_degrees - 90, (row + 1) * self.cell_degrees - 90
+            widest = 0.0 if south <= 0 <= north else min(abs(south), abs(north))
+            columns = self._columns[row] = max(math.ceil(360 * math.cos(math.radians(widest)) / self.cell_degrees), 1)
+        return columns
+
+    def key(self, lat: float, lon: float) -> _CellKey:
+        """Get the key of the cell containing a point."""
+        row = math.floor((lat + 90) / self.cell_degrees)
+        columns = self.columns(row)
+        return row, math.floor((lon + 180) / 360 * columns) % columns
+
+    def corners(self, key: _CellKey) -> List[Tuple[float, float]]:
+        """Get the corners of a cell."""
+        row, column = key
+        width = 360 / self.columns(row)
+        return [
+            (min((row + corner_row) * self.cell_degrees - 90, 90.0), (column + corner_column) * width - 180)
+            for corner_row in (0, 1)
+            for corner_column in (0, 1)
+        ]
+
+
+class _Cell:
+    """Check-ins aggregated in a grid cell."""
+
+    __slots__ = ("check_ins", "x", "y", "z", "first", "last", "users", "mean", "lat", "lon")
+
+    def __init__(self, check_in_time: datetime):
+        self.check_ins = 0
+        # Sum of the unit vectors of the check-in locations
+        self.x = self.y = self.z = 0.0
+        self.first = self.last = check_in_time
+        self.users: Set[int] = set()
+        # Mean location as a unit vector and in degrees, set by finish
+        self.mean = (0.0, 0.0, 0.0)
+        self.lat = self.lon = 0.0
+
+    def add(self, user_id: int, check_in_time: datetime, lat: float, lon: float) -> None:
+        """Add a check-in."""
+        phi, lam = math.radians(lat), math.radians(lon)
+        cos_phi = math.cos(phi)
+        self.check_ins += 1
+        self.x += cos_phi * math.cos(lam)
+        self.y += cos_phi * math.sin(lam)
+        self.z += math.sin(phi)
+        self.users.add(user_id)
+        if check_in_time < self.first:
+            self.first = check_in_time
+        elif check_in_time > self.last:
+            self.last = check_in_time
+
+    def finish(self) -> None:
+        """Compute the mean location once every check-in is added."""
+        norm = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z) or 1.0
+        self.mean = (self.x / norm, self.y / norm, self.z / norm)
+        self.lat, self.lon = _to_lat_lon(*self.mean)
+
+
+def _to_lat_lon(x: float, y: float, z: float) -> Tuple[float, float]:
+    """Convert a vector to latitude and longitude."""
+    return math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))
+
+
+def _aggregate(
+    db: Session, grid: _Grid, since: Optional[datetime], chunk_size: int
+) -> Tuple[Dict[_CellKey, _Cell], int]:
+    """Read other check-ins in chunks by primary key and add them to their grid cells.
+
+    Returns:
+        Cells with any check-ins and the number of check-ins read
+    """
+    cells: Dict[_CellKey, _Cell] = {}
+    check_ins = 0
+    last_id = 0
+    while True:
+        query = db.query(
+            AttendanceRecord.id,
+            AttendanceRecord.user_id,
+            AttendanceRecord.check_in_time,
+            AttendanceRecord.check_in_latitude,
+            AttendanceRecord.check_in_longitude,
+        ).filter(
+            AttendanceRecord.id > last_id,
+            AttendanceRecord.location_type == LocationType.OTHER,
+        )
+        if since is not None:
+            query = query.filter(AttendanceRecord.check_in_time >= since)
+        rows = query.order_by(AttendanceRecord.id).limit(chunk_size).all()
+        if not rows:
+            break
+
+        for _, user_id, check_in_time, lat, lon in rows:
+            key = grid.key(lat, lon)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = _Cell(check_in_time)
+            cell.add(user_id, check_in_time, lat, lon)
+        check_ins += len(rows)
+        last_id = rows[-1][0]
+
+    for cell in cells.values():
+        cell.finish()
+    return cells, check_ins
+
+
+def _neighbors(cells: Dict[_CellKey, _Cell], grid: _Grid) -> Dict[_CellKey, List[_CellKey]]:
+    """Find the cells whose mean locations are within eps_meters of each other.
+
+    Candidates are the cells overlapping the box of eps_meters around a
+    cell's mean, as wide as eps_meters spans at the box edge closest to a
+    pole. Occupied columns of each row are kept sorted, so only those are
+    looked at.
+    """
+    by_row: Dict[int, List[int]] = defaultdict(list)
+    for row, column in cells:
+        by_row[row].append(column)
+    for row_columns in by_row.values():
+        row_columns.sort()
+
+    # Compare chords of unit vectors, which grow with the great circle distance
+    chord = 2 * math.sin(grid.eps_meters / EARTH_RADIUS_METERS / 2)
+    max_chord_squared = chord * chord
+    eps_degrees = grid.eps_meters / METERS_PER_DEGREE
+    neighbors: Dict[_CellKey, List[_CellKey]] = {}
+    for key, cell in cells.items():
+        south, north = cell.lat - eps_degrees, cell.lat + eps_degrees
+        cos_edge = math.cos(math.radians(min(max(abs(south), abs(north)), 90.0)))
+        # Longitude span either way, None when the box goes all around
+        reach = eps_degrees / cos_edge if cos_edge * 180 > eps_degrees else None
+
+        x, y, z = cell.mean
+        found = []
+        first_row, last_row = math.floor((south + 90) / grid.cell_degrees), math.floor((north + 90) / grid.cell_degrees)
+        for row in range(first_row, last_row + 1):
+            row_columns = by_row.get(row)
+            if not row_columns:
+                continue
+            columns = grid.columns(row)
+            first = 0 if reach is None else math.floor((cell.lon - reach + 180) / 360 * columns)
+            last = columns - 1 if reach is None else math.floor((cell.lon + reach + 180) / 360 * columns)
+            if last - first + 1 >= columns:
+                spans = [(0, columns - 1)]
+            else:
+                # Columns wrap around at the antimeridian
+                spans = [(max(first, 0), min(last, columns - 1))]
+                if first < 0:
+                    spans.append((first + columns, columns - 1))
+                if last >= columns:
+                    spans.append((0, last - columns))
+
+            for span_first, span_last in spans:
+                for column in row_columns[bisect_left(row_columns, span_first):bisect_right(row_columns, span_last)]:
+                    other_x, other_y, other_z = cells[(row, column)].mean
+                    if (x - other_x) ** 2 + (y - other_y) ** 2 + (z - other_z) ** 2 <= max_chord_squared:
+                        found.append((row, column))
+        neighbors[key] = found
+    return neighbors
+
+
+def _expand(
+    cells: Dict[_CellKey, _Cell], neighbors: Dict[_CellKey, List[_CellKey]], min_check_ins: int
+) -> List[List[_CellKey]]:
+    """Group cells into clusters, DBSCAN style.
+
+    A cell is a core cell when its neighbors, itself included, hold at least
+    min_check_ins check-ins. Clusters are the groups of core cells connected
+    through neighbors, plus the other cells next to them, each added to the
+    first cluster that reaches it.
+    """
+    core = {
+        key for key, found in neighbors.items()
+        if sum(cells[other].check_ins for other in found) >= min_check_ins
+    }
+    assigned: Set[_CellKey] = set()
+    clusters = []
+    for start in sorted(core):
+        if start in assigned:
+            continue
+        assigned.add(start)
+        members = []
+        queue = deque([start])
+        while queue:
+            key = queue.popleft()
+            members.append(key)
+            if key not in core:
+                continue
+            for other in neighbors[key]:
+                if other not in assigned:
+                    assigned.add(other)
+                    queue.append(other)
+        clusters.append(members)
+    return clusters
+
+
+def _summarize(
+    cells: Dict[_CellKey, _Cell], members: List[_CellKey], grid: _Grid
+) -> Tuple[float, float, float, _Cell]:
+    """Get the centroid, the radius and the merged check-ins of a cluster.
+
+    The radius reaches the farthest corner of any member cell from the
+    centroid, so it holds every check-in and overstates by at most a cell
+    diagonal.
+    """
+    total = _Cell(cells[members[0]].first)
+    for key in members:
+        cell = cells[key]
+        total.check_ins += cell.check_ins
+        total.x += cell.x
+        total.y += cell.y
+        total.z += cell.z
+        total.users |= cell.users
+        total.first = min(total.first, cell.first)
+        total.last = max(total.last, cell.last)
+
+    lat, lon = _to_lat_lon(total.x, total.y, total.z)
+    radius = max(
+        GeofenceService.haversine_distance(lat, lon, corner_lat, corner_lon)
+        for key in members
+        for corner_lat, corner_lon in grid.corners(key)
+    )
+    return lat, lon, radius, total
+
+
+def start_clustering_run(
+    db: Session,
+    eps_meters: float = settings.LOCATION_CLUSTER_EPS_METERS,
+    min_check_ins: int = settings.LOCATION_CLUSTER_MIN_CHECK_INS,
+    since: Optional[datetime] = None,
+    requested_by: Optional[int] = None,
+) -> LocationClusterRun:
+    """Record a new clustering run, claiming the right to replace the stored clusters.
+
+    The claim is a unique column of the run row, so only one run at a time
+    can hold it across every worker and host sharing the database. A run
+    still holding the claim after LOCATION_CLUSTER_RUN_TIMEOUT_SECONDS is
+    taken as abandoned by a worker that died, and loses it.
+
+    Args:
+        db: Database session
+        eps_meters: Distance within which check-ins are neighbors
+        min_check_ins: Check-ins, within eps_meters of each other, needed to grow a cluster
+        since: Only cluster check-ins from this time on
+        requested_by: ID of the admin starting the run
+
+    Returns:
+        The new run, to be completed by run_clustering
+
+    Raises:
+        HTTPException: If another run holds the claim
+    """
+    now = datetime.now()
+    abandoned = db.query(LocationClusterRun).filter(
+        LocationClusterRun.claim.is_(True),
+        LocationClusterRun.started_at < now - timedelta(seconds=settings.LOCATION_CLUSTER_RUN_TIMEOUT_SECONDS),
+    ).update(
+        {"claim": None, "status": "failed", "finished_at": now, "error": "Abandoned"}, synchronize_session=False
+    )
+    if abandoned:
+        logger.warning("Releasing the claim of an abandoned location clustering run")
+
+    run = LocationClusterRun(
+        claim=True,
+        status="running",
+        requested_by=requested_by,
+        eps_meters=eps_meters,
+        min_check_ins=min_check_ins,
+        since=since,
+        started_at=now,
+    )
+    db.add(run)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Location clustering is already running",
+        )
+    db.refresh(run)
+    return run
+
+
+def run_clustering(run_id: int, chunk_size: int = settings.LOCATION_CLUSTER_CHUNK_SIZE) -> None:
+    """Complete a clustering run in a database session of its own.
+
+    Meant to run in the background after start_clustering_run; a failed run
+    is recorded as such and releases its claim.
+
+    Args:
+        run_id: ID of the run
+        chunk_size: Number of check-ins read per query
+    """
+    db = SessionLocal()
+    try:
+        run = db.get(LocationClusterRun, run_id)
+        try:
+            cluster_other_check_ins(db, run, chunk_size)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Location clustering run %d failed: %s", run_id, str(e))
+            db.query(LocationClusterRun).filter(
+                LocationClusterRun.id == run_id,
+                LocationClusterRun.claim.is_(True),
+            ).update(
+                {"claim": None, "status": "failed", "finished_at": datetime.now(), "error": str(e)},
+                synchronize_session=False,
+            )
+            db.commit()
+    finally:
+        db.close()
+
+
+def cluster_other_check_ins(
+    db: Session, run: LocationClusterRun, chunk_size: int = settings.LOCATION_CLUSTER_CHUNK_SIZE
+) -> LocationClusterRun:
+    """Cluster check-ins at other locations and store the clusters.
+
+    Density-based clustering with the haversine metric, run over grid cells
+    instead of single check-ins. Check-ins are streamed in chunks by primary
+    key and aggregated into cells about half eps_meters on each side, whose
+    check-ins are all within eps_meters of each other. Cells are then
+    clustered DBSCAN style, with neighbors found through the grid, so the
+    work and memory beyond the aggregation grow with the number of occupied
+    cells rather than the number of check-ins.
+
+    The clusters replace those of the previous run, each with the nearest
+    office so admins can tell new sites from check-ins just outside an
+    office geofence. They are stored in the same transaction that completes
+    the run and releases its claim, and discarded if the run lost its claim.
+
+    Args:
+        db: Database session
+        run: Run holding the claim, with the clustering parameters
+        chunk_size: Number of check-ins read per query
+
+    Returns:
+        The completed run
+    """
+    started = time.perf_counter()
+    run_id, eps_meters, min_check_ins = run.id, run.eps_meters, run.min_check_ins
+    grid = _Grid(eps_meters)
+    cells, check_ins = _aggregate(db, grid, run.since, chunk_size)
+    neighbors = _neighbors(cells, grid)
+    groups = _expand(cells, neighbors, min_check_ins)
+
+    index = office_geofences.index(db)
+    computed_at = datetime.now()
+    clusters = []
+    for members in groups:
+        lat, lon, radius, total = _summarize(cells, members, grid)
+        nearest = index.nearest(lat, lon, 1) if len(index) else []
+        clusters.append(LocationCluster(
+            latitude=lat,
+            longitude=lon,
+            radius=radius,
+            check_ins=total.check_ins,
+            users=len(total.users),
+            first_check_in=total.first,
+            last_check_in=total.last,
+            nearest_office_id=index.ids[nearest[0][0]] if nearest else None,
+            nearest_office_distance=nearest[0][2] if nearest else None,
+            eps_meters=eps_meters,
+            min_check_ins=min_check_ins,
+            computed_at=computed_at,
+        ))
+
+    clustered = sum(cluster.check_ins for cluster in clusters)
+    duration = time.perf_counter() - started
+    completed = db.query(LocationClusterRun).filter(
+        LocationClusterRun.id == run_id,
+        LocationClusterRun.claim.is_(True),
+    ).update({
+        "claim": None,
+        "status": "completed",
+        "finished_at": datetime.now(),
+        "check_ins": check_ins,
+        "clustered_check_ins": clustered,
+        "clusters": len(clusters),
+        "duration_seconds": round(duration, 3),
+    }, synchronize_session=False)
+    if not completed:
+        db.rollback()
+        logger.warning("Location clustering run %d lost its claim, discarding its clusters", run_id)
+        return run
+
+    db.query(LocationCluster).delete()
+    db.add_all(clusters)
+    db.commit()
+
+    logger.info(
+        "Clustered %d other check-ins in %d cells into %d clusters holding %d check-ins in %.1fs",
+        check_ins, len(cells), len(clusters), clustered, duration
+    )
+    return run
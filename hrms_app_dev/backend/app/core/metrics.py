@@ -0,0 +1,354 @@
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+# Request duration buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ThreadShards:
+    """Per-thread value storage for a metric.
+
+    Every thread writes to its own dictionary, so recording a value takes no
+    lock and never contends with other threads. Readers merge all shards at
+    scrape time; a read may miss an increment that is in flight, which is
+    acceptable for monitoring.
+    """
+
+    def __init__(self, factory: Callable[[], list]):
+        self._factory = factory
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, list]] = []
+        self._lock = threading.Lock()
+
+    def get(self, labels: LabelValues) -> list:
+        """Get this thread's value cell for a label set."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # Registration happens once per thread
+            with self._lock:
+                self._shards.append(shard)
+        cell = shard.get(labels)
+        if cell is None:
+            cell = shard[labels] = self._factory()
+        return cell
+
+    def merged(self) -> Dict[LabelValues, list]:
+        """Sum the cells of all threads per label set."""
+        merged: Dict[LabelValues, list] = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for labels, cell in list(shard.items()):
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(cell)
+                else:
+                    for i, value in enumerate(cell):
+                        total[i] += value
+        return merged
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """Base class for metrics rendered in the Prometheus text format."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+
+    def _format_labels(self, labels: LabelValues, extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.label_names, labels)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterable[str]:
+        """Yield the sample lines of this metric."""
+        return ()
+
+    def render(self) -> List[str]:
+        """Render the metric including its HELP and TYPE lines."""
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values = _ThreadShards(lambda: [0.0])
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increment the counter for a label set."""
+        self._values.get(labels)[0] += amount
+
+    def value(self, *labels: str) -> float:
+        """Get the current total for a label set."""
+        return self._values.merged().get(labels, [0.0])[0]
+
+    def samples(self) -> Iterable[str]:
+        for labels, (value,) in sorted(self._values.merged().items()):
+            yield f"{self.name}{self._format_labels(labels)} {value}"
+
+
+class Gauge(Metric):
+    """Value that can go up and down.
+
+    Either tracked with inc/dec (summed across threads) or computed at scrape
+    time by a callback returning (label values, value) pairs.
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None,
+    ):
+        super().__init__(name, documentation, label_names)
+        self._values = _ThreadShards(lambda: [0.0])
+        self._callback = callback
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Increase the gauge for a label set."""
+        self._values.get(labels)[0] += amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        """Decrease the gauge for a label set."""
+        self._values.get(labels)[0] -= amount
+
+    def samples(self) -> Iterable[str]:
+        if self._callback is not None:
+            try:
+                values = sorted(self._callback())
+            except Exception:
+                # A failing callback must not break the whole scrape
+                values = []
+        else:
+            values = [(labels, cell[0]) for labels, cell in sorted(self._values.merged().items())]
+        for labels, value in values:
+            yield f"{self.name}{self._format_labels(labels)} {value}"
+
+
+class Histogram(Metric):
+    """Histogram with cumulative buckets, a sum and a count."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # One cell per bucket plus +Inf, then the sum
+        size = len(self.buckets) + 2
+        self._values = _ThreadShards(lambda: [0.0] * size)
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record an observation for a label set."""
+        cell = self._values.get(labels)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        """Context manager that observes the duration of its block."""
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        for labels, cell in sorted(self._values.merged().items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, cell):
+                cumulative += count
+                yield f"{self.name}_bucket{self._format_labels(labels, [('le', repr(bound))])} {cumulative}"
+            cumulative += cell[len(self.buckets)]
+            yield f"{self.name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(labels)} {cell[-1]}"
+            yield f"{self.name}_count{self._format_labels(labels)} {cumulative}"
+
+
+class _Timer:
+    """Context manager used by Histogram.time."""
+
+    def __init__(self, histogram: Histogram, labels: LabelValues):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+
+
+class MetricsRegistry:
+    """Collection of metrics exposed together at /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a metric, returning the existing one if the name is taken."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None,
+    ) -> Gauge:
+        """Create and register a gauge."""
+        return self.register(Gauge(name, documentation, label_names, callback))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_requests = registry.counter(
+    "hrms_http_requests_total", "HTTP requests by route template, method and status code.",
+    ("method", "route", "status"),
+)
+http_request_duration = registry.histogram(
+    "hrms_http_request_duration_seconds", "HTTP request duration by route template, method and status code.",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = registry.gauge(
+    "hrms_http_requests_in_flight", "HTTP requests currently being handled.",
+)
+
+# Database work attributed to the route that caused it
+db_queries = registry.counter(
+    "hrms_db_queries_total", "Database statements executed by route template.", ("route",),
+)
+db_query_duration = registry.counter(
+    "hrms_db_query_duration_seconds_total", "Time spent in database statements by route template.", ("route",),
+)
+
+# Background jobs
+scheduler_job_duration = registry.histogram(
+    "hrms_scheduler_job_duration_seconds", "Duration of background scheduler jobs.", ("job",),
+)
+scheduler_job_items = registry.counter(
+    "hrms_scheduler_job_items_total", "Items processed by background scheduler jobs.", ("job",),
+)
+
+# Geofencing
+geofence_evaluations = registry.counter(
+    "hrms_geofence_evaluations_total", "Geofence checks by fence type and result.", ("fence", "result"),
+)
+
+# Caches
+cache_requests = registry.counter(
+    "hrms_cache_requests_total", "Cache lookups by cache name and result (hit or miss).", ("cache", "result"),
+)
+
+
+def register_pool_metrics(engine) -> None:
+    """Expose connection pool gauges for a SQLAlchemy engine.
+
+    Args:
+        engine: SQLAlchemy engine whose pool should be reported
+    """
+    def pool_stats() -> List[Tuple[LabelValues, float]]:
+        pool = engine.pool
+        stats = []
+        for state, method in (("checked_out", "checkedout"), ("checked_in", "checkedin"),
+                              ("overflow", "overflow"), ("size", "size")):
+            if hasattr(pool, method):
+                stats.append(((state,), float(getattr(pool, method)())))
+        return stats
+
+    registry.gauge(
+        "hrms_db_pool_connections", "Database connection pool state.", ("state",), callback=pool_stats,
+    )
+
+
+class MetricsMiddleware:
+    """Record request counts, durations and in-flight requests.
+
+    Requests are labelled by route template (for example
+    /api/v1/offices/{office_id}) rather than raw path to keep label
+    cardinality bounded. Unmatched paths are reported as "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp, exclude_paths: Sequence[str] = ("/metrics",)) -> None:
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = "500"
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = str(message["status"])
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            labels = (scope["method"], route_path, status_code)
+            http_requests.inc(*labels)
+            http_request_duration.observe(duration, *labels)
@@ -0,0 +1,69 @@
+import re
+import time
+import uuid
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.metrics import db_queries, db_query_duration
+from app.db.instrumentation import QueryStats, query_stats_var
+from app.logger import request_id_var
+
+# Accept client request IDs that are safe to echo back and log
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestContextMiddleware:
+    """Assign every HTTP request an ID for log correlation and track its DB work.
+
+    The ID is taken from the X-Request-ID header when it is well formed,
+    otherwise generated, stored in the request context for the logging
+    pipeline and echoed in the X-Request-ID response header.
+
+    Query count and DB time collected by the engine instrumentation are
+    reported in the Server-Timing header and attributed to the matched route
+    in the metrics.
+
+    Written as a plain ASGI middleware so it adds no per-request task or
+    response buffering.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        stats = QueryStats(scope)
+        start = time.perf_counter()
+
+        async def send_with_context(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                if settings.SERVER_TIMING_ENABLED:
+                    total = (time.perf_counter() - start) * 1000
+                    headers.append("Server-Timing", f"{stats.server_timing()}, app;dur={total:.1f}")
+            await send(message)
+
+        request_token = request_id_var.set(request_id)
+        stats_token = query_stats_var.set(stats)
+        try:
+            await self.app(scope, receive, send_with_context)
+        finally:
+            query_stats_var.reset(stats_token)
+            request_id_var.reset(request_token)
+            if stats.count:
+                db_queries.inc(stats.route, amount=stats.count)
+                db_query_duration.inc(stats.route, amount=stats.duration)
@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from app.config import settings
+from app.core.metrics import scheduler_job_duration
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import AttendanceRecord, LocationType
+
+# (office ID, location type) of an open session
+_Placement = Tuple[Optional[int], str]
+
+
+class OccupancyTracker:
+    """Live counts of open attendance sessions per office and location type.
+
+    Open sessions are tracked by record ID, with counters per office and per
+    location type kept alongside, so reading a count never touches the
+    database. Check-in, check-out, sync and auto-logout update the tracker
+    after their commits; updates are idempotent per record, so applying one
+    twice does no harm.
+
+    A background thread periodically reloads the open sessions to pick up
+    changes made by other workers. Every worker runs its own reloads, so
+    they only read the primary key range that can hold open sessions: from
+    the oldest session tracked, or the newest record seen by the previous
+    reload if that is older. Sessions other workers opened in a transaction
+    that committed after a reload, with an ID below that range, are only
+    picked up by the full reload every full_reconcile_interval_seconds,
+    which reads every open session. Updates made while a reload is running
+    are replayed on top of its result, so they are not lost to a reload
+    that read the table before they were committed.
+    """
+
+    def __init__(self, reconcile_interval_seconds: float = 30.0, full_reconcile_interval_seconds: float = 600.0):
+        """Initialize an empty tracker.
+
+        Args:
+            reconcile_interval_seconds: Interval for reloading recent open sessions from the database
+            full_reconcile_interval_seconds: Interval for reloading every open session
+        """
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self.full_reconcile_interval_seconds = full_reconcile_interval_seconds
+        self._sessions: Dict[int, _Placement] = {}
+        # Newest record ID seen by the last reconcile, None before the first one
+        self._max_id: Optional[int] = None
+        self._by_office: Counter = Counter()
+        self._by_type: Counter = Counter()
+        # Updates made while a reconcile is running, replayed on top of its result
+        self._pending: Optional[List[Tuple[int, Optional[_Placement]]]] = None
+        self.reconciled_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _add(self, record_id: int, placement: _Placement) -> None:
+        if record_id in self._sessions:
+            return
+        self._sessions[record_id] = placement
+        self._by_office[placement[0]] += 1
+        self._by_type[placement[1]] += 1
+
+    def _remove(self, record_id: int) -> None:
+        placement = self._sessions.pop(record_id, None)
+        if placement is None:
+            return
+        self._by_office[placement[0]] -= 1
+        self._by_type[placement[1]] -= 1
+
+    def track(self, record: AttendanceRecord) -> None:
+        """Apply a committed check-in or check-out.
+
+        Args:
+            record: Attendance record that was just checked in or out
+        """
+        if record.check_out_time is not None:
+            self.release(record.id)
+            return
+
+        placement = (record.office_id, record.location_type.value)
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((record.id, placement))
+            self._add(record.id, placement)
+
+    def release(self, record_id: int) -> None:
+        """Apply a committed check-out of a session.
+
+        Args:
+            record_id: ID of the attendance record that was checked out
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((record_id, None))
+            self._remove(record_id)
+
+    def reconcile(self, full: bool = True) -> int:
+        """Reload open sessions from the database.
+
+        Args:
+            full: Whether to read every open session instead of only the range
+                that can hold the tracked and newer ones
+
+        Returns:
+            Number of open sessions
+        """
+        with self._lock:
+            self._pending = []
+            from_id = None
+            if not full and self._max_id is not None:
+                # Every tracked session lies in this range, so its result replaces them all
+                from_id = min(self._sessions, default=self._max_id + 1)
+                from_id = min(from_id, self._max_id + 1)
+        try:
+            db = SessionLocal()
+            try:
+                # Read before the sessions, so records added meanwhile fall in the next range
+                max_id = db.query(func.max(AttendanceRecord.id)).scalar() or 0
+                query = db.query(
+                    AttendanceRecord.id, AttendanceRecord.office_id, AttendanceRecord.location_type
+                ).filter(
+                    AttendanceRecord.check_out_time.is_(None)
+                )
+                if from_id is not None:
+                    query = query.filter(AttendanceRecord.id >= from_id)
+                rows = query.all()
+            finally:
+                db.close()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._sessions, self._by_office, self._by_type = {}, Counter(), Counter()
+            for record_id, office_id, location_type in rows:
+                self._add(record_id, (office_id, location_type.value))
+            for record_id, placement in self._pending:
+                if placement is None:
+                    self._remove(record_id)
+                else:
+                    self._add(record_id, placement)
+            self._pending = None
+            self._max_id = max_id
+            self.reconciled_at = datetime.now()
+            # Drop zero counts left by check-outs
+            self._by_office = +self._by_office
+            self._by_type = +self._by_type
+            return len(self._sessions)
+
+    def _ensure_loaded(self) -> None:
+        # Without the background thread, e.g. in scripts, load once on first read
+        if self.reconciled_at is None:
+            self.reconcile()
+
+    @property
+    def total(self) -> int:
+        """Number of open sessions."""
+        self._ensure_loaded()
+        return len(self._sessions)
+
+    def office(self, office_id: int) -> int:
+        """Get the number of open sessions at an office.
+
+        Args:
+            office_id: ID of the office
+
+        Returns:
+            Number of people checked in at the office
+        """
+        self._ensure_loaded()
+        return self._by_office.get(office_id, 0)
+
+    def by_office(self) -> Dict[int, int]:
+        """Get the number of open sessions per office, for offices with any."""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                office_id: count
+                for office_id, count in self._by_office.items()
+                if office_id is not None and count
+            }
+
+    def by_location_type(self) -> Dict[str, int]:
+        """Get the number of open sessions per location type, including empty ones."""
+        self._ensure_loaded()
+        with self._lock:
+            return {location_type.value: self._by_type.get(location_type.value, 0) for location_type in LocationType}
+
+    def _run(self) -> None:
+        """Reconcile until stopped."""
+        next_full = time.monotonic() + self.full_reconcile_interval_seconds
+        while not self._stopping.wait(self.reconcile_interval_seconds):
+            full = time.monotonic() >= next_full
+            try:
+                with scheduler_job_duration.time("occupancy_reconcile"):
+                    self.reconcile(full=full)
+            except Exception as e:
+                logger.error("Error reconciling office occupancy: %s", str(e))
+                continue
+            if full:
+                next_full = time.monotonic() + self.full_reconcile_interval_seconds
+
+    def start(self) -> None:
+        """Load open sessions and start the background reconcile thread."""
+        if self._thread is not None:
+            logger.warning("Occupancy tracking is already running")
+            return
+
+        count = self.reconcile()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="occupancy-reconcile", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Occupancy tracking started with %d open sessions and %.0fs reconcile interval",
+            count, self.reconcile_interval_seconds
+        )
+
+    def stop(self) -> None:
+        """Stop the background reconcile thread."""
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        logger.info("Occupancy tracking stopped")
+
+
+# Shared instance updated by the attendance endpoints and the session expiry scheduler
+occupancy = OccupancyTracker(settings.OCCUPANCY_RECONCILE_SECONDS, settings.OCCUPANCY_FULL_RECONCILE_SECONDS)
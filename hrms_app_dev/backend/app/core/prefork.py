@@ -0,0 +1,50 @@
+import gc
+
+from sqlalchemy.orm import configure_mappers
+
+from app.core.geofence_index import office_geofences
+from app.core.revocation import revoked_tokens
+from app.db.base import get_engine
+from app.logger import logger
+
+
+def warm_master() -> None:
+    """Build shared read-only state in a pre-fork master process.
+
+    Runs once after the application is preloaded and before any worker is
+    forked. Everything built here is inherited copy-on-write by the workers:
+    the ORM mapper configuration, the SQL compiled for the warm-up queries
+    (kept in the engine's statement cache), the mapping of the geofence index
+    and the token revocation filter. Connections opened while warming are closed
+    so that no socket is shared between processes.
+
+    Warming is best effort; if the database is unreachable the workers load
+    the same state on first use.
+    """
+    configure_mappers()
+    try:
+        offices = office_geofences.load()
+        revocations = revoked_tokens.load()
+    except Exception as e:
+        # Workers fall back to loading everything themselves
+        logger.error("Error warming master, workers will start cold: %s", str(e))
+        offices = revocations = 0
+    finally:
+        get_engine().dispose()
+
+    # Move everything built so far out of the collector's reach; otherwise the
+    # first collection in each worker touches every object and copies the page
+    gc.freeze()
+    logger.info(
+        "Warmed master: %d office geofences, %d revoked tokens, %d objects frozen",
+        offices, revocations, gc.get_freeze_count()
+    )
+
+
+def after_fork() -> None:
+    """Prepare a freshly forked worker.
+
+    Replaces the connection pool inherited from the master without closing
+    its connections, which would otherwise be closed from under the master.
+    """
+    get_engine().dispose(close=False)
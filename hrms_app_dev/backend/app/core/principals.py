@@ -0,0 +1,285 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.config import settings
+from app.core.metrics import cache_requests
+from app.logger import logger
+from app.models.models import User, UserHomeAddress
+
+# (count, max id, max updated_at) of the users table
+Watermark = Tuple[int, int, Optional[datetime]]
+
+# Columns kept in the cache; the password hash is loaded on demand instead
+CACHED_COLUMNS = tuple(column.key for column in User.__table__.columns if column.key != "hashed_password")
+
+
+class HomeFence(NamedTuple):
+    """Location and geofence radius of a home address, cached with its user."""
+
+    id: int
+    address_type: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    radius: Optional[float]  # None for the default radius
+    is_current: bool
+
+
+class PrincipalCache:
+    """Cache of the users behind authenticated requests.
+
+    Resolving the bearer token's subject otherwise costs a query on every
+    request. Cached users are detached instances; each request gets its own
+    copy merged into the request's session without loading, so endpoints can
+    use and modify it like any other loaded user.
+
+    Every refresh interval a lookup reloads the users changed since shortly
+    before the latest updated_at seen, so changes made by other workers are
+    picked up within the interval. updated_at is stamped by the database
+    clock, and rereading overlap_seconds before the latest stamp catches
+    changes that committed after a later-stamped one, such as a
+    deactivation committed after a batch of logins. When the row count
+    shows that users were deleted the cache starts over, and it also starts
+    over every max_age_seconds as a backstop for anything the overlap
+    missed. Changes made through this worker are applied immediately with
+    invalidate.
+
+    The home addresses of cached users are kept alongside as HomeFence
+    tuples, so location checks need no query either. They are loaded on
+    first use and follow a watermark of the home addresses table the same
+    way; changes made through this worker are applied with
+    invalidate_home_fences.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        refresh_interval_seconds: float = 5.0,
+        overlap_seconds: float = 60.0,
+        max_age_seconds: float = 300.0,
+    ):
+        """Initialize an empty cache.
+
+        Args:
+            max_size: Maximum number of cached users, least recently used are evicted
+            refresh_interval_seconds: Interval for checking the users table for changes
+        """
+        self.max_size = max_size
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_age_seconds = max_age_seconds
+        self._users: "OrderedDict[int, User]" = OrderedDict()
+        self._watermark: Optional[Watermark] = None
+        # Home addresses per cached user
+        self._home_fences: Dict[int, Tuple[HomeFence, ...]] = {}
+        self._home_watermark: Optional[Watermark] = None
+        self._next_check = 0.0
+        # Time at which the cache starts over
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_watermark(db: Session) -> Watermark:
+        count, max_id, max_updated = db.query(
+            func.count(User.id), func.max(User.id), func.max(User.updated_at)
+        ).one()
+        return count, max_id or 0, max_updated
+
+    @staticmethod
+    def _detached(values: Dict[str, Any]) -> User:
+        """Build a detached user that looks freshly loaded from the given column values."""
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def _store(self, user: User) -> None:
+        self._users[user.id] = user
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.max_size:
+            evicted, _ = self._users.popitem(last=False)
+            self._home_fences.pop(evicted, None)
+
+    def _refresh(self, db: Session) -> None:
+        """Apply changes made to the users table since shortly before the last check."""
+        watermark = self._current_watermark(db)
+        previous = self._watermark
+        if previous is None or previous[2] is None or time.monotonic() >= self._expires:
+            with self._lock:
+                self._users.clear()
+                self._home_fences.clear()
+                self._watermark = watermark
+                self._home_watermark = None
+                self._expires = time.monotonic() + self.max_age_seconds
+            return
+
+        # Rows already applied are read again within the overlap; applying them twice does no harm
+        columns = [getattr(User, key) for key in CACHED_COLUMNS]
+        changed = db.query(*columns).filter(
+            User.updated_at > previous[2] - timedelta(seconds=self.overlap_seconds)
+        ).all()
+        added = sum(1 for row in changed if row.id > previous[1])
+
+        with self._lock:
+            if watermark[0] != previous[0] + added:
+                # Some users were deleted; the watermark cannot tell which
+                self._users.clear()
+                self._home_fences.clear()
+            else:
+                for row in changed:
+                    if row.id in self._users:
+                        self._users[row.id] = self._detached(row._asdict())
+            self._watermark = watermark
+        logger.debug("Principal cache applied %d changed users", len(changed))
+
+    def _refresh_home_fences(self, db: Session) -> None:
+        """Drop the home fences of users whose addresses changed since shortly before the last check."""
+        count, max_id, max_updated = db.query(
+            func.count(UserHomeAddress.id), func.max(UserHomeAddress.id), func.max(UserHomeAddress.updated_at)
+        ).one()
+        watermark = (count, max_id or 0, max_updated)
+        previous = self._home_watermark
+        if previous is None or previous[2] is None:
+            with self._lock:
+                self._home_fences.clear()
+                self._home_watermark = watermark
+            return
+
+        changed = db.query(UserHomeAddress.id, UserHomeAddress.user_id).filter(
+            UserHomeAddress.updated_at > previous[2] - timedelta(seconds=self.overlap_seconds)
+        ).all()
+        added = sum(1 for row in changed if row.id > previous[1])
+
+        with self._lock:
+            if watermark[0] != previous[0] + added:
+                # Some addresses were deleted; the watermark cannot tell whose
+                self._home_fences.clear()
+            else:
+                for row in changed:
+                    self._home_fences.pop(row.user_id, None)
+            self._home_watermark = watermark
+
+    def get(self, db: Session, user_id: int) -> Optional[User]:
+        """Get a user by ID.
+
+        Args:
+            db: Database session the returned user belongs to
+            user_id: ID of the user
+
+        Returns:
+            The user, or None if no such user exists
+        """
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.refresh_interval_seconds
+            self._refresh(db)
+            self._refresh_home_fences(db)
+
+        cached = self._users.get(user_id)
+        if cached is not None:
+            cache_requests.inc("principal", "hit")
+            with self._lock:
+                if user_id in self._users:
+                    self._users.move_to_end(user_id)
+            return db.merge(cached, load=False)
+
+        cache_requests.inc("principal", "miss")
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            detached = self._detached({key: getattr(user, key) for key in CACHED_COLUMNS})
+            with self._lock:
+                self._store(detached)
+        return user
+
+    def home_fences(self, db: Session, user_id: int) -> Tuple[HomeFence, ...]:
+        """Get the home addresses of a user.
+
+        Addresses are kept while the user is cached, so they are only
+        queried after the user was looked up with get.
+
+        Args:
+            db: Database session used on a cache miss
+            user_id: ID of the user
+
+        Returns:
+            The user's home addresses, current or not
+        """
+        fences = self._home_fences.get(user_id)
+        if fences is not None:
+            cache_requests.inc("home_fences", "hit")
+            return fences
+
+        cache_requests.inc("home_fences", "miss")
+        rows = db.query(
+            UserHomeAddress.id, UserHomeAddress.address_type, UserHomeAddress.latitude,
+            UserHomeAddress.longitude, UserHomeAddress.radius, UserHomeAddress.is_current,
+        ).filter(
+            UserHomeAddress.user_id == user_id
+        ).order_by(UserHomeAddress.id).all()
+        fences = tuple(HomeFence(*row) for row in rows)
+        with self._lock:
+            if user_id in self._users:
+                self._home_fences[user_id] = fences
+        return fences
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user changed or deleted by this worker.
+
+        Args:
+            user_id: ID of the user
+        """
+        with self._lock:
+            self._users.pop(user_id, None)
+            self._home_fences.pop(user_id, None)
+
+    def invalidate_home_fences(self, user_id: int) -> None:
+        """Drop the home addresses of a user, after this worker changed them.
+
+        Args:
+            user_id: ID of the user
+        """
+        with self._lock:
+            self._home_fences.pop(user_id, None)
+
+    def export(self) -> Tuple[Optional[Watermark], List[Dict[str, Any]]]:
+        """Get the cache contents for a snapshot.
+
+        Returns:
+            The watermark the contents are valid at and the column values of
+            every cached user, least recently used first
+        """
+        with self._lock:
+            return self._watermark, [
+                {key: getattr(user, key) for key in CACHED_COLUMNS} for user in self._users.values()
+            ]
+
+    def restore(self, watermark: Watermark, users: List[Dict[str, Any]]) -> None:
+        """Fill the cache from a snapshot.
+
+        The first lookup afterwards checks the snapshot's watermark against
+        the database and applies whatever changed since it was taken.
+
+        Args:
+            watermark: Watermark the users were valid at
+            users: Column values of each user, least recently used first
+        """
+        with self._lock:
+            self._users.clear()
+            self._home_fences.clear()
+            for values in users:
+                self._store(self._detached(values))
+            self._watermark = watermark
+            self._next_check = 0.0
+            self._expires = time.monotonic() + self.max_age_seconds
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    refresh_interval_seconds=settings.PRINCIPAL_CACHE_REFRESH_SECONDS,
+    overlap_seconds=settings.PRINCIPAL_CACHE_OVERLAP_SECONDS,
+    max_age_seconds=settings.PRINCIPAL_CACHE_MAX_AGE_SECONDS,
+)
@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.config import settings
+from app.logger import logger
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+_PROFILE_PURPOSE = "profile"
+# Audience of profiling tokens; bearer authentication rejects tokens carrying one
+_PROFILE_AUDIENCE = "hrms-profiling"
+
+
+@dataclass
+class Profile:
+    """A stored request profile in collapsed-stack format."""
+
+    id: str
+    method: str
+    route: str
+    user_id: str
+    created_at: datetime
+    duration_ms: float = 0.0
+    sample_interval_ms: float = 0.0
+    samples: int = 0
+    truncated: bool = False
+    stacks: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> str:
+        """Render the stacks as "frame;frame;frame count" lines.
+
+        This is the input format of flamegraph.pl and can be imported
+        directly into speedscope.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    """Sample the call stack of one thread from a background thread.
+
+    The profiled thread is never interrupted; the sampler reads its current
+    frame through sys._current_frames at a fixed interval and stops on its
+    own once the sample budget is used up. The thread must run nothing but
+    the profiled call: on the event loop thread the samples would include
+    whatever other requests' coroutines happen to be running.
+    """
+
+    def __init__(self, profile: Profile, thread_id: int, root: Callable, interval_seconds: float, max_samples: int):
+        """Initialize the profiler.
+
+        Args:
+            profile: Profile receiving the samples
+            thread_id: Identifier of the thread to sample
+            root: Function whose frame is the root of every recorded stack
+            interval_seconds: Time between samples
+            max_samples: Maximum number of samples to take
+        """
+        self.profile = profile
+        self.thread_id = thread_id
+        self.root_code = getattr(root, "__code__", None)
+        self.interval_seconds = interval_seconds
+        self.max_samples = max_samples
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _stack(self, frame) -> str:
+        """Collapse a frame chain into a root-first, semicolon-separated stack."""
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            if code is self.root_code:
+                break
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval_seconds):
+            if self.profile.samples >= self.max_samples:
+                self.profile.truncated = True
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.profile.stacks[self._stack(frame)] += 1
+            self.profile.samples += 1
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stopping.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    """Keep the most recent profiles in memory, evicting the oldest."""
+
+    def __init__(self, max_profiles: int):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile) -> None:
+        """Store a finished profile."""
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        """Get a profile by ID."""
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Profile]:
+        """List stored profiles, newest first."""
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+
+profile_store = ProfileStore(settings.PROFILING_MAX_STORED)
+
+# Profile of the request being handled, set by ProfilingRoute
+_current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+# Caps the number of requests profiled at the same time
+_profiling_slots = threading.BoundedSemaphore(settings.PROFILING_MAX_CONCURRENT)
+
+
+def _profiling_key() -> str:
+    """Key profiling tokens are signed with, derived from SECRET_KEY.
+
+    A separate key means a profiling token never verifies as an access token,
+    even if the audience check were dropped.
+    """
+    return hmac.new(settings.SECRET_KEY.encode(), b"hrms-profiling-token", hashlib.sha256).hexdigest()
+
+
+def create_profiling_token(admin_id: int) -> str:
+    """Create a short-lived token that enables profiling for an admin's requests.
+
+    Args:
+        admin_id: ID of the admin requesting the token
+
+    Returns:
+        Signed profiling token
+    """
+    from jose import jwt
+
+    expire = datetime.now() + timedelta(minutes=settings.PROFILING_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"exp": expire, "sub": str(admin_id), "purpose": _PROFILE_PURPOSE, "aud": _PROFILE_AUDIENCE}
+    return jwt.encode(to_encode, _profiling_key(), algorithm="HS256")
+
+
+def _profiling_subject(request: Request) -> Optional[str]:
+    """Get the admin a request should be profiled for, if any.
+
+    The profiling token must be valid and issued to the same user as the
+    request's bearer token, so a leaked profiling token cannot be used with
+    anyone else's session.
+    """
+    profile_token = request.headers.get(PROFILE_TOKEN_HEADER)
+    if not profile_token or not settings.PROFILING_ENABLED:
+        return None
+
+    from jose import JWTError, jwt
+
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, bearer = authorization.partition(" ")
+    try:
+        claims = jwt.decode(profile_token, _profiling_key(), algorithms=["HS256"], audience=_PROFILE_AUDIENCE)
+        bearer_claims = jwt.decode(bearer, settings.SECRET_KEY, algorithms=["HS256"]) if scheme.lower() == "bearer" else {}
+    except JWTError as e:
+        logger.warning("Ignoring invalid profiling token: %s", str(e))
+        return None
+
+    if claims.get("purpose") != _PROFILE_PURPOSE or claims.get("sub") != bearer_claims.get("sub"):
+        logger.warning("Ignoring profiling token not issued for this session")
+        return None
+    return claims["sub"]
+
+
+def _profiled(call: Callable) -> Callable:
+    """Wrap a sync endpoint so it is sampled when its request is being profiled.
+
+    The wrapper runs where the endpoint runs, a threadpool thread serving
+    only this request, which is the only place the thread to sample is known.
+    """
+    @functools.wraps(call)
+    def run(**kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return call(**kwargs)
+        interval = max(settings.PROFILING_SAMPLE_INTERVAL_MS, 1.0) / 1000
+        profile.sample_interval_ms = interval * 1000
+        with SamplingProfiler(profile, threading.get_ident(), run, interval, settings.PROFILING_MAX_SAMPLES):
+            return call(**kwargs)
+    return run
+
+
+class ProfilingRoute(APIRoute):
+    """API route that can sample a single request on demand.
+
+    An admin obtains a profiling token from /admin/profiles/token and sends it
+    in the X-Profile-Token header together with their bearer token. The
+    endpoint then runs under a sampling profiler, the collapsed-stack profile
+    is stored in memory and its ID returned in the X-Profile-Id header.
+    Requests without the header only pay for one context variable lookup.
+
+    Only sync endpoints are profiled. Async endpoints share the event loop
+    thread with every other request, so their samples could not be told
+    apart; profiling requests to them are served unprofiled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profilable = not asyncio.iscoroutinefunction(self.dependant.call)
+        if self.profilable:
+            # The request handler looks up dependant.call on every request
+            self.dependant.call = _profiled(self.dependant.call)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def profiling_handler(request: Request) -> Response:
+            subject = _profiling_subject(request)
+            if subject is None:
+                return await handler(request)
+            if not self.profilable:
+                logger.info("Profiling skipped for %s: async endpoints run on the shared event loop", self.path)
+                return await handler(request)
+            if not _profiling_slots.acquire(blocking=False):
+                logger.warning("Profiling skipped for %s: too many profiles in progress", self.path)
+                return await handler(request)
+
+            profile = Profile(
+                id=uuid.uuid4().hex,
+                method=request.method,
+                route=self.path,
+                user_id=subject,
+                created_at=datetime.now(),
+            )
+            token = _current_profile.set(profile)
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+            finally:
+                profile.duration_ms = (time.perf_counter() - start) * 1000
+                _current_profile.reset(token)
+                _profiling_slots.release()
+                profile_store.add(profile)
+                logger.info(
+                    "Profiled %s %s for user %s: %d samples in %.1f ms",
+                    profile.method, profile.route, subject, profile.samples, profile.duration_ms
+                )
+
+            response.headers[PROFILE_ID_HEADER] = profile.id
+            return response
+
+        return profiling_handler
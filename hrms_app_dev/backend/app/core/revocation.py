@@ -0,0 +1,314 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.metrics import cache_requests, scheduler_job_duration
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    Membership tests never give false negatives; false positives happen with
+    roughly the configured error rate once `capacity` items have been added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """Initialize an empty filter.
+
+        Args:
+            capacity: Expected number of items
+            error_rate: Target false positive rate at capacity
+        """
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        """Yield the bit positions of an item using double hashing."""
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        """Add an item to the filter."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenRevocationList:
+    """Revocation list for access tokens, keyed by their "sid" claim.
+
+    Revoked session IDs are persisted in RevokedToken and loaded into an
+    in-memory Bloom filter, so checking a token that was never revoked costs
+    one hash and no database access. Filter hits are confirmed against the
+    table and the answer is memoized.
+
+    A background thread pulls rows added by other workers. Revocations are
+    stamped with the database clock, and each sync rereads those stamped
+    within sync_overlap_seconds of the latest one seen, so a revocation
+    committed after a later-stamped one is still picked up. Rows seen in
+    that window are remembered, so rereading them does not count them
+    twice. The thread also periodically deletes rows for expired tokens and
+    rebuilds the filter from the table, which repairs anything a sync missed.
+    """
+
+    CONFIRMED_CACHE_SIZE = 4096
+
+    def __init__(
+        self,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        sync_interval_seconds: float = 5.0,
+        prune_interval_minutes: int = 60,
+        sync_overlap_seconds: float = 60.0,
+    ):
+        """Initialize the revocation list.
+
+        Args:
+            capacity: Minimum capacity of the Bloom filter
+            error_rate: Target false positive rate of the Bloom filter
+            sync_interval_seconds: Interval for pulling revocations made by other workers
+            prune_interval_minutes: Interval for deleting revocations of expired tokens and rebuilding the filter
+            sync_overlap_seconds: Time before the latest revocation seen that each sync rereads
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval_seconds = sync_interval_seconds
+        self.prune_interval_minutes = prune_interval_minutes
+        self.sync_overlap_seconds = sync_overlap_seconds
+
+        self._bloom = BloomFilter(capacity, error_rate)
+        # Latest revoked_at seen, and the sessions seen within the overlap before it
+        self._last_seen: Optional[datetime] = None
+        self._recent: Dict[str, datetime] = {}
+        self._loaded = False
+        self._confirmed: "OrderedDict[str, bool]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def revoke(self, db: Session, session_id: str, user_id: int, expires_at: float) -> None:
+        """Revoke a token until it expires.
+
+        Args:
+            db: Database session
+            session_id: Session ID ("sid" claim) of the token
+            user_id: ID of the token's user
+            expires_at: Unix timestamp at which the token expires
+        """
+        if not db.query(RevokedToken.id).filter(RevokedToken.session_id == session_id).first():
+            db.add(RevokedToken(
+                session_id=session_id,
+                user_id=user_id,
+                # Database clock, so syncs of every worker compare stamps from one clock
+                revoked_at=func.now(),
+                expires_at=datetime.fromtimestamp(expires_at),
+            ))
+            db.commit()
+
+        with self._lock:
+            self._bloom.add(session_id)
+            self._remember(session_id, True)
+        logger.debug("Revoked session %s", session_id)
+
+    def is_revoked(self, db: Session, session_id: str) -> bool:
+        """Check whether a token has been revoked.
+
+        Args:
+            db: Database session, only used to confirm Bloom filter hits
+            session_id: Session ID ("sid" claim) of the token
+
+        Returns:
+            Whether the token is revoked
+        """
+        if session_id not in self._bloom:
+            cache_requests.inc("revocation_filter", "miss")
+            return False
+        cache_requests.inc("revocation_filter", "hit")
+
+        confirmed = self._confirmed.get(session_id)
+        cache_requests.inc("revocation_confirmed", "miss" if confirmed is None else "hit")
+        if confirmed is None:
+            confirmed = db.query(RevokedToken.id).filter(
+                RevokedToken.session_id == session_id
+            ).first() is not None
+            with self._lock:
+                self._remember(session_id, confirmed)
+        return confirmed
+
+    def _remember(self, session_id: str, revoked: bool) -> None:
+        """Memoize a confirmed answer, evicting the oldest one when full."""
+        self._confirmed[session_id] = revoked
+        self._confirmed.move_to_end(session_id)
+        if len(self._confirmed) > self.CONFIRMED_CACHE_SIZE:
+            self._confirmed.popitem(last=False)
+
+    def __len__(self) -> int:
+        return self._bloom.count
+
+    def sync(self) -> int:
+        """Add revocations persisted since the last sync to the filter.
+
+        Returns:
+            Number of new revocations
+        """
+        db = SessionLocal()
+        try:
+            query = db.query(RevokedToken.session_id, RevokedToken.revoked_at)
+            if self._last_seen is not None:
+                query = query.filter(
+                    RevokedToken.revoked_at >= self._last_seen - timedelta(seconds=self.sync_overlap_seconds)
+                )
+            rows = query.all()
+        finally:
+            db.close()
+
+        added = 0
+        with self._lock:
+            for session_id, revoked_at in rows:
+                if session_id in self._recent:
+                    continue
+                self._bloom.add(session_id)
+                self._recent[session_id] = revoked_at
+                added += 1
+                # Drop memoized "not revoked" answers for sessions revoked elsewhere
+                if self._confirmed.get(session_id) is False:
+                    del self._confirmed[session_id]
+            self._advance(rows)
+        return added
+
+    def _advance(self, rows) -> None:
+        """Move the watermark to the latest of some rows and forget sessions older than the overlap."""
+        for _, revoked_at in rows:
+            if self._last_seen is None or revoked_at > self._last_seen:
+                self._last_seen = revoked_at
+        if self._last_seen is not None:
+            cutoff = self._last_seen - timedelta(seconds=self.sync_overlap_seconds)
+            self._recent = {
+                session_id: revoked_at for session_id, revoked_at in self._recent.items() if revoked_at >= cutoff
+            }
+
+    def load(self) -> int:
+        """Rebuild the filter from all persisted revocations.
+
+        Returns:
+            Number of revocations loaded
+        """
+        db = SessionLocal()
+        try:
+            rows = db.query(RevokedToken.session_id, RevokedToken.revoked_at).all()
+        finally:
+            db.close()
+
+        # Leave headroom so the filter is not saturated before the next rebuild
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for session_id, _ in rows:
+            bloom.add(session_id)
+
+        with self._lock:
+            self._bloom = bloom
+            self._last_seen = None
+            self._recent = dict(rows)
+            self._advance(rows)
+            self._confirmed.clear()
+            self._loaded = True
+
+        logger.info("Loaded %d revoked tokens into the revocation filter", len(rows))
+        return len(rows)
+
+    def prune(self) -> int:
+        """Delete revocations of expired tokens and rebuild the filter.
+
+        The filter is rebuilt even when nothing was deleted, as a backstop
+        for revocations a sync missed, e.g. when clocks were far apart.
+
+        Returns:
+            Number of deleted revocations
+        """
+        db = SessionLocal()
+        try:
+            deleted = db.query(RevokedToken).filter(
+                RevokedToken.expires_at < datetime.now()
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        if deleted:
+            logger.info("Pruned %d revoked tokens past their expiry", deleted)
+        self.load()
+        return deleted
+
+    def _run(self) -> None:
+        """Sync new revocations and prune expired ones until stopped."""
+        next_prune = time.monotonic() + self.prune_interval_minutes * 60
+        while not self._stopping.wait(self.sync_interval_seconds):
+            try:
+                with scheduler_job_duration.time("revocation_sync"):
+                    self.sync()
+                if time.monotonic() >= next_prune:
+                    with scheduler_job_duration.time("revocation_prune"):
+                        self.prune()
+                    next_prune = time.monotonic() + self.prune_interval_minutes * 60
+            except Exception as e:
+                logger.error("Error syncing token revocations: %s", str(e))
+
+    def start(self) -> None:
+        """Load the filter and start the background sync thread.
+
+        A filter already loaded before the worker was forked is only brought
+        up to date instead of being rebuilt.
+        """
+        if self._thread is not None:
+            logger.warning("Token revocation sync is already running")
+            return
+
+        if self._loaded:
+            self.sync()
+        else:
+            self.load()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="token-revocation-sync", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Token revocation sync started with %.1fs interval", self.sync_interval_seconds
+        )
+
+    def stop(self) -> None:
+        """Stop the background sync thread."""
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        logger.info("Token revocation sync stopped")
+
+
+# Shared instance checked on every authenticated request
+revoked_tokens = TokenRevocationList(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+    sync_interval_seconds=settings.REVOCATION_SYNC_INTERVAL_SECONDS,
+    prune_interval_minutes=settings.REVOCATION_PRUNE_INTERVAL_MINUTES,
+    sync_overlap_seconds=settings.REVOCATION_SYNC_OVERLAP_SECONDS,
+)
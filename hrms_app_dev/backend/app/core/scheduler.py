@@ -1,100 +1,439 @@
 # File: app/core/scheduler.py
 
+import asyncio
+import heapq
 import logging
+import threading
 from datetime import datetime, timedelta
-import asyncio
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
-import httpx
-from fastapi import Depends
 from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.core.events import attendance_event, event_bus
+from app.core.metrics import scheduler_job_duration, scheduler_job_items
+from app.core.occupancy import occupancy
 from app.db.base import SessionLocal
+from app.models.models import AttendanceRecord, Office, User
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
 
-class AutoLogoutScheduler:
-    """Scheduler for automatically logging out users after their session expires."""
-    
-    def __init__(self, interval_minutes: int = 10):
-        """Initialize the auto-logout scheduler.
-        
+class SessionExpiryScheduler:
+    """Scheduler that closes open attendance sessions at their exact deadline.
+
+    Open sessions are kept in a min-heap of (deadline, record ID). The heap is
+    filled at check-in and restored from the database at startup, so the
+    scheduler only sleeps until the earliest deadline instead of rescanning
+    the attendance table on a fixed interval. Checked-out sessions are removed
+    lazily: their heap entries are skipped when they come up.
+
+    The session limit is taken from the user, then the office, then
+    AUTO_LOGOUT_SESSION_HOURS. A periodic reconcile reloads open sessions from
+    the database to pick up sessions created by other workers.
+    """
+
+    RETRY_DELAY_SECONDS = 30.0
+
+    def __init__(self, batch_size: int = 100, reconcile_minutes: int = 10):
+        """Initialize the session expiry scheduler.
+
         Args:
-            interval_minutes: Interval in minutes to run the auto-logout check
+            batch_size: Maximum number of sessions closed per transaction
+            reconcile_minutes: Interval in minutes to reload open sessions from the database
         """
-        self.interval_minutes = interval_minutes
+        self.batch_size = batch_size
+        self.reconcile_minutes = reconcile_minutes
         self.is_running = False
         self.task: Optional[asyncio.Task] = None
-        logger.info("Auto-logout scheduler initialized with %d minute interval", interval_minutes)
-    
-    async def _get_db(self):
-        """Get a database session.
-        
-        Yields:
-            Database session
+
+        self._heap: List[Tuple[datetime, int]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Set when open sessions were restored from a snapshot, so the first full reconcile can wait
+        self._restored = False
+        logger.info(
+            "Session expiry scheduler initialized with batch size %d and %d minute reconcile interval",
+            batch_size, reconcile_minutes
+        )
+
+    @staticmethod
+    def deadline_for(
+        check_in_time: datetime,
+        user_limit_hours: Optional[float] = None,
+        office_limit_hours: Optional[float] = None,
+    ) -> datetime:
+        """Calculate when a session must be closed.
+
+        Args:
+            check_in_time: Check-in time of the session
+            user_limit_hours: Per-user session limit override (optional)
+            office_limit_hours: Per-office session limit override (optional)
+
+        Returns:
+            Deadline of the session
+        """
+        if user_limit_hours:
+            limit_hours = user_limit_hours
+        elif office_limit_hours:
+            limit_hours = office_limit_hours
+        else:
+            limit_hours = settings.AUTO_LOGOUT_SESSION_HOURS
+        return check_in_time + timedelta(hours=limit_hours)
+
+    def schedule(self, record_id: int, deadline: datetime) -> None:
+        """Schedule an open session to be closed at its deadline.
+
+        Safe to call from request worker threads.
+
+        Args:
+            record_id: ID of the open attendance record
+            deadline: Time at which the session must be closed
+        """
+        if not self.is_running:
+            return
+
+        with self._lock:
+            if self._deadlines.get(record_id) == deadline:
+                return
+            self._deadlines[record_id] = deadline
+            heapq.heappush(self._heap, (deadline, record_id))
+            is_earliest = self._heap[0][1] == record_id
+
+        # Only a new earliest deadline changes how long the loop should sleep
+        if is_earliest:
+            self._wake()
+
+    def cancel(self, record_id: int) -> None:
+        """Stop tracking a session that was closed by the user.
+
+        Args:
+            record_id: ID of the attendance record
+        """
+        with self._lock:
+            self._deadlines.pop(record_id, None)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of open sessions being tracked."""
+        return len(self._deadlines)
+
+    def _wake(self) -> None:
+        """Wake the scheduler loop so it recomputes its sleep time."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    @staticmethod
+    def _open_sessions(db: Session, from_id: Optional[int] = None) -> List[Tuple[int, datetime]]:
+        """Load open sessions with their deadlines.
+
+        Args:
+            db: Database session
+            from_id: Only load records with this ID or higher (optional)
+
+        Returns:
+            List of (record ID, deadline) tuples
+        """
+        query = db.query(
+            AttendanceRecord.id,
+            AttendanceRecord.check_in_time,
+            User.session_limit_hours,
+            Office.session_limit_hours,
+        ).join(
+            User, User.id == AttendanceRecord.user_id
+        ).outerjoin(
+            Office, Office.id == AttendanceRecord.office_id
+        ).filter(
+            AttendanceRecord.check_out_time.is_(None)
+        )
+        if from_id is not None:
+            query = query.filter(AttendanceRecord.id >= from_id)
+        rows = query.all()
+
+        return [
+            (record_id, SessionExpiryScheduler.deadline_for(check_in_time, user_limit, office_limit))
+            for record_id, check_in_time, user_limit, office_limit in rows
+        ]
+
+    def restore(self, from_id: Optional[int] = None) -> int:
+        """Load open sessions from the database into the heap.
+
+        Args:
+            from_id: Only reload records with this ID or higher; tracked
+                sessions below it are kept as they are (optional)
+
+        Returns:
+            Number of open sessions found
         """
         db = SessionLocal()
         try:
-            yield db
+            sessions = self._open_sessions(db, from_id)
         finally:
             db.close()
-    
-    async def _run_auto_logout(self):
-        """Run the auto-logout task periodically."""
-        logger.info("Starting auto-logout scheduler")
-        self.is_running = True
-        
+
+        with self._lock:
+            open_ids = set()
+            for record_id, deadline in sessions:
+                open_ids.add(record_id)
+                if self._deadlines.get(record_id) != deadline:
+                    self._deadlines[record_id] = deadline
+                    heapq.heappush(self._heap, (deadline, record_id))
+            # Forget sessions that were closed elsewhere
+            for record_id in list(self._deadlines):
+                if record_id not in open_ids and (from_id is None or record_id >= from_id):
+                    del self._deadlines[record_id]
+            self._heap = [entry for entry in self._heap if self._deadlines.get(entry[1]) == entry[0]]
+            heapq.heapify(self._heap)
+
+        logger.info("Restored %d open sessions into the expiry scheduler", len(sessions))
+        return len(sessions)
+
+    def export(self) -> List[Tuple[int, datetime]]:
+        """Get the tracked open sessions for a snapshot.
+
+        Returns:
+            List of (record ID, deadline) tuples
+        """
+        with self._lock:
+            return list(self._deadlines.items())
+
+    def restore_snapshot(self, sessions: List[Tuple[int, datetime]], from_id: int) -> int:
+        """Restore open sessions from a snapshot and validate them against the database.
+
+        Every session open when the snapshot was taken, and every session
+        opened since, has an ID of at least `from_id`, so only that recent
+        primary key range is read back instead of scanning the whole
+        attendance table for open sessions. The first full reconcile then
+        waits for its regular interval.
+
+        Args:
+            sessions: (record ID, deadline) tuples from the snapshot
+            from_id: Lowest record ID that can belong to an open session
+
+        Returns:
+            Number of open sessions tracked
+        """
+        with self._lock:
+            for record_id, deadline in sessions:
+                self._deadlines[record_id] = deadline
+                heapq.heappush(self._heap, (deadline, record_id))
+        self._restored = True
+
+        try:
+            self.restore(from_id)
+        except Exception as e:
+            # The snapshot alone is still a usable starting point
+            logger.error("Error validating restored sessions, keeping the snapshot: %s", str(e))
+        return self.pending_count
+
+    def _pop_due(self, now: datetime) -> Dict[int, datetime]:
+        """Pop up to one batch of sessions whose deadline has passed.
+
+        Args:
+            now: Current time
+
+        Returns:
+            Mapping of record ID to deadline
+        """
+        due = {}
+        with self._lock:
+            while self._heap and len(due) < self.batch_size:
+                deadline, record_id = self._heap[0]
+                if deadline > now:
+                    break
+                heapq.heappop(self._heap)
+                # Skip entries for sessions that were cancelled or rescheduled
+                if self._deadlines.get(record_id) == deadline:
+                    del self._deadlines[record_id]
+                    due[record_id] = deadline
+        return due
+
+    @staticmethod
+    def close_sessions(db: Session, deadlines: Dict[int, datetime]) -> List[AttendanceRecord]:
+        """Close sessions at their deadlines.
+
+        Sessions that were checked out in the meantime are left untouched.
+
+        Args:
+            db: Database session
+            deadlines: Mapping of record ID to deadline
+
+        Returns:
+            List of closed attendance records
+        """
+        records = db.query(AttendanceRecord).filter(
+            AttendanceRecord.id.in_(list(deadlines)),
+            AttendanceRecord.check_out_time.is_(None)
+        ).all()
+
+        for record in records:
+            record.check_out_time = deadlines[record.id]
+            # Maintain the same location as check-in for auto-logout
+            record.check_out_latitude = record.check_in_latitude
+            record.check_out_longitude = record.check_in_longitude
+            db.add(record)
+
+        if records:
+            # Described before the commit expires the records
+            events = [attendance_event(record, auto=True) for record in records]
+            record_ids = [record.id for record in records]
+            db.commit()
+            for record_id in record_ids:
+                occupancy.release(record_id)
+            for event in events:
+                event_bus.publish(*event)
+        return records
+
+    @classmethod
+    def close_overdue(cls, db: Session, now: Optional[datetime] = None) -> List[AttendanceRecord]:
+        """Close every open session whose deadline has passed.
+
+        Used by the auto-logout endpoint, which does not rely on the heap.
+
+        Args:
+            db: Database session
+            now: Current time (defaults to now)
+
+        Returns:
+            List of closed attendance records
+        """
+        now = now or datetime.now()
+        overdue = {
+            record_id: deadline
+            for record_id, deadline in cls._open_sessions(db)
+            if deadline <= now
+        }
+        if not overdue:
+            return []
+        return cls.close_sessions(db, overdue)
+
+    def expire_due(self) -> int:
+        """Close all sessions whose deadline has passed, one batch at a time.
+
+        Returns:
+            Number of sessions closed
+        """
+        closed = 0
+        while True:
+            due = self._pop_due(datetime.now())
+            if not due:
+                break
+
+            db = SessionLocal()
+            try:
+                with scheduler_job_duration.time("session_expiry"):
+                    records = self.close_sessions(db, due)
+            except Exception:
+                db.rollback()
+                # Put the batch back so the next run retries it
+                with self._lock:
+                    for record_id, deadline in due.items():
+                        self._deadlines[record_id] = deadline
+                        heapq.heappush(self._heap, (deadline, record_id))
+                raise
+            finally:
+                db.close()
+
+            closed += len(records)
+            scheduler_job_items.inc("session_expiry", amount=len(records))
+            for record_id in due:
+                logger.debug("Session %d reached its deadline", record_id)
+
+        if closed:
+            logger.info("Auto-logout closed %d sessions at their deadline", closed)
+        return closed
+
+    def _reconcile(self) -> None:
+        """Reload open sessions and run periodic cleanup."""
+        from app.core.idempotency import IdempotencyService
+
+        with scheduler_job_duration.time("session_reconcile"):
+            self.restore()
+        db = SessionLocal()
+        try:
+            with scheduler_job_duration.time("idempotency_purge"):
+                IdempotencyService.purge_expired(db)
+        finally:
+            db.close()
+
+    def _seconds_until_next_deadline(self) -> Optional[float]:
+        """Get the number of seconds until the earliest tracked deadline."""
+        with self._lock:
+            if not self._heap:
+                return None
+            deadline = self._heap[0][0]
+        return max((deadline - datetime.now()).total_seconds(), 0.0)
+
+    async def _run_expiry(self):
+        """Sleep until the next deadline or reconcile and close due sessions."""
+        logger.info("Starting session expiry scheduler")
+        loop = asyncio.get_running_loop()
+        reconcile_interval = self.reconcile_minutes * 60
+        next_reconcile = loop.time() + reconcile_interval if self._restored else loop.time()
+
         while self.is_running:
+            failed = False
             try:
-                logger.debug("Running scheduled auto-logout task")
-                
-                # Call the auto-logout endpoint
-                # Edit before Deployment
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        f"http://10.1.5.80:8051{settings.API_V1_STR}/attendance/auto-logout"
-                        # f"http://localhost:8051{settings.API_V1_STR}/attendance/auto-logout"
-                    )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info(
-                        "Scheduled auto-logout completed successfully: %d users logged out",
-                        len(result)
-                    )
-                else:
-                    logger.error(
-                        "Scheduled auto-logout failed with status code %d: %s",
-                        response.status_code,
-                        response.text
-                    )
-            
+                if loop.time() >= next_reconcile:
+                    await loop.run_in_executor(None, self._reconcile)
+                    next_reconcile = loop.time() + reconcile_interval
+
+                await loop.run_in_executor(None, self.expire_due)
+
             except Exception as e:
-                logger.exception("Error in scheduled auto-logout task: %s", str(e))
-            
-            # Wait for the next interval
-            await asyncio.sleep(self.interval_minutes * 60)
-    
+                failed = True
+                logger.exception("Error in session expiry scheduler: %s", str(e))
+
+            # Clear before computing the timeout so a concurrent schedule() is not lost
+            self._wakeup.clear()
+            timeout = next_reconcile - loop.time()
+            next_deadline = self._seconds_until_next_deadline()
+            if next_deadline is not None:
+                timeout = min(timeout, next_deadline)
+            if failed:
+                # Back off instead of retrying a failing batch in a tight loop
+                timeout = max(timeout, self.RETRY_DELAY_SECONDS)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
     def start(self):
-        """Start the auto-logout scheduler."""
+        """Start the session expiry scheduler."""
         if self.is_running:
-            logger.warning("Auto-logout scheduler is already running")
+            logger.warning("Session expiry scheduler is already running")
             return
-        
-        self.task = asyncio.create_task(self._run_auto_logout())
-        logger.info("Auto-logout scheduler started")
-    
+
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.is_running = True
+        self.task = asyncio.create_task(self._run_expiry())
+        logger.info("Session expiry scheduler started")
+
     def stop(self):
-        """Stop the auto-logout scheduler."""
+        """Stop the session expiry scheduler."""
         if not self.is_running:
-            logger.warning("Auto-logout scheduler is not running")
+            logger.warning("Session expiry scheduler is not running")
             return
-        
+
         self.is_running = False
         if self.task:
             self.task.cancel()
-        
-        logger.info("Auto-logout scheduler stopped")
+
+        with self._lock:
+            self._heap.clear()
+            self._deadlines.clear()
+        self._restored = False
+
+        logger.info("Session expiry scheduler stopped")
+
+
+# Shared instance used by the attendance endpoints and started on application startup
+session_expiry = SessionExpiryScheduler(
+    batch_size=settings.AUTO_LOGOUT_BATCH_SIZE,
+    reconcile_minutes=settings.AUTO_LOGOUT_INTERVAL_MINUTES,
+)
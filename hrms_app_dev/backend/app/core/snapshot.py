@@ -0,0 +1,246 @@
+import json
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import DateTime, func
+
+from app.config import settings
+from app.core.metrics import scheduler_job_duration
+from app.core.principals import CACHED_COLUMNS, principal_cache
+from app.core.scheduler import session_expiry
+from app.db.base import SessionLocal
+from app.logger import logger
+from app.models.models import AttendanceRecord, User
+
+_MAGIC = b"HRWS"
+_FORMAT_VERSION = 1
+# magic, version, creation time (unix ns), CRC32 of the payload, payload length
+_HEADER = struct.Struct("<4sIqII")
+_DATETIME_COLUMNS = {
+    column.key for column in User.__table__.columns if isinstance(column.type, DateTime)
+}
+
+
+def _encode_datetime(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _decode_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+class WarmStateSnapshot:
+    """Periodic snapshot of warm in-memory state, restored at startup.
+
+    Covers the principal cache and the open sessions tracked by the expiry
+    scheduler. Office geofences need no snapshot: their memory-mapped index
+    file already outlives restarts and is checked against the database on
+    first use.
+
+    The file is a fixed header (magic, format version, creation time, CRC32
+    and length of the payload) followed by a zlib-compressed payload: a JSON
+    section with the cached users and the database watermarks they are valid
+    at, then the open session record IDs (int64) and deadlines (float64
+    timestamps). A snapshot that fails any check is ignored, and restored
+    state is validated against the database:
+
+    - cached users are compared with the users table watermark on the first
+      lookup, which reloads whatever changed since the snapshot
+    - open sessions are reloaded for the primary key range that can contain
+      open sessions, instead of scanning the whole attendance table
+    """
+
+    def __init__(self, path: str, interval_seconds: float = 300.0):
+        """Initialize the snapshot writer.
+
+        Args:
+            path: Path of the snapshot file
+            interval_seconds: Interval between snapshots
+        """
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _serialize(self) -> bytes:
+        """Capture the current warm state."""
+        watermark, users = principal_cache.export()
+        sections: Dict[str, Any] = {}
+        if watermark is not None:
+            sections["users"] = {
+                "watermark": [watermark[0], watermark[1], _encode_datetime(watermark[2])],
+                "columns": list(CACHED_COLUMNS),
+                "rows": [
+                    [
+                        _encode_datetime(values[key]) if key in _DATETIME_COLUMNS else values[key]
+                        for key in CACHED_COLUMNS
+                    ]
+                    for values in users
+                ],
+            }
+
+        record_ids, deadlines = array("q"), array("d")
+        if session_expiry.is_running:
+            # Read before exporting, so sessions opened meanwhile fall in the reloaded range
+            db = SessionLocal()
+            try:
+                max_id = db.query(func.max(AttendanceRecord.id)).scalar() or 0
+            finally:
+                db.close()
+            for record_id, deadline in session_expiry.export():
+                record_ids.append(record_id)
+                deadlines.append(deadline.timestamp())
+            sections["sessions"] = {"from_id": min(record_ids, default=max_id + 1)}
+
+        meta = json.dumps(sections, separators=(",", ":")).encode()
+        payload = zlib.compress(
+            struct.pack("<I", len(meta)) + meta + struct.pack("<I", len(record_ids))
+            + record_ids.tobytes() + deadlines.tobytes()
+        )
+        header = _HEADER.pack(
+            _MAGIC, _FORMAT_VERSION, int(datetime.now().timestamp() * 1e9), zlib.crc32(payload), len(payload)
+        )
+        return header + payload
+
+    def write(self) -> int:
+        """Write a snapshot, atomically replacing the previous one.
+
+        Returns:
+            Size of the snapshot in bytes
+        """
+        data = self._serialize()
+        fd, temp_path = tempfile.mkstemp(prefix=".warm-", dir=os.path.dirname(self.path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        logger.debug("Wrote warm state snapshot of %d bytes to %s", len(data), self.path)
+        return len(data)
+
+    def _read(self) -> Optional[Tuple[datetime, bytes]]:
+        """Read and check the snapshot file.
+
+        Returns:
+            The creation time and decompressed payload, or None if there is
+            no valid snapshot
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < _HEADER.size:
+            logger.warning("Ignoring truncated warm state snapshot %s", self.path)
+            return None
+        magic, version, created_ns, checksum, length = _HEADER.unpack_from(data)
+        payload = data[_HEADER.size:]
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            logger.warning("Ignoring warm state snapshot with format %r version %d", magic, version)
+            return None
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            logger.warning("Ignoring corrupt warm state snapshot %s", self.path)
+            return None
+        return datetime.fromtimestamp(created_ns / 1e9), zlib.decompress(payload)
+
+    def restore(self) -> bool:
+        """Restore warm state from the snapshot file, if there is a valid one.
+
+        Must run before the session expiry scheduler starts.
+
+        Returns:
+            Whether a snapshot was restored
+        """
+        try:
+            snapshot = self._read()
+            if snapshot is None:
+                return False
+            created_at, body = snapshot
+            (meta_length,) = struct.unpack_from("<I", body)
+            sections = json.loads(body[4:4 + meta_length])
+            offset = 4 + meta_length
+            (session_count,) = struct.unpack_from("<I", body, offset)
+            offset += 4
+            record_ids = array("q", body[offset:offset + 8 * session_count])
+            deadlines = array("d", body[offset + 8 * session_count:offset + 16 * session_count])
+        except (OSError, ValueError, struct.error, zlib.error) as e:
+            logger.warning("Ignoring unreadable warm state snapshot %s: %s", self.path, str(e))
+            return False
+
+        users = sections.get("users")
+        restored_users = 0
+        if users is not None and users["columns"] == list(CACHED_COLUMNS):
+            count, max_id, max_updated = users["watermark"]
+            principal_cache.restore(
+                (count, max_id, _decode_datetime(max_updated)),
+                [
+                    {
+                        key: _decode_datetime(value) if key in _DATETIME_COLUMNS else value
+                        for key, value in zip(CACHED_COLUMNS, row)
+                    }
+                    for row in users["rows"]
+                ],
+            )
+            restored_users = len(users["rows"])
+
+        sessions = sections.get("sessions")
+        restored_sessions = 0
+        if sessions is not None and settings.AUTO_LOGOUT_ENABLED and not session_expiry.is_running:
+            restored_sessions = session_expiry.restore_snapshot(
+                [
+                    (record_id, datetime.fromtimestamp(deadline))
+                    for record_id, deadline in zip(record_ids, deadlines)
+                ],
+                sessions["from_id"],
+            )
+
+        logger.info(
+            "Restored warm state snapshot from %s: %d cached users, %d open sessions",
+            created_at.isoformat(timespec="seconds"), restored_users, restored_sessions
+        )
+        return True
+
+    def _run(self) -> None:
+        """Write snapshots until stopped."""
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                with scheduler_job_duration.time("warm_snapshot"):
+                    self.write()
+            except Exception as e:
+                logger.error("Error writing warm state snapshot: %s", str(e))
+
+    def start(self) -> None:
+        """Start writing snapshots periodically."""
+        if self._thread is not None:
+            logger.warning("Warm state snapshots are already running")
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="warm-state-snapshot", daemon=True)
+        self._thread.start()
+        logger.info("Warm state snapshots started with %.0fs interval", self.interval_seconds)
+
+    def stop(self) -> None:
+        """Stop the periodic snapshots and write a final one."""
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.write()
+        except Exception as e:
+            logger.error("Error writing final warm state snapshot: %s", str(e))
+
+
+warm_snapshot = WarmStateSnapshot(settings.WARM_SNAPSHOT_PATH, settings.WARM_SNAPSHOT_INTERVAL_SECONDS)
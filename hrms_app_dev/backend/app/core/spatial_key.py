@@ -0,0 +1,119 @@
+from typing import List, Tuple
+
+# Bits per coordinate; a step of latitude is 180 / 2**26 degrees, about 0.3 m
+KEY_BITS = 26
+_STEPS = 1 << KEY_BITS
+
+# (first key, last key) of a range of keys, both included
+KeyRange = Tuple[int, int]
+
+
+def _spread(value: int) -> int:
+    """Move the bits of a coordinate to the even bit positions."""
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def _quantize(value: float, low: float, span: float) -> int:
+    return min(max(int((value - low) / span * _STEPS), 0), _STEPS - 1)
+
+
+def _interleave(column: int, row: int) -> int:
+    return _spread(column) | (_spread(row) << 1)
+
+
+def spatial_key(lat: float, lon: float) -> int:
+    """Get the Z-order key of a point.
+
+    Latitude and longitude are quantized to KEY_BITS bits each and their bits
+    interleaved, longitude in the even positions. Points close to each other
+    mostly share a long key prefix, so the keys of any rectangle fall in a
+    few ranges that an ordinary index on the key can scan.
+
+    Args:
+        lat: Latitude of the point
+        lon: Longitude of the point
+
+    Returns:
+        Key of 2 * KEY_BITS bits
+    """
+    return _interleave(_quantize(lon, -180.0, 360.0), _quantize(lat, -90.0, 180.0))
+
+
+def _merge(ranges: List[KeyRange]) -> List[KeyRange]:
+    """Sort ranges and join the adjacent or overlapping ones."""
+    merged: List[KeyRange] = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _quadrant_ranges(quadrants: List[Tuple[int, int]], shift: int) -> List[KeyRange]:
+    """Get the key ranges of quadrants, given by column and row at the level of a shift."""
+    size = 1 << (2 * shift)
+    return [(key, key + size - 1) for key in (_interleave(column << shift, row << shift) for column, row in quadrants)]
+
+
+def key_ranges(
+    lat_min: float, lat_max: float, lon_min: float, lon_max: float, max_ranges: int = 16
+) -> List[KeyRange]:
+    """Cover a rectangle with ranges of spatial keys.
+
+    The Z-order quadtree is descended one level at a time. Quadrants wholly
+    inside the rectangle become ranges of their own, quadrants crossed by
+    its edges are split further, as long as the merged ranges stay within
+    max_ranges. The ranges hold every key of the rectangle and, from the
+    quadrants left unsplit, some keys around it, so matches still have to be
+    filtered by their coordinates.
+
+    Args:
+        lat_min: Southern edge of the rectangle
+        lat_max: Northern edge of the rectangle
+        lon_min: Western edge of the rectangle, not crossing the antimeridian
+        lon_max: Eastern edge of the rectangle
+        max_ranges: Most ranges to return, at least 1
+
+    Returns:
+        Sorted, disjoint key ranges
+    """
+    column_min, column_max = _quantize(lon_min, -180.0, 360.0), _quantize(lon_max, -180.0, 360.0)
+    row_min, row_max = _quantize(lat_min, -90.0, 180.0), _quantize(lat_max, -90.0, 180.0)
+
+    covered: List[KeyRange] = []
+    # Quadrants crossed by the edges of the rectangle, by column and row at the current level
+    crossed = [(0, 0)]
+    shift = KEY_BITS
+    while crossed and shift > 0:
+        shift -= 1
+        inside, split = [], []
+        for column, row in crossed:
+            for child_column in (2 * column, 2 * column + 1):
+                first_column, last_column = child_column << shift, ((child_column + 1) << shift) - 1
+                if last_column < column_min or first_column > column_max:
+                    continue
+                for child_row in (2 * row, 2 * row + 1):
+                    first_row, last_row = child_row << shift, ((child_row + 1) << shift) - 1
+                    if last_row < row_min or first_row > row_max:
+                        continue
+                    if column_min <= first_column and last_column <= column_max \
+                            and row_min <= first_row and last_row <= row_max:
+                        inside.append((child_column, child_row))
+                    else:
+                        split.append((child_column, child_row))
+
+        candidate = _merge(covered + _quadrant_ranges(inside + split, shift))
+        if len(candidate) > max_ranges:
+            # Keep the crossed quadrants of the previous level whole
+            shift += 1
+            break
+        covered = _merge(covered + _quadrant_ranges(inside, shift))
+        crossed = split
+
+    return _merge(covered + _quadrant_ranges(crossed, shift))
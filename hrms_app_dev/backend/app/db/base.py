@@ -1,26 +1,71 @@
+import threading
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
+from app.db.instrumentation import instrument_engine
 from app.logger import logger
 
-# MSSQL-specific: create engine with fast_executemany for performance
-# connect_args = {"fast_executemany": True}
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Get the shared engine, creating it on first use.
+
+    Creating the engine imports the database driver, so it is deferred until
+    the first session is opened instead of happening at import time.
+
+    Returns:
+        The application's SQLAlchemy engine
+    """
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # MSSQL-specific: create engine with fast_executemany for performance
+                # connect_args = {"fast_executemany": True}
+                engine = create_engine(
+                    settings.SQLALCHEMY_DATABASE_URI,
+                    # Comment the below lines for local postgres development
+                    # Edit before Deployment
+                    # connect_args={"fast_executemany": True},
+                    pool_pre_ping=True,
+                )
+                instrument_engine(engine)
+                SessionLocal.configure(bind=engine)
+                logger.info(
+                    "Database engine initialized for %s",
+                    make_url(settings.SQLALCHEMY_DATABASE_URI).render_as_string(hide_password=True),
+                )
+                _engine = engine
+    return _engine
+
+
+class _LazySessionMaker(sessionmaker):
+    """Session factory that binds to the engine when the first session is opened."""
 
-# Initialize SQLAlchemy engine for MSSQL
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI,
-    # Comment the below lines for local postgres development
-    # Edit before Deployment
-    # connect_args={"fast_executemany": True},
-    pool_pre_ping=True,
-)
+    def __call__(self, **local_kw):
+        if _engine is None:
+            get_engine()
+        return super().__call__(**local_kw)
 
-logger.info("Database engine initialized with URI: %s", settings.SQLALCHEMY_DATABASE_URI)
 
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = _LazySessionMaker(autocommit=False, autoflush=False)
+
+
+def __getattr__(name: str):
+    # Keeps `from app.db.base import engine` working without an import-time engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Declarative base class
 Base = declarative_base()
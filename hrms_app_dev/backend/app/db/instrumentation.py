@@ -0,0 +1,217 @@
+import re
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.logger import logger
+
+# Dialects whose EXPLAIN only plans the statement without running it
+_EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+# Dialects without EXPLAIN, where a session option makes statements return their plan instead of running
+_SHOWPLAN_OPTIONS = {
+    "mssql": ("SET SHOWPLAN_TEXT ON", "SET SHOWPLAN_TEXT OFF"),
+}
+
+# Name of the savepoint EXPLAIN runs in
+_EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*[^()]*?\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryStats:
+    """Database work done while handling one request."""
+
+    __slots__ = ("count", "duration", "scope")
+
+    def __init__(self, scope: Optional[dict] = None):
+        """Initialize empty stats.
+
+        Args:
+            scope: ASGI scope of the request, used to look up the matched route
+        """
+        self.count = 0
+        self.duration = 0.0
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        """Route template of the request, once routing has happened."""
+        route = (self.scope or {}).get("route")
+        return getattr(route, "path", None) or "unmatched"
+
+    def server_timing(self) -> str:
+        """Format the stats as a Server-Timing header value."""
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+# Stats of the request being handled, set by RequestContextMiddleware
+query_stats_var: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape so similar queries group together.
+
+    Literals become "?", IN lists collapse to "IN (...)" and whitespace is
+    squashed onto one line.
+
+    Args:
+        statement: SQL statement as sent to the driver
+
+    Returns:
+        Normalized statement
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> str:
+    """Describe bind parameters by type only, so values never reach the logs.
+
+    Args:
+        parameters: Parameters passed to the driver
+        executemany: Whether the parameters are a list of parameter sets
+
+    Returns:
+        Description such as "{id_1: int}" or "3 x (str, int)"
+    """
+    if executemany:
+        parameters = list(parameters)
+        first = parameter_shape(parameters[0]) if parameters else "()"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _explain(conn, statement: str, parameters: Any) -> Optional[str]:
+    """Capture the plan of a SELECT on a separate DBAPI cursor.
+
+    The raw cursor bypasses the engine events, so the EXPLAIN is neither
+    counted nor logged itself. It runs inside a savepoint that is rolled
+    back when it fails, since on PostgreSQL a failed statement would
+    otherwise abort the request's transaction. Dialects that cannot plan a
+    statement get a note saying so instead of a plan.
+    """
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    if conn.dialect.name in _SHOWPLAN_OPTIONS:
+        return _showplan(conn, statement, parameters, *_SHOWPLAN_OPTIONS[conn.dialect.name])
+    prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return f"Query plans are not supported on {conn.dialect.name}"
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+        except Exception as e:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            plan = f"EXPLAIN failed: {e}"
+        cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+        return plan
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def _showplan(conn, statement: str, parameters: Any, enable: str, disable: str) -> Optional[str]:
+    """Capture the plan of a SELECT on SQL Server, which has no EXPLAIN.
+
+    While SHOWPLAN_TEXT is on, statements return their estimated plan
+    instead of running. The option stays set on the connection, so it is
+    always switched off again; a connection where that fails is invalidated
+    rather than going back to the pool planning every later statement.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(enable)
+        try:
+            cursor.execute(statement, parameters)
+            # One result set with the statement, then one with its plan
+            rows = []
+            while True:
+                if cursor.description:
+                    rows.extend(cursor.fetchall())
+                if not cursor.nextset():
+                    break
+            return "\n".join(" ".join(str(column) for column in row) for row in rows)
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            try:
+                cursor.execute(disable)
+            except Exception as e:
+                logger.error("Could not switch off %s, discarding the connection: %s", disable, str(e))
+                conn.invalidate(e)
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+
+    stats = query_stats_var.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += duration
+
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    plan = None
+    if settings.SLOW_QUERY_EXPLAIN and not executemany:
+        plan = _explain(conn, statement, parameters)
+    logger.warning(
+        "Slow query (%.1f ms) on %s: %s params=%s%s",
+        duration * 1000,
+        stats.route if stats is not None else "background",
+        normalize_sql(statement),
+        parameter_shape(parameters, executemany),
+        f"\nplan:\n{plan}" if plan else "",
+    )
+
+
+def _handle_error(context) -> None:
+    # Failed statements never reach after_cursor_execute
+    start_times = context.connection.info.get("query_start_time") if context.connection else None
+    if start_times:
+        start_times.pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement run through an engine.
+
+    Query count and DB time are added to the current request's QueryStats and
+    statements above SLOW_QUERY_THRESHOLD_MS are logged.
+
+    Args:
+        engine: Engine to instrument
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
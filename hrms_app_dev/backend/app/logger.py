@@ -1,82 +1,258 @@
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
-from typing import Any, Dict, Optional
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+# ID of the request being handled, set by RequestContextMiddleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Loggers owned by the application; library loggers keep their own configuration
+APP_LOGGER_NAMES = ("attendance_tracker", "app")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to every record.
+
+    Runs on the emitting thread, where the request context is available,
+    before the record is handed to the logging queue.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Sample and rate-limit high-frequency DEBUG and INFO messages.
+
+    Limits apply per logger and message template, so one chatty call site
+    cannot starve the others. The default rate only limits DEBUG messages;
+    INFO messages, which include audit events such as logins and check-ins,
+    are only limited for loggers given their own rate. Warnings and errors
+    always pass. The number of suppressed records is reported on the next
+    record that gets through.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: int,
+        rate_overrides: Optional[Dict[str, float]] = None,
+        sample_rates: Optional[Dict[str, float]] = None,
+    ):
+        """Initialize the filter.
+
+        Args:
+            rate_per_second: Default sustained rate of DEBUG messages per message template
+            burst: Number of messages allowed in a burst per message template
+            rate_overrides: Per-logger rate per second of DEBUG and INFO messages overriding the default
+            sample_rates: Per-logger fraction of DEBUG/INFO records to keep
+        """
+        super().__init__()
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.rate_overrides = rate_overrides or {}
+        self.sample_rates = sample_rates or {}
+        # (logger name, template) -> (tokens, last refill time, suppressed count)
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        sample_rate = self.sample_rates.get(record.name)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return False
+
+        rate = self.rate_overrides.get(record.name)
+        if rate is None:
+            rate = self.rate_per_second if record.levelno < logging.INFO else 0.0
+        if rate <= 0:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (float(self.burst), now, 0))
+            tokens = min(float(self.burst), tokens + (now - last) * rate)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1.0, now, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Queue handler that keeps the message and exception apart.
+
+    The stock QueueHandler folds the traceback into the message; keeping it in
+    exc_text lets the JSON formatter emit it as a separate field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text formatter that also reports suppressed records."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        if getattr(record, "suppressed", 0):
+            message += f" ({record.suppressed} similar messages suppressed)"
+        return message
+
+
+_queue_handler: Optional[QueueHandler] = None
+_listener: Optional[QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging() -> QueueHandler:
+    """Set up the non-blocking logging pipeline once per process.
+
+    Application loggers get a QueueHandler, so the request thread only
+    filters and enqueues records; formatting and stdout I/O happen on a
+    QueueListener thread.
+
+    Returns:
+        The shared queue handler
+    """
+    global _queue_handler, _listener
+
+    with _configure_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if settings.LOG_FORMAT == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(TextFormatter(TEXT_FORMAT))
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        _queue_handler = StructuredQueueHandler(log_queue)
+        _queue_handler.addFilter(RequestIdFilter())
+        _queue_handler.addFilter(RateLimitFilter(
+            rate_per_second=settings.LOG_RATE_LIMIT_PER_SECOND,
+            burst=settings.LOG_RATE_LIMIT_BURST,
+            rate_overrides=settings.LOG_RATE_LIMITS,
+            sample_rates=settings.LOG_SAMPLE_RATES,
+        ))
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        os.register_at_fork(after_in_child=_restart_listener)
+
+        level = logging.getLevelName(settings.LOG_LEVEL.upper())
+        for name in APP_LOGGER_NAMES:
+            app_logger = logging.getLogger(name)
+            app_logger.setLevel(level)
+            app_logger.addHandler(_queue_handler)
+            app_logger.propagate = False
+
+        return _queue_handler
+
+
+def _restart_listener() -> None:
+    """Start a listener thread in a forked child, e.g. a pre-forked worker.
+
+    Threads do not survive fork, so without this every record logged by the
+    child would stay in the queue. The child gets a fresh queue because
+    records still queued in the parent are written by the parent.
+    """
+    if _listener is None:
+        return
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener.queue = log_queue
+    _listener._thread = None
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Stop the listener thread after writing every queued record."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 class Logger:
-    """Custom logger class for the application."""
-    
-    def __init__(self, name: str, level: int = logging.INFO) -> None:
+    """Custom logger class for the application.
+
+    The logging methods are the underlying logging.Logger's bound methods, so
+    a call costs no extra Python frame and reports the caller's module and
+    line number.
+    """
+
+    def __init__(self, name: str, level: Optional[int] = None) -> None:
         """Initialize the logger.
-        
+
         Args:
             name: The name of the logger
-            level: The log level
+            level: The log level (defaults to LOG_LEVEL)
         """
+        configure_logging()
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(level)
-        
-        if not self.logger.handlers:
-            handler = logging.StreamHandler(sys.stdout)
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
-    
-    def debug(self, msg: str, *args: Any, **kwargs: Dict[str, Any]) -> None:
-        """Log a debug message.
-        
-        Args:
-            msg: The message format string
-            args: The arguments to be formatted in the message
-            kwargs: The keyword arguments to be formatted in the message
-        """
-        if self.logger.isEnabledFor(logging.DEBUG):
-            self.logger.debug(msg, *args, **kwargs)
-    
-    def info(self, msg: str, *args: Any, **kwargs: Dict[str, Any]) -> None:
-        """Log an info message.
-        
-        Args:
-            msg: The message format string
-            args: The arguments to be formatted in the message
-            kwargs: The keyword arguments to be formatted in the message
-        """
-        if self.logger.isEnabledFor(logging.INFO):
-            self.logger.info(msg, *args, **kwargs)
-    
-    def warning(self, msg: str, *args: Any, **kwargs: Dict[str, Any]) -> None:
-        """Log a warning message.
-        
-        Args:
-            msg: The message format string
-            args: The arguments to be formatted in the message
-            kwargs: The keyword arguments to be formatted in the message
-        """
-        if self.logger.isEnabledFor(logging.WARNING):
-            self.logger.warning(msg, *args, **kwargs)
-    
-    def error(self, msg: str, *args: Any, **kwargs: Dict[str, Any]) -> None:
-        """Log an error message.
-        
-        Args:
-            msg: The message format string
-            args: The arguments to be formatted in the message
-            kwargs: The keyword arguments to be formatted in the message
-        """
-        if self.logger.isEnabledFor(logging.ERROR):
-            self.logger.error(msg, *args, **kwargs)
-    
-    def critical(self, msg: str, *args: Any, **kwargs: Dict[str, Any]) -> None:
-        """Log a critical message.
-        
-        Args:
-            msg: The message format string
-            args: The arguments to be formatted in the message
-            kwargs: The keyword arguments to be formatted in the message
-        """
-        if self.logger.isEnabledFor(logging.CRITICAL):
-            self.logger.critical(msg, *args, **kwargs)
+        if level is not None:
+            self.logger.setLevel(level)
+
+        self.debug = self.logger.debug
+        self.info = self.logger.info
+        self.warning = self.logger.warning
+        self.error = self.logger.error
+        self.critical = self.logger.critical
+        self.exception = self.logger.exception
 
 # Create a default logger instance
-logger = Logger("attendance_tracker")
\ No newline at end of file
+logger = Logger("attendance_tracker")
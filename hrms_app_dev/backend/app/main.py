@@ -1,135 +1,198 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-
-from app.core.scheduler import AutoLogoutScheduler
-from app.api import attendance, auth, offices
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import IntegrityError
+
+from app.core.audit import login_audit
+from app.core.metrics import MetricsMiddleware, register_pool_metrics, registry
+from app.core.middleware import RequestContextMiddleware
+from app.core.occupancy import occupancy
+from app.core.revocation import revoked_tokens
+from app.core.scheduler import session_expiry
+from app.core.snapshot import warm_snapshot
+from app.api import admin, attendance, auth, offices
 from app.config import settings
-from app.db.base import Base, engine
+from app.db.base import SessionLocal, get_engine
 from app.logger import logger
-from app.api import admin
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
-# Initialize FastAPI app
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json",
-)
-
-app.include_router(
-    admin.router, 
-    prefix=f"{settings.API_V1_STR}/admin", 
-    tags=["admin"]
-)
-
-# Set up CORS middleware
-if settings.BACKEND_CORS_ORIGINS:
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=[str(origin) for origin in settings.BACKEND_CORS_ORIGINS],
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
-else:
-    # If no specific origins set, allow all
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
+
+
+def create_app() -> FastAPI:
+    """Build the FastAPI application.
+
+    Building the app does not touch the database: the engine is created on
+    first use and the schema is managed by the Alembic migrations in
+    migrations/ (`alembic upgrade head`).
+
+    Returns:
+        The configured application
+    """
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
     )
 
-# Include API routers
-app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
-app.include_router(offices.router, prefix=f"{settings.API_V1_STR}/offices", tags=["offices"])
-app.include_router(attendance.router, prefix=f"{settings.API_V1_STR}/attendance", tags=["attendance"])
+    # Set up CORS middleware
+    if settings.BACKEND_CORS_ORIGINS:
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=[str(origin) for origin in settings.BACKEND_CORS_ORIGINS],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+    else:
+        # If no specific origins set, allow all
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
 
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
 
-@app.get("/")
-def root():
-    """Root endpoint for API health check."""
-    return {"message": "Welcome to the Attendance Tracker API"}
+    # Outermost middleware, so every log line of a request carries its ID
+    app.add_middleware(RequestContextMiddleware)
 
+    # Include API routers
+    app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["admin"])
+    app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
+    app.include_router(offices.router, prefix=f"{settings.API_V1_STR}/offices", tags=["offices"])
+    app.include_router(attendance.router, prefix=f"{settings.API_V1_STR}/attendance", tags=["attendance"])
+
+    @app.get("/")
+    def root():
+        """Root endpoint for API health check."""
+        return {"message": "Welcome to the Attendance Tracker API"}
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        """Expose application metrics in the Prometheus text exposition format."""
+        if not settings.METRICS_ENABLED:
+            return PlainTextResponse("Metrics are disabled\n", status_code=404)
+        return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+    app.add_event_handler("startup", startup_event)
+    app.add_event_handler("shutdown", shutdown_event)
+    return app
 
-# Initialize auto-logout scheduler
-auto_logout_scheduler = None
 
-@app.on_event("startup")
 async def startup_event():
-    """Initialize services on application startup."""
-    global auto_logout_scheduler
-    
+    """Initialize services on application startup.
+
+    Every step is safe to repeat: services ignore a second start and the
+    super admin is only created when the users table is empty.
+    """
     logger.info("Starting application")
-    
+
+    if settings.METRICS_ENABLED:
+        register_pool_metrics(get_engine())
+
+    login_audit.start()
+    revoked_tokens.start()
+
+    if settings.WARM_SNAPSHOT_ENABLED:
+        # Before the expiry scheduler starts, so it picks up the restored sessions
+        warm_snapshot.restore()
+
     if settings.AUTO_LOGOUT_ENABLED:
         logger.info(
-            "Auto-logout feature enabled with %d-hour timeout and %d-minute check interval",
+            "Auto-logout feature enabled with %d-hour default timeout and %d-minute reconcile interval",
             settings.AUTO_LOGOUT_SESSION_HOURS,
             settings.AUTO_LOGOUT_INTERVAL_MINUTES
         )
-        auto_logout_scheduler = AutoLogoutScheduler(
-            interval_minutes=settings.AUTO_LOGOUT_INTERVAL_MINUTES
-        )
-        auto_logout_scheduler.start()
+        session_expiry.start()
     else:
         logger.info("Auto-logout feature disabled")
-    
+
+    occupancy.start()
+
+    if settings.WARM_SNAPSHOT_ENABLED:
+        warm_snapshot.start()
+
     # Create first superadmin if needed
-    await create_first_superadmin()
+    create_first_superadmin()
 
-@app.on_event("startup")
-async def create_first_superadmin():
+
+def create_first_superadmin():
     """Create the first super admin if no users exist."""
-    from app.db.base import SessionLocal
     from app.models.models import User
     from app.core.auth import get_password_hash
-    import os
-    
+
     db = SessionLocal()
     try:
         # Check if any users exist
-        user_count = db.query(User).count()
-        
-        if user_count == 0:
-            # Get super admin credentials from environment variables
-            super_admin_username = os.getenv("SUPER_ADMIN_USERNAME", "superadmin")
-            super_admin_email = os.getenv("SUPER_ADMIN_EMAIL", "superadmin@example.com")
-            super_admin_password = os.getenv("SUPER_ADMIN_PASSWORD", "superadmin123")
-            
-            # Create super admin user
-            super_admin = User(
-                email=super_admin_email,
-                username=super_admin_username,
-                hashed_password=get_password_hash(super_admin_password),
-                full_name="Super Admin Debshishu",
-                is_active=True,
-                is_admin=True,
-                is_super_admin=True,
-            )
-            
-            db.add(super_admin)
-            db.commit()
-            db.refresh(super_admin)
-            
-            logger.info("Created first super admin user: %s", super_admin_username)
-            logger.warning("Please change the default super admin password immediately!")
+        if db.query(User.id).first() is not None:
+            return
+
+        # Get super admin credentials from environment variables
+        super_admin_username = os.getenv("SUPER_ADMIN_USERNAME", "superadmin")
+        super_admin_email = os.getenv("SUPER_ADMIN_EMAIL", "superadmin@example.com")
+        super_admin_password = os.getenv("SUPER_ADMIN_PASSWORD", "superadmin123")
+
+        # Create super admin user
+        super_admin = User(
+            email=super_admin_email,
+            username=super_admin_username,
+            hashed_password=get_password_hash(super_admin_password),
+            full_name="Super Admin Debshishu",
+            is_active=True,
+            is_admin=True,
+            is_super_admin=True,
+        )
+
+        db.add(super_admin)
+        db.commit()
+
+        logger.info("Created first super admin user: %s", super_admin_username)
+        logger.warning("Please change the default super admin password immediately!")
+    except IntegrityError:
+        # Another worker booting at the same time created it first
+        db.rollback()
+        logger.info("First super admin was created by another worker")
     except Exception as e:
         logger.error("Error creating first super admin: %s", str(e))
     finally:
         db.close()
 
 
-@app.on_event("shutdown")
 async def shutdown_event():
     """Execute tasks at application shutdown."""
     logger.info("Shutting down Attendance Tracker API")
 
+    # Before the scheduler stops and forgets its open sessions
+    warm_snapshot.stop()
+
+    if session_expiry.is_running:
+        session_expiry.stop()
+
+    occupancy.stop()
+    revoked_tokens.stop()
+
+    # Flush buffered login history before the process exits
+    login_audit.stop()
+
+
+_app = None
+
+
+def __getattr__(name: str):
+    # `uvicorn app.main:app` keeps working; the app is only built when asked for
+    global _app
+
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
     import uvicorn
-    
+
     logger.info("Starting Attendance Tracker API server")
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8051, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:create_app", factory=True, host="0.0.0.0", port=8051, reload=True)
@@ -2,9 +2,11 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Enum as SQLAlchemyEnum, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, Enum as SQLAlchemyEnum, UniqueConstraint
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 
+from app.core.spatial_key import spatial_key
 from app.db.base import Base
 
 
@@ -23,7 +25,10 @@ class User(Base):
     is_super_admin = Column(Boolean, default=False)
     created_by = Column(Integer, ForeignKey("hrms_users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.now)
+    # Watermark for cached principals, stamped by the database clock
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
     last_login = Column(DateTime, nullable=True)
+    session_limit_hours = Column(Float, nullable=True)  # Overrides the office and default session limit
     
     # Relationships
     attendance_records = relationship("AttendanceRecord", back_populates="user")
@@ -50,9 +55,10 @@ class UserHomeAddress(Base):
     postal_code = Column(String(20), nullable=False)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    radius = Column(Float, nullable=True)  # Geofence radius in meters, the default if empty
     is_current = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # Watermark for cached home fences
     
     # Relationship with User model
     user = relationship("User", back_populates="home_addresses")
@@ -73,6 +79,7 @@ class UserLoginHistory(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("hrms_users.id"), nullable=False)
+    session_id = Column(String(32), unique=True, index=True, nullable=True)  # "sid" claim of the issued token
     login_time = Column(DateTime, nullable=False, default=datetime.now)
     logout_time = Column(DateTime, nullable=True)
     ip_address = Column(String(50), nullable=True)
@@ -85,6 +92,21 @@ class UserLoginHistory(Base):
         return f"<LoginSession {self.id} - User: {self.user_id} - Status: {status}>"
 
 
+class RevokedToken(Base):
+    """Access tokens revoked before their expiry, identified by their session ID."""
+    
+    __tablename__ = "hrms_revoked_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(32), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("hrms_users.id"), nullable=False)
+    revoked_at = Column(DateTime, nullable=False, default=datetime.now, index=True)  # Watermark for delta syncs
+    expires_at = Column(DateTime, nullable=False, index=True)  # Token expiry; the row is pruned after it
+    
+    def __repr__(self):
+        return f"<RevokedToken {self.session_id} - User: {self.user_id}>"
+
+
 class Office(Base):
     """Office location with geofence coordinates."""
     
@@ -96,8 +118,11 @@ class Office(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     radius = Column(Float, nullable=False)
+    # GeoJSON Polygon or MultiPolygon; when set it replaces the circle given by the radius
+    boundary = Column(Text, nullable=True)
+    session_limit_hours = Column(Float, nullable=True)  # Overrides the default session limit
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())  # Watermark for the geofence index
     
     attendance_records = relationship("AttendanceRecord", back_populates="office")
     
@@ -112,6 +137,15 @@ class LocationType(str, Enum):
     OTHER = "other"
 
 
+def _check_in_cell(context) -> Optional[int]:
+    """Derive the spatial key of a check-in being inserted, for ORM and bulk inserts alike."""
+    parameters = context.get_current_parameters()
+    lat, lon = parameters.get("check_in_latitude"), parameters.get("check_in_longitude")
+    if lat is None or lon is None:
+        return None
+    return spatial_key(lat, lon)
+
+
 class AttendanceRecord(Base):
     """Records of check-ins and check-outs for attendance tracking."""
     
@@ -133,6 +167,8 @@ class AttendanceRecord(Base):
     check_in_longitude = Column(Float, nullable=False)
     check_out_latitude = Column(Float, nullable=True)
     check_out_longitude = Column(Float, nullable=True)
+    # Z-order key of the check-in location, for searching check-ins by area
+    check_in_cell = Column(BigInteger, nullable=True, index=True, default=_check_in_cell)
     
     # Relationships
     user = relationship("User", back_populates="attendance_records")
@@ -142,4 +178,77 @@ class AttendanceRecord(Base):
     def __repr__(self):
         status = "Active" if self.check_out_time is None else "Completed"
         location = f"{self.location_type.value}"
-        return f"<AttendanceRecord {self.id} - User: {self.user_id} - Location: {location} - Status: {status}>"
\ No newline at end of file
+        return f"<AttendanceRecord {self.id} - User: {self.user_id} - Location: {location} - Status: {status}>"
+
+
+class IdempotencyKey(Base):
+    """Client-supplied keys used to deduplicate retried attendance writes."""
+    
+    __tablename__ = "hrms_idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("hrms_users.id"), nullable=False)
+    key = Column(String(64), nullable=False)
+    endpoint = Column(String(50), nullable=False)  # 'check_in' or 'check_out'
+    attendance_record_id = Column(Integer, ForeignKey("hrms_attendance_records.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    attendance_record = relationship("AttendanceRecord")
+    
+    # A key is only unique per user so clients can generate them independently
+    __table_args__ = (
+        UniqueConstraint('user_id', 'key', name='uix_user_idempotency_key'),
+    )
+    
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key} - User: {self.user_id} - Endpoint: {self.endpoint}>"
+
+
+class LocationCluster(Base):
+    """Dense areas of check-ins at other locations, from the latest clustering run."""
+    
+    __tablename__ = "hrms_location_clusters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    latitude = Column(Float, nullable=False)  # Centroid of the check-ins
+    longitude = Column(Float, nullable=False)
+    radius = Column(Float, nullable=False)  # Meters from the centroid holding every check-in
+    check_ins = Column(Integer, nullable=False)
+    users = Column(Integer, nullable=False)  # Distinct users who checked in
+    first_check_in = Column(DateTime, nullable=False)
+    last_check_in = Column(DateTime, nullable=False)
+    # Not a foreign key, clusters are kept as computed when offices are deleted
+    nearest_office_id = Column(Integer, nullable=True)
+    nearest_office_distance = Column(Float, nullable=True)  # Meters from the centroid to the office geofence
+    eps_meters = Column(Float, nullable=False)
+    min_check_ins = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.now)
+    
+    def __repr__(self):
+        return f"<LocationCluster {self.id} ({self.latitude}, {self.longitude}) - Check-ins: {self.check_ins}>"
+
+
+class LocationClusterRun(Base):
+    """Clustering runs of check-ins at other locations."""
+    
+    __tablename__ = "hrms_location_cluster_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # True while the run is in progress, NULL after; unique, so only one run at a time can hold it
+    claim = Column(Boolean, nullable=True, unique=True)
+    status = Column(String(20), nullable=False, default="running")  # 'running', 'completed' or 'failed'
+    requested_by = Column(Integer, ForeignKey("hrms_users.id"), nullable=True)
+    eps_meters = Column(Float, nullable=False)
+    min_check_ins = Column(Integer, nullable=False)
+    since = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+    check_ins = Column(Integer, nullable=True)  # Other check-ins clustered
+    clustered_check_ins = Column(Integer, nullable=True)  # Check-ins inside any cluster
+    clusters = Column(Integer, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    def __repr__(self):
+        return f"<LocationClusterRun {self.id} - Status: {self.status}>"
@@ -1,8 +1,9 @@
+import json
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, root_validator, validator
 
 
 # Enum for location types
@@ -56,11 +57,24 @@ class UserHomeAddressUpdate(BaseModel):
     is_current: Optional[bool] = None
 
 
+class AdminUserHomeAddressCreate(UserHomeAddressCreate):
+    """Schema for admin creating a home address, with an optional geofence radius."""
+    
+    radius: Optional[float] = Field(None, gt=0, description="Geofence radius in meters")
+
+
+class AdminUserHomeAddressUpdate(UserHomeAddressUpdate):
+    """Schema for admin updating a home address, including its geofence radius."""
+    
+    radius: Optional[float] = Field(None, gt=0, description="Geofence radius in meters, null for the default")
+
+
 class UserHomeAddressInDB(UserHomeAddressBase):
     """Schema for home address data as stored in DB."""
     
     id: int
     user_id: int
+    radius: Optional[float] = None  # Geofence radius override in meters
     created_at: datetime
     updated_at: datetime
 
@@ -109,6 +123,7 @@ class UserInDB(UserBase):
     created_at: datetime
     last_login: Optional[datetime] = None
     created_by: Optional[int] = None
+    session_limit_hours: Optional[float] = None
 
     class Config:
         orm_mode = True
@@ -130,6 +145,7 @@ class AdminUserCreate(BaseModel):
     full_name: Optional[str] = None
     is_active: bool = True
     is_admin: bool = False  # Only super_admin can set this to True
+    session_limit_hours: Optional[float] = Field(None, gt=0, description="Attendance session limit in hours")
 
 
 class AdminUserUpdate(BaseModel):
@@ -141,6 +157,7 @@ class AdminUserUpdate(BaseModel):
     full_name: Optional[str] = None
     is_active: Optional[bool] = None
     is_admin: Optional[bool] = None  # Only super_admin can modify this
+    session_limit_hours: Optional[float] = Field(None, gt=0, description="Attendance session limit in hours")
 
 
 class UserExtended(User):
@@ -150,6 +167,56 @@ class UserExtended(User):
 
 
 # Office Schemas
+MAX_BOUNDARY_VERTICES = 10000
+
+
+class OfficeBoundary(BaseModel):
+    """Schema for a polygon geofence as a GeoJSON Polygon or MultiPolygon.
+    
+    Positions are [longitude, latitude]. Rings are closed if they are not
+    already; holes are supported, boundaries crossing the antimeridian are not.
+    """
+    
+    type: Literal["Polygon", "MultiPolygon"]
+    coordinates: List
+    
+    @validator('coordinates')
+    def validate_coordinates(cls, v, values):
+        polygons = [v] if values.get('type') == "Polygon" else v
+        normalized, vertices = [], 0
+        for polygon in polygons:
+            if not isinstance(polygon, list) or not polygon:
+                raise ValueError("Each polygon must be a non-empty list of rings")
+            rings = []
+            for ring in polygon:
+                if not isinstance(ring, list):
+                    raise ValueError("Each ring must be a list of positions")
+                positions = []
+                for position in ring:
+                    if not isinstance(position, list) or len(position) < 2:
+                        raise ValueError("Positions must be [longitude, latitude]")
+                    longitude, latitude = float(position[0]), float(position[1])
+                    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+                        raise ValueError(f"Position {position} is out of range")
+                    positions.append([longitude, latitude])
+                if positions and positions[0] != positions[-1]:
+                    positions.append(positions[0])
+                if len(positions) < 4:
+                    raise ValueError("Rings need at least 3 distinct positions")
+                rings.append(positions)
+                vertices += len(positions)
+            normalized.append(rings)
+        
+        if not normalized:
+            raise ValueError("A MultiPolygon needs at least one polygon")
+        if vertices > MAX_BOUNDARY_VERTICES:
+            raise ValueError(f"Boundaries are limited to {MAX_BOUNDARY_VERTICES} positions")
+        longitudes = [position[0] for rings in normalized for ring in rings for position in ring]
+        if max(longitudes) - min(longitudes) > 180:
+            raise ValueError("Boundaries crossing the antimeridian are not supported")
+        return normalized[0] if values.get('type') == "Polygon" else normalized
+
+
 class OfficeBase(BaseModel):
     """Base schema for Office data."""
     
@@ -157,13 +224,30 @@ class OfficeBase(BaseModel):
     address: str
     latitude: float
     longitude: float
-    radius: float = Field(..., description="Radius of geofence in meters")
+    radius: Optional[float] = Field(
+        None, description="Radius of geofence in meters, derived from the boundary if not given"
+    )
+    boundary: Optional[OfficeBoundary] = Field(
+        None, description="Polygon geofence; replaces the circle given by the radius"
+    )
+    session_limit_hours: Optional[float] = Field(None, gt=0, description="Attendance session limit in hours")
+    
+    @validator('boundary', pre=True)
+    def parse_boundary(cls, v):
+        # Stored as GeoJSON text
+        if isinstance(v, str):
+            return json.loads(v)
+        return v
 
 
 class OfficeCreate(OfficeBase):
     """Schema for creating a new office."""
     
-    pass
+    @root_validator(skip_on_failure=True)
+    def validate_geofence(cls, values):
+        if values.get('radius') is None and values.get('boundary') is None:
+            raise ValueError("Either a radius or a boundary is required")
+        return values
 
 
 class OfficeUpdate(BaseModel):
@@ -174,12 +258,15 @@ class OfficeUpdate(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     radius: Optional[float] = None
+    boundary: Optional[OfficeBoundary] = None  # Null turns the office back into a circular geofence
+    session_limit_hours: Optional[float] = Field(None, gt=0)
 
 
 class OfficeInDB(OfficeBase):
     """Schema for Office data as stored in DB."""
     
     id: int
+    radius: float
     created_at: datetime
     updated_at: datetime
 
@@ -193,6 +280,24 @@ class Office(OfficeInDB):
     pass
 
 
+class OfficeOccupancy(BaseModel):
+    """Schema for the number of people checked in at an office."""
+    
+    office_id: int
+    name: str
+    count: int
+    reconciled_at: Optional[datetime] = None  # Last full reload of open sessions
+
+
+class OccupancySummary(BaseModel):
+    """Schema for the number of people checked in across all locations."""
+    
+    total: int
+    by_location_type: Dict[LocationType, int]
+    offices: List[OfficeOccupancy]
+    reconciled_at: Optional[datetime] = None  # Last full reload of open sessions
+
+
 # Attendance Schemas
 class AttendanceBase(BaseModel):
     """Base schema for Attendance data."""
@@ -249,6 +354,55 @@ class AttendanceRecord(BaseModel):
         orm_mode = True
 
 
+# Offline Sync Schemas
+class SyncEventType(str, Enum):
+    """Enum for attendance events that can be queued offline."""
+    CHECK_IN = "check_in"
+    CHECK_OUT = "check_out"
+
+
+class SyncEventStatus(str, Enum):
+    """Enum for the outcome of a synced attendance event."""
+    APPLIED = "applied"
+    DUPLICATE = "duplicate"
+    REJECTED = "rejected"
+
+
+class AttendanceSyncEvent(BaseModel):
+    """Schema for a single attendance event captured while offline."""
+    
+    event_type: SyncEventType
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    timestamp: datetime  # When the event happened on the client
+    latitude: float
+    longitude: float
+    location_type: Optional[LocationType] = None  # Required for check-in events
+    office_id: Optional[int] = None
+    home_address_id: Optional[int] = None
+    
+    @validator('location_type', always=True)
+    def validate_location_type(cls, v, values):
+        if values.get('event_type') == SyncEventType.CHECK_IN and not v:
+            raise ValueError('location_type is required for check_in events')
+        return v
+
+
+class AttendanceSyncRequest(BaseModel):
+    """Schema for a queue of offline attendance events."""
+    
+    events: List[AttendanceSyncEvent]
+
+
+class AttendanceSyncResult(BaseModel):
+    """Schema for the outcome of one synced attendance event."""
+    
+    idempotency_key: str
+    event_type: SyncEventType
+    status: SyncEventStatus
+    detail: Optional[str] = None
+    record: Optional[AttendanceRecord] = None
+
+
 # Login History Schemas
 class LoginHistoryBase(BaseModel):
     """Base schema for login history."""
@@ -288,9 +442,13 @@ class TokenPayload(BaseModel):
     
     sub: int
     exp: int  # Store as Unix timestamp
+    sid: Optional[str] = None  # Login session ID, absent in tokens issued before sessions were tracked
 
 
 # Location Schemas
+MAX_NEAREST_OFFICES = 100
+
+
 class LocationCheck(BaseModel):
     """Schema for checking if a location is within a geofence."""
     
@@ -298,6 +456,9 @@ class LocationCheck(BaseModel):
     longitude: float
     office_id: Optional[int] = None  # If not provided, check against all offices
     home_address_id: Optional[int] = None  # For checking against home address
+    # Without an office or home address, only report the k nearest offices within max_distance meters
+    k: Optional[int] = Field(None, ge=1, le=MAX_NEAREST_OFFICES)
+    max_distance: Optional[float] = Field(None, gt=0)
 
 
 class GeofenceStatus(BaseModel):
@@ -309,4 +470,130 @@ class GeofenceStatus(BaseModel):
     office_name: Optional[str] = None
     home_address_id: Optional[int] = None
     address_type: Optional[str] = None
-    distance: Optional[float] = None  # Distance in meters
\ No newline at end of file
+    distance: Optional[float] = None  # Meters to the center, or to the boundary (0 inside) for polygon geofences
+
+
+# Geofence Coverage Schemas
+class FenceOverlap(BaseModel):
+    """Schema for a pair of overlapping office geofences."""
+    
+    office_id: int
+    office_name: str
+    other_office_id: int
+    other_office_name: str
+    center_distance: float  # Meters between the office centers
+    overlap: Optional[float] = None  # Meters the circles overlap by, None if either office has a boundary
+
+
+class OfficeCoverage(BaseModel):
+    """Schema for the number of historical check-ins inside an office geofence."""
+    
+    office_id: int
+    name: str
+    check_ins: int
+
+
+class CoverageCell(BaseModel):
+    """Schema for a grid cell with check-ins outside every office geofence."""
+    
+    latitude: float  # Center of the cell
+    longitude: float
+    check_ins: int
+
+
+class GeofenceCoverage(BaseModel):
+    """Schema for the overlap and coverage analysis of office geofences."""
+    
+    check_ins: int  # Office and other check-ins analyzed
+    uncovered_check_ins: int  # Check-ins outside every office geofence
+    cell_meters: float
+    overlaps: List[FenceOverlap]
+    offices: List[OfficeCoverage]  # Fewest check-ins first
+    unused_office_ids: List[int]  # Offices without any check-in inside their geofence
+    uncovered_cells: List[CoverageCell]  # Most check-ins first
+    analyzed_at: datetime
+
+
+# Check-in Search Schemas
+MAX_CHECK_IN_SEARCH_RESULTS = 5000
+
+
+class CheckInMatch(AttendanceRecord):
+    """Schema for a check-in found by a location search."""
+    
+    distance: Optional[float] = None  # Meters from the search center, for radius searches
+
+
+class CheckInSearch(BaseModel):
+    """Schema for the check-ins found by a location search."""
+    
+    check_ins: List[CheckInMatch]  # Latest first
+    key_ranges: int  # Spatial key ranges scanned
+    scanned: int  # Check-ins read from the database before the exact distance filter
+    truncated: bool  # More check-ins matched than were returned
+
+
+# Location Cluster Schemas
+class LocationCluster(BaseModel):
+    """Schema for a dense area of check-ins at other locations."""
+    
+    id: int
+    latitude: float  # Centroid of the check-ins
+    longitude: float
+    radius: float  # Meters from the centroid holding every check-in
+    check_ins: int
+    users: int  # Distinct users who checked in
+    first_check_in: datetime
+    last_check_in: datetime
+    nearest_office_id: Optional[int] = None
+    nearest_office_distance: Optional[float] = None  # Meters from the centroid to the office geofence
+    computed_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class LocationClusterRun(BaseModel):
+    """Schema for a clustering run."""
+    
+    id: int
+    status: str  # 'running', 'completed' or 'failed'
+    eps_meters: float
+    min_check_ins: int
+    since: Optional[datetime] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    check_ins: Optional[int] = None  # Other check-ins clustered
+    clustered_check_ins: Optional[int] = None  # Check-ins inside any cluster
+    clusters: Optional[int] = None
+    duration_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+# Profiling Schemas
+class ProfilingToken(BaseModel):
+    """Schema for a profiling token response."""
+    
+    profile_token: str
+    header: str
+    expires_in: int  # Seconds
+
+
+class ProfileSummary(BaseModel):
+    """Schema for a stored request profile without its stacks."""
+    
+    id: str
+    method: str
+    route: str
+    user_id: str
+    created_at: datetime
+    duration_ms: float
+    sample_interval_ms: float
+    samples: int
+    truncated: bool
+    
+    class Config:
+        orm_mode = True
@@ -0,0 +1,12 @@
+"""Load and latency benchmarks for the attendance API.
+
+Run from the backend directory:
+
+    python -m benchmarks run --output results.json
+    python -m benchmarks run --baseline benchmarks/baseline.json
+    python -m benchmarks generate --database-url postgresql://... --users 50000
+    python -m benchmarks coldstart --budget-ms 1500
+    python -m benchmarks distance
+
+See ``python -m benchmarks --help`` for all options.
+"""
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from dataclasses import asdict, fields
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from benchmarks.harness import compare_to_baseline, configure_environment, mock_ldap
+from benchmarks.scenarios import SCENARIOS, ScenarioConfig
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks for the attendance API.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run benchmark scenarios and report latency as JSON")
+    run.add_argument(
+        "--database-url",
+        help="SQLAlchemy URL of the benchmark database (default: a fresh SQLite file in a temp dir)",
+    )
+    run.add_argument(
+        "--reset", action="store_true",
+        help="Drop and recreate all tables first; required for a database that already has users",
+    )
+    run.add_argument(
+        "--scenario", action="append", choices=list(SCENARIOS),
+        help="Scenario to run; may be repeated (default: all)",
+    )
+    for config_field in fields(ScenarioConfig):
+        run.add_argument(
+            f"--{config_field.name.replace('_', '-')}", type=int, default=config_field.default,
+            help=f"(default: {config_field.default})",
+        )
+    run.add_argument("--output", help="Write results to this file instead of stdout")
+    run.add_argument("--baseline", help="Fail if results regress against this baseline file")
+    run.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="Allowed relative regression of timing metrics (default: 0.2)",
+    )
+    run.add_argument(
+        "--update-baseline", action="store_true", help="Overwrite the baseline file with these results",
+    )
+
+    generate = subparsers.add_parser(
+        "generate", help="Bulk-load a deterministic synthetic organisation into a database",
+    )
+    generate.add_argument(
+        "--database-url", required=True, help="SQLAlchemy URL of the target database",
+    )
+    generate.add_argument(
+        "--reset", action="store_true",
+        help="Drop and recreate all tables first; required for a database that already has users",
+    )
+    generate.add_argument("--users", type=int, default=10000, help="(default: 10000)")
+    generate.add_argument("--offices", type=int, default=50, help="(default: 50)")
+    generate.add_argument("--years", type=float, default=3.0, help="Years of history (default: 3)")
+    generate.add_argument("--seed", type=int, default=42, help="(default: 42)")
+    generate.add_argument(
+        "--end-date", type=date.fromisoformat, default=date.today(),
+        help="Last day of history, YYYY-MM-DD; pin it for reproducible output (default: today)",
+    )
+    generate.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Processes generating history in parallel; SQLite always uses one (default: CPU count)",
+    )
+    generate.add_argument("--batch-size", type=int, default=50000, help="Rows per batch (default: 50000)")
+    generate.add_argument(
+        "--keep-indexes", action="store_true",
+        help="Keep the history tables' secondary indexes during the load instead of rebuilding them after",
+    )
+
+    coldstart = subparsers.add_parser(
+        "coldstart", help="Fail if building the app in a fresh interpreter exceeds the budget",
+    )
+    coldstart.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (default: 5)")
+    coldstart.add_argument(
+        "--budget-ms", type=float, default=1500.0,
+        help="Maximum median time to import and build the app (default: 1500)",
+    )
+
+    distance = subparsers.add_parser(
+        "distance", help="Time the fast geofence distance path and the searches built on it",
+    )
+    distance.add_argument(
+        "--samples", type=int, default=400,
+        help="Queries, rectangles and check-ins per site of the search timings (default: 400)",
+    )
+    distance.add_argument("--points", type=int, default=200000, help="Points timed (default: 200000)")
+    distance.add_argument("--seed", type=int, default=42, help="(default: 42)")
+    return parser
+
+
+def _prepare_database(reset: bool) -> None:
+    """Create the schema, refusing to reuse a database that has data unless reset."""
+    from sqlalchemy import func, inspect, select
+
+    from app.db.base import Base, SessionLocal, get_engine
+    from app.models.models import User
+
+    engine = get_engine()
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    elif inspect(engine).has_table(User.__tablename__):
+        db = SessionLocal()
+        try:
+            if db.execute(select(func.count(User.id))).scalar():
+                raise SystemExit("Database already contains users; pass --reset to wipe it")
+        finally:
+            db.close()
+    Base.metadata.create_all(bind=engine)
+
+
+def run(args: argparse.Namespace) -> int:
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='hrms-bench-')}/bench.db"
+    configure_environment(database_url)
+    _prepare_database(args.reset)
+
+    from fastapi.testclient import TestClient
+
+    from app.db.base import get_engine
+    from app.main import create_app
+    from benchmarks.harness import BenchmarkClient, Recorder
+    from benchmarks.scenarios import seed
+
+    config = ScenarioConfig(**{f.name: getattr(args, f.name) for f in fields(ScenarioConfig)})
+    selected: List[str] = args.scenario or list(SCENARIOS)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": get_engine().dialect.name,
+            "config": asdict(config),
+        },
+        "scenarios": {},
+    }
+
+    with mock_ldap(), TestClient(create_app()) as test_client:
+        data = seed(config)
+        for name in selected:
+            recorder = Recorder()
+            started = time.perf_counter()
+            SCENARIOS[name](BenchmarkClient(test_client, recorder), data, config)
+            results["scenarios"][name] = {
+                "duration_s": round(time.perf_counter() - started, 3),
+                "operations": recorder.summary(),
+            }
+            print(f"{name}: done in {results['scenarios'][name]['duration_s']}s", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+    elif args.baseline:
+        return _gate(results, args.baseline, args.tolerance)
+    return 0
+
+
+def _gate(results: Dict[str, Any], baseline_path: str, tolerance: float) -> int:
+    """Compare results with a baseline file and report regressions."""
+    if not os.path.exists(baseline_path):
+        print(f"Baseline {baseline_path} not found; run with --update-baseline first", file=sys.stderr)
+        return 2
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if not regressions:
+        print("No regressions against baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def generate(args: argparse.Namespace) -> int:
+    from benchmarks.datagen import OrgConfig, generate as generate_org
+
+    configure_environment(args.database_url)
+    _prepare_database(args.reset)
+
+    config = OrgConfig(
+        users=args.users, offices=args.offices, years=args.years, seed=args.seed, end_date=args.end_date,
+    )
+    counts = generate_org(
+        args.database_url, config, workers=args.workers, batch_size=args.batch_size,
+        defer_indexes=not args.keep_indexes,
+    )
+    print(json.dumps(counts, indent=2))
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point of ``python -m benchmarks``."""
+    args = _parser().parse_args(argv)
+    if args.command == "run":
+        return run(args)
+    if args.command == "generate":
+        return generate(args)
+    if args.command == "coldstart":
+        from benchmarks.coldstart import check
+
+        return check(args.runs, args.budget_ms)
+    if args.command == "distance":
+        from benchmarks.distance import run as run_distance
+
+        print(json.dumps(run_distance(args.samples, args.points, args.seed), indent=2))
+        return 0
+    return 2
@@ -0,0 +1,91 @@
+"""Cold-start budget check for worker boot.
+
+Each run imports the application and builds it with create_app in a fresh
+interpreter, which is what a new worker process pays before serving its
+first request.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Modules whose import is deferred until first use
+DEFERRED_MODULES = ("ldap3", "jose", "httpx")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app.main import create_app
+create_app()
+elapsed = time.perf_counter() - started
+import app.db.base as db_base
+print(json.dumps({
+    "elapsed_ms": elapsed * 1000,
+    "engine_created": db_base._engine is not None,
+    "loaded_deferred": [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def measure(runs: int) -> List[Dict[str, Any]]:
+    """Boot the app in `runs` fresh interpreters.
+
+    Args:
+        runs: Number of interpreters to start
+
+    Returns:
+        One probe result per run
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    env.setdefault("LOG_LEVEL", "WARNING")
+
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE], cwd=backend_dir, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def check(runs: int, budget_ms: float) -> int:
+    """Measure cold start and enforce the budget.
+
+    The build must stay under the budget (median of all runs), must not
+    create the database engine and must not import the deferred modules.
+
+    Args:
+        runs: Number of interpreters to start
+        budget_ms: Maximum median cold-start time in milliseconds
+
+    Returns:
+        Process exit code: 0 if every check passed, 1 otherwise
+    """
+    results = measure(runs)
+    median_ms = statistics.median(result["elapsed_ms"] for result in results)
+    report = {
+        "runs": runs,
+        "median_ms": round(median_ms, 1),
+        "max_ms": round(max(result["elapsed_ms"] for result in results), 1),
+        "budget_ms": budget_ms,
+        "engine_created": any(result["engine_created"] for result in results),
+        "loaded_deferred": sorted({name for result in results for name in result["loaded_deferred"]}),
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if median_ms > budget_ms:
+        failures.append(f"median cold start {median_ms:.0f} ms exceeds budget of {budget_ms:.0f} ms")
+    if report["engine_created"]:
+        failures.append("building the app created the database engine")
+    if report["loaded_deferred"]:
+        failures.append(f"building the app imported {', '.join(report['loaded_deferred'])}")
+    for failure in failures:
+        print(f"FAILED {failure}", file=sys.stderr)
+    return 1 if failures else 0
@@ -0,0 +1,379 @@
+"""Deterministic synthetic organisation generator for realistic-scale databases.
+
+Every value is derived from the seed and the ID of the row's owner, so a
+worker process can regenerate any user's history on its own and the same
+arguments always produce the same database.
+"""
+
+import csv
+import io
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, create_engine, text
+from sqlalchemy.engine import Engine
+
+from app.core.spatial_key import spatial_key
+
+# (city, state, latitude, longitude, relative headcount)
+CITIES = [
+    ("Bengaluru", "Karnataka", 12.9716, 77.5946, 5),
+    ("Kolkata", "West Bengal", 22.5726, 88.3639, 4),
+    ("Mumbai", "Maharashtra", 19.0760, 72.8777, 4),
+    ("Delhi", "Delhi", 28.6139, 77.2090, 3),
+    ("Hyderabad", "Telangana", 17.3850, 78.4867, 3),
+    ("Pune", "Maharashtra", 18.5204, 73.8567, 2),
+    ("Chennai", "Tamil Nadu", 13.0827, 80.2707, 2),
+    ("Ahmedabad", "Gujarat", 23.0225, 72.5714, 1),
+]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 Chrome/124.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36",
+]
+
+METERS_PER_DEGREE = 111320.0
+
+
+@dataclass
+class OrgConfig:
+    """Shape of the generated organisation."""
+
+    users: int = 10000
+    offices: int = 50
+    years: float = 3.0
+    seed: int = 42
+    # Pin this for reproducible output; history ends the day before
+    end_date: date = field(default_factory=date.today)
+
+
+@dataclass
+class OfficeSpec:
+    id: int
+    city: int
+    latitude: float
+    longitude: float
+    radius: float
+
+
+@dataclass
+class UserProfile:
+    """Per-user habits that shape the generated history."""
+
+    id: int
+    office: OfficeSpec
+    homes: List[Tuple[int, float, float]]  # (address id, latitude, longitude)
+    home_rate: float
+    attendance_rate: float
+    shift_start_hours: float
+
+
+def _offset(rng: random.Random, latitude: float, longitude: float, sigma_meters: float) -> Tuple[float, float]:
+    """Move a point by a normally distributed distance in a random direction."""
+    north = rng.gauss(0.0, sigma_meters)
+    east = rng.gauss(0.0, sigma_meters)
+    return (
+        latitude + north / METERS_PER_DEGREE,
+        longitude + east / (METERS_PER_DEGREE * math.cos(math.radians(latitude))),
+    )
+
+
+def generate_offices(config: OrgConfig) -> List[OfficeSpec]:
+    """Scatter offices around the cities, more of them in larger cities."""
+    rng = random.Random(config.seed)
+    weights = [city[4] for city in CITIES]
+    offices = []
+    for office_id in range(1, config.offices + 1):
+        city = rng.choices(range(len(CITIES)), weights)[0]
+        # Business districts: most offices within ~5 km of the centre
+        latitude, longitude = _offset(rng, CITIES[city][2], CITIES[city][3], 5000)
+        radius = rng.choices((100.0, 150.0, 200.0, 300.0, 500.0), (3, 4, 3, 2, 1))[0]
+        offices.append(OfficeSpec(office_id, city, latitude, longitude, radius))
+    return offices
+
+
+def user_profile(config: OrgConfig, user_id: int, offices: Sequence[OfficeSpec]) -> UserProfile:
+    """Derive a user's office, homes and habits from the seed."""
+    rng = random.Random(config.seed * 1000003 + user_id)
+    # Larger offices attract more people: Zipf-like weights by office ID
+    office = rng.choices(offices, [1.0 / (i + 1) ** 0.8 for i in range(len(offices))])[0]
+
+    homes = []
+    if rng.random() < 0.9:
+        # Commutes of up to ~15 km around the office's city
+        latitude, longitude = _offset(rng, CITIES[office.city][2], CITIES[office.city][3], 8000)
+        homes.append((2 * user_id - 1, latitude, longitude))
+        if rng.random() < 0.2:
+            latitude, longitude = _offset(rng, latitude, longitude, 30000)
+            homes.append((2 * user_id, latitude, longitude))
+
+    return UserProfile(
+        id=user_id,
+        office=office,
+        homes=homes,
+        home_rate=rng.choice((0.0, 0.1, 0.2, 0.4, 0.6)) if homes else 0.0,
+        attendance_rate=rng.uniform(0.85, 0.97),
+        shift_start_hours=rng.gauss(9.25, 0.5) if rng.random() < 0.85 else rng.gauss(12.0, 1.5),
+    )
+
+
+def user_rows(config: OrgConfig, profile: UserProfile, username: str) -> Tuple[tuple, List[tuple]]:
+    """Build the user row and home address rows of a profile."""
+    rng = random.Random(config.seed * 1000003 + profile.id + 7)
+    start = datetime.combine(config.end_date - timedelta(days=int(config.years * 365)), datetime.min.time())
+    is_admin = rng.random() < 0.01
+    user = (
+        profile.id, f"{username}@example.com", username, "LDAP_AUTHENTICATED_USER",
+        f"User {profile.id}", rng.random() < 0.98, is_admin, False, start, start,
+    )
+
+    city, state = CITIES[profile.office.city][:2]
+    addresses = [
+        (
+            address_id, profile.id, "primary" if i == 0 else "secondary",
+            f"{rng.randint(1, 300)} Street {rng.randint(1, 99)}", city, state, "India",
+            f"{rng.randint(100000, 999999)}", latitude, longitude, True, start, start,
+        )
+        for i, (address_id, latitude, longitude) in enumerate(profile.homes)
+    ]
+    return user, addresses
+
+
+def history_rows(config: OrgConfig, profile: UserProfile) -> Iterator[Tuple[tuple, tuple]]:
+    """Yield (attendance row, login history row) pairs for every day worked."""
+    rng = random.Random(config.seed * 1000003 + profile.id + 13)
+    office = profile.office
+    day = config.end_date - timedelta(days=int(config.years * 365))
+    one_day = timedelta(days=1)
+
+    while day < config.end_date:
+        weekday = day.weekday()
+        attends = rng.random() < (profile.attendance_rate if weekday < 5 else 0.03)
+        if attends:
+            roll = rng.random()
+            if roll < 0.03:
+                location_type, office_id, home_id = "OTHER", None, None
+                latitude, longitude = _offset(rng, office.latitude, office.longitude, 20000)
+            elif roll < 0.03 + profile.home_rate and profile.homes:
+                home_id, home_latitude, home_longitude = profile.homes[0 if rng.random() < 0.9 else -1]
+                location_type, office_id = "HOME", None
+                latitude, longitude = _offset(rng, home_latitude, home_longitude, 15)
+            else:
+                location_type, office_id, home_id = "OFFICE", office.id, None
+                latitude, longitude = _offset(rng, office.latitude, office.longitude, office.radius / 3)
+
+            start_hours = min(max(rng.gauss(profile.shift_start_hours, 0.4), 5.0), 14.0)
+            check_in = datetime(day.year, day.month, day.day) + timedelta(hours=start_hours)
+            check_out = check_in + timedelta(hours=min(max(rng.gauss(8.5, 1.0), 1.0), 12.0))
+            login = check_in - timedelta(minutes=rng.uniform(0.5, 20.0))
+            # Some sessions are never logged out and just expire
+            logout = check_out + timedelta(minutes=rng.uniform(0.0, 5.0)) if rng.random() < 0.9 else None
+
+            yield (
+                (profile.id, office_id, home_id, location_type, check_in, check_out,
+                 latitude, longitude, latitude, longitude, spatial_key(latitude, longitude)),
+                (profile.id, f"{rng.getrandbits(128):032x}", login, logout,
+                 f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                 USER_AGENTS[rng.randrange(len(USER_AGENTS))]),
+            )
+        day += one_day
+
+
+USER_COLUMNS = ("id", "email", "username", "hashed_password", "full_name", "is_active", "is_admin",
+                "is_super_admin", "created_at", "updated_at")
+OFFICE_COLUMNS = ("id", "name", "address", "latitude", "longitude", "radius", "created_at", "updated_at")
+ADDRESS_COLUMNS = ("id", "user_id", "address_type", "address_line1", "city", "state", "country",
+                   "postal_code", "latitude", "longitude", "is_current", "created_at", "updated_at")
+ATTENDANCE_COLUMNS = ("user_id", "office_id", "home_address_id", "location_type", "check_in_time",
+                      "check_out_time", "check_in_latitude", "check_in_longitude", "check_out_latitude",
+                      "check_out_longitude", "check_in_cell")
+LOGIN_COLUMNS = ("user_id", "session_id", "login_time", "logout_time", "ip_address", "user_agent")
+
+
+class RowWriter:
+    """Bulk-load rows into one table through the fastest path of the backend.
+
+    PostgreSQL (psycopg2) gets COPY FROM STDIN in CSV format; every other
+    backend uses executemany through SQLAlchemy Core.
+    """
+
+    def __init__(self, engine: Engine, table: Table, columns: Sequence[str], batch_size: int):
+        self.engine = engine
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.use_copy = engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2"
+        self.rows: List[tuple] = []
+        self.written = 0
+
+    def add(self, row: tuple) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        if self.use_copy:
+            self._copy(self.rows)
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert(), [dict(zip(self.columns, row)) for row in self.rows])
+        self.written += len(self.rows)
+        self.rows = []
+
+    def _copy(self, rows: List[tuple]) -> None:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if value is None else ("true" if value is True else "false" if value is False else value)
+                             for value in row])
+        buffer.seek(0)
+
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.copy_expert(
+                f"COPY {self.table.name} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+            raw.commit()
+        finally:
+            raw.close()
+
+
+def _create_engine(database_url: str) -> Engine:
+    engine = create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "connect")
+        def _fast_sqlite(dbapi_connection, connection_record):
+            # Bulk load only: a crash mid-load leaves a database to regenerate anyway
+            dbapi_connection.execute("PRAGMA synchronous=OFF")
+            dbapi_connection.execute("PRAGMA journal_mode=MEMORY")
+    return engine
+
+
+def _load_history(task: Tuple[str, OrgConfig, int, int, int]) -> Tuple[int, int]:
+    """Generate and write the history of a range of users (runs in a worker)."""
+    from app.models.models import AttendanceRecord, UserLoginHistory
+
+    database_url, config, first_user, last_user, batch_size = task
+    engine = _create_engine(database_url)
+    offices = generate_offices(config)
+    attendance = RowWriter(engine, AttendanceRecord.__table__, ATTENDANCE_COLUMNS, batch_size)
+    logins = RowWriter(engine, UserLoginHistory.__table__, LOGIN_COLUMNS, batch_size)
+    try:
+        for user_id in range(first_user, last_user + 1):
+            profile = user_profile(config, user_id, offices)
+            for attendance_row, login_row in history_rows(config, profile):
+                attendance.add(attendance_row)
+                logins.add(login_row)
+        attendance.flush()
+        logins.flush()
+    finally:
+        engine.dispose()
+    return attendance.written, logins.written
+
+
+def generate(database_url: str, config: OrgConfig, workers: int = 1, batch_size: int = 50000,
+             defer_indexes: bool = True, progress: Optional[io.TextIOBase] = sys.stderr) -> dict:
+    """Load a synthetic organisation into an existing, empty schema.
+
+    Args:
+        database_url: SQLAlchemy URL of the target database
+        config: Shape of the organisation
+        workers: Processes generating history in parallel (SQLite always uses one)
+        batch_size: Rows per COPY or executemany batch
+        defer_indexes: Drop secondary indexes of the history tables during the load
+        progress: Stream for progress messages, or None
+
+    Returns:
+        Row counts per table and the elapsed time
+    """
+    from app.models.models import AttendanceRecord, Office, User, UserHomeAddress, UserLoginHistory
+
+    def report(message: str) -> None:
+        if progress is not None:
+            print(message, file=progress)
+
+    started = time.perf_counter()
+    engine = _create_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        workers = 1
+
+    offices = generate_offices(config)
+    now = datetime.now()
+    office_writer = RowWriter(engine, Office.__table__, OFFICE_COLUMNS, batch_size)
+    for office in offices:
+        name, state = CITIES[office.city][:2]
+        office_writer.add((office.id, f"{name} Office {office.id}", f"{office.id} Tech Park, {name}, {state}",
+                           office.latitude, office.longitude, office.radius, now, now))
+    office_writer.flush()
+
+    user_writer = RowWriter(engine, User.__table__, USER_COLUMNS, batch_size)
+    address_writer = RowWriter(engine, UserHomeAddress.__table__, ADDRESS_COLUMNS, batch_size)
+    for user_id in range(1, config.users + 1):
+        user, addresses = user_rows(config, user_profile(config, user_id, offices), f"user{user_id:08d}")
+        user_writer.add(user)
+        for address in addresses:
+            address_writer.add(address)
+    user_writer.flush()
+    address_writer.flush()
+    report(f"Loaded {len(offices)} offices, {user_writer.written} users and {address_writer.written} addresses")
+
+    history_tables = [AttendanceRecord.__table__, UserLoginHistory.__table__]
+    deferred = [index for table in history_tables for index in table.indexes] if defer_indexes else []
+    with engine.begin() as conn:
+        for index in deferred:
+            index.drop(conn, checkfirst=True)
+
+    # Contiguous user ranges keep each worker's rows clustered by user
+    chunk = max(math.ceil(config.users / (workers * 4)), 1)
+    tasks = [(database_url, config, first, min(first + chunk - 1, config.users), batch_size)
+             for first in range(1, config.users + 1, chunk)]
+    attendance_rows = login_rows = 0
+    if workers > 1:
+        with get_context("spawn").Pool(workers) as pool:
+            results = pool.imap_unordered(_load_history, tasks)
+            for done, (attendance, logins) in enumerate(results, 1):
+                attendance_rows += attendance
+                login_rows += logins
+                report(f"History {done}/{len(tasks)}: {attendance_rows + login_rows} rows "
+                       f"({(attendance_rows + login_rows) / (time.perf_counter() - started):.0f} rows/s)")
+    else:
+        for done, task in enumerate(tasks, 1):
+            attendance, logins = _load_history(task)
+            attendance_rows += attendance
+            login_rows += logins
+            report(f"History {done}/{len(tasks)}: {attendance_rows + login_rows} rows "
+                   f"({(attendance_rows + login_rows) / (time.perf_counter() - started):.0f} rows/s)")
+
+    with engine.begin() as conn:
+        for index in deferred:
+            report(f"Creating index {index.name}")
+            index.create(conn)
+        if engine.dialect.name == "postgresql":
+            # IDs were supplied explicitly, so move the sequences past them
+            for table in (Office.__table__, User.__table__, UserHomeAddress.__table__):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+                ))
+    engine.dispose()
+
+    return {
+        "offices": len(offices),
+        "users": user_writer.written,
+        "home_addresses": address_writer.written,
+        "attendance_records": attendance_rows,
+        "login_history": login_rows,
+        "elapsed_s": round(time.perf_counter() - started, 1),
+    }
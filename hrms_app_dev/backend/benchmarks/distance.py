@@ -0,0 +1,267 @@
+"""Timing of the geofence distance evaluation and the searches built on it.
+
+The fast path is timed against the plain haversine test on a typical
+workload of points around small fences, and the nearest fence search,
+spatial key ranges and check-in clustering are timed on synthetic data.
+Their accuracy is checked by the tests under tests/.
+"""
+
+import math
+import random
+import time
+from typing import Any, Dict, Tuple
+
+# Fences in the speed measurement
+OFFICES = 300
+
+
+def destination(lat: float, lon: float, bearing: float, distance: float) -> Tuple[float, float]:
+    """Get the point at a great circle distance and bearing from a start point.
+
+    Args:
+        lat: Latitude of the start point
+        lon: Longitude of the start point
+        bearing: Initial bearing in radians, clockwise from north
+        distance: Distance in meters
+
+    Returns:
+        Latitude and longitude of the destination, longitude in [-180, 180)
+    """
+    from app.core.geofence_index import EARTH_RADIUS_METERS
+
+    angle = distance / EARTH_RADIUS_METERS
+    lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+    dest_lat = math.asin(
+        math.sin(lat_rad) * math.cos(angle) + math.cos(lat_rad) * math.sin(angle) * math.cos(bearing)
+    )
+    dest_lon = lon_rad + math.atan2(
+        math.sin(bearing) * math.sin(angle) * math.cos(lat_rad),
+        math.cos(angle) - math.sin(lat_rad) * math.sin(dest_lat),
+    )
+    return math.degrees(dest_lat), (math.degrees(dest_lon) + 180) % 360 - 180
+
+
+def time_nearest(samples: int, seed: int) -> Dict[str, Any]:
+    """Time best-first nearest fence searches against a full sort.
+
+    Fences are spread over the globe, with a cluster on the antimeridian and
+    some polygons, and queried with several k and distance limits.
+
+    Args:
+        samples: Number of queries
+        seed: Random seed
+
+    Returns:
+        Number of queries and fences, and the time per query of both methods
+    """
+    from app.core.geofence_index import GeofenceIndex, build_index
+
+    rng = random.Random(seed)
+    fences = []
+    for i in range(OFFICES * 10):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-180, 180)
+        rings = None
+        if i % 50 == 0:
+            size = 0.002
+            rings = [[(lat - size, lon - size), (lat + size, lon - size), (lat + size, lon + size), (lat - size, lon + size)]]
+        fences.append((i + 1, "", lat, lon, rng.uniform(50, 2000), rings))
+    for i in range(OFFICES // 2):
+        lon = rng.choice((179.99, -179.99)) + rng.uniform(-0.01, 0.01)
+        fences.append((len(fences) + 1, "", rng.uniform(-1, 1), lon, 100.0, None))
+    index = GeofenceIndex(build_index(fences, (0, 0, 0), 0.01))
+    # Build the search tree outside the timing
+    index.nearest(0.0, 0.0, 1)
+
+    nearest_seconds = sort_seconds = 0.0
+    for i in range(samples):
+        if i % 3 == 0:
+            lat, lon = rng.uniform(-1, 1), rng.choice((179.995, -179.995))
+        else:
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        k = rng.choice((1, 5, 20))
+        max_distance = rng.choice((None, 1e5, 5e5))
+
+        started = time.perf_counter()
+        index.nearest(lat, lon, k, max_distance)
+        nearest_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        sorted(index.check(position, lat, lon)[1] for position in range(len(index)))
+        sort_seconds += time.perf_counter() - started
+
+    return {
+        "queries": samples,
+        "fences": len(index),
+        "nearest_ms": round(nearest_seconds / samples * 1e3, 3),
+        "full_sort_ms": round(sort_seconds / samples * 1e3, 3),
+    }
+
+
+def time_key_ranges(samples: int, seed: int) -> Dict[str, Any]:
+    """Time spatial key ranges of check-in searches and measure their excess.
+
+    Rectangles from a few meters to several degrees wide are placed over
+    the globe. How many keys the ranges hold beyond the rectangle is
+    reported, since those are rows a search reads and then filters out.
+
+    Args:
+        samples: Number of rectangles
+        seed: Random seed
+
+    Returns:
+        Number of rectangles, the ranges per rectangle, their excess keys
+        and the time to compute them
+    """
+    from app.core.spatial_key import KEY_BITS, key_ranges
+
+    rng = random.Random(seed)
+    ranges_total = 0
+    excess = []
+    seconds = 0.0
+    for _ in range(samples):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-179, 179)
+        size = rng.choice((1e-4, 2e-3, 2e-2, 0.5, 5.0))
+        bounds = (
+            lat - size * rng.random(), lat + size * rng.random(), lon - size * rng.random(), lon + size * rng.random()
+        )
+
+        started = time.perf_counter()
+        ranges = key_ranges(*bounds)
+        seconds += time.perf_counter() - started
+        ranges_total += len(ranges)
+
+        cells = (
+            ((bounds[1] - bounds[0]) / 180 * 2 ** KEY_BITS + 1)
+            * ((bounds[3] - bounds[2]) / 360 * 2 ** KEY_BITS + 1)
+        )
+        excess.append(sum(last - first + 1 for first, last in ranges) / cells)
+
+    excess.sort()
+    return {
+        "rectangles": samples,
+        "mean_ranges": round(ranges_total / samples, 2),
+        "median_keys_per_cell": round(excess[len(excess) // 2], 2),
+        "p90_keys_per_cell": round(excess[int(len(excess) * 0.9)], 2),
+        "key_ranges_ms": round(seconds / samples * 1e3, 3),
+    }
+
+
+def time_clusters(samples: int, seed: int) -> Dict[str, Any]:
+    """Time check-in clustering over the grid.
+
+    Check-ins are spread around sites at mid latitudes, on the antimeridian
+    and next to both poles, plus scattered noise.
+
+    Args:
+        samples: Check-ins per site
+        seed: Random seed
+
+    Returns:
+        Counts of check-ins, cells and clusters, and the time per check-in
+        of aggregation and clustering
+    """
+    from datetime import datetime
+
+    from app.core.location_clusters import _Cell, _expand, _Grid, _neighbors
+
+    rng = random.Random(seed)
+    sites = ((51.5, -0.12), (10.0, 179.9999), (-10.0, -179.9995), (89.9995, 40.0), (-89.9998, 0.0), (60.0, 25.0))
+    points = []
+    for lat, lon in sites:
+        for _ in range(samples):
+            points.append(destination(lat, lon, rng.uniform(0, 360), abs(rng.gauss(0, 40))))
+    for _ in range(samples):
+        points.append((rng.uniform(-89, 89), rng.uniform(-180, 180)))
+
+    started = time.perf_counter()
+    grid = _Grid(100.0)
+    cells: Dict[Any, Any] = {}
+    now = datetime.now()
+    for lat, lon in points:
+        key = grid.key(lat, lon)
+        if key not in cells:
+            cells[key] = _Cell(now)
+        cells[key].add(0, now, lat, lon)
+    for cell in cells.values():
+        cell.finish()
+    clusters = _expand(cells, _neighbors(cells, grid), 20)
+    seconds = time.perf_counter() - started
+
+    return {
+        "check_ins": len(points),
+        "cells": len(cells),
+        "clusters": len(clusters),
+        "clustering_us_per_check_in": round(seconds / len(points) * 1e6, 2),
+    }
+
+
+def measure_speed(points: int, seed: int) -> Dict[str, Any]:
+    """Time the fast path against the plain haversine test.
+
+    The workload is points within 2 km of 300 m fences at mid latitudes,
+    like phones polling near offices. Loop and call overhead is measured
+    separately and subtracted.
+
+    Args:
+        points: Number of points to test
+        seed: Random seed
+
+    Returns:
+        Nanoseconds per test of each method and the speedups
+    """
+    from app.core.geofence import GeofenceService
+    from app.core.geofence_index import prepare_circle
+
+    rng = random.Random(seed)
+    radius = 300.0
+    # Prepared fences are cached, as for offices and home addresses
+    fences = [
+        prepare_circle(rng.uniform(-55, 55), rng.uniform(-180, 180), radius) for _ in range(OFFICES)
+    ]
+    workload = []
+    for _ in range(points):
+        fence = rng.choice(fences)
+        point_lat, point_lon = destination(
+            fence.latitude, fence.longitude, rng.uniform(0, 2 * math.pi), rng.uniform(0, 2000)
+        )
+        workload.append((point_lat, point_lon, fence))
+
+    def timed(test) -> float:
+        started = time.perf_counter()
+        for point_lat, point_lon, fence in workload:
+            test(point_lat, point_lon, fence)
+        return (time.perf_counter() - started) / points * 1e9
+
+    haversine = GeofenceService.haversine_distance
+    # Cost of the loop and the call itself, subtracted from every method
+    overhead = timed(lambda point_lat, point_lon, fence: None)
+    results = {
+        "haversine_ns": timed(
+            lambda point_lat, point_lon, fence:
+            haversine(point_lat, point_lon, fence.latitude, fence.longitude) <= radius
+        ) - overhead,
+        "contains_ns": timed(lambda point_lat, point_lon, fence: fence.contains(point_lat, point_lon)) - overhead,
+        "check_ns": timed(lambda point_lat, point_lon, fence: fence.check(point_lat, point_lon)) - overhead,
+    }
+    results = {name: round(value, 1) for name, value in results.items()}
+    results["contains_speedup"] = round(results["haversine_ns"] / results["contains_ns"], 2)
+    results["check_speedup"] = round(results["haversine_ns"] / results["check_ns"], 2)
+    return results
+
+
+def run(samples: int, points: int, seed: int) -> Dict[str, Any]:
+    """Run every timing.
+
+    Args:
+        samples: Queries, rectangles and check-ins per site of the search timings
+        points: Points in the speed measurement
+        seed: Random seed
+
+    Returns:
+        The results
+    """
+    return {
+        "speed": measure_speed(points, seed),
+        "nearest": time_nearest(samples, seed),
+        "spatial_keys": time_key_ranges(samples, seed),
+        "clusters": time_clusters(samples, seed),
+    }
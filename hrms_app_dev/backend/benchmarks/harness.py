@@ -0,0 +1,248 @@
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from unittest import mock
+
+# Parses the DB part of the Server-Timing header set by RequestContextMiddleware
+_SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def configure_environment(database_url: str) -> None:
+    """Point the application at the benchmark database before it is imported.
+
+    Settings are read once at import time, so this must run before anything
+    under `app` is imported.
+
+    Args:
+        database_url: SQLAlchemy URL of the benchmark database
+    """
+    os.environ["DATABASE_URL"] = database_url
+    # Sessions are closed explicitly by the sweep scenario
+    os.environ["AUTO_LOGOUT_ENABLED"] = "false"
+    # Every run starts from the same cold state, not from a previous run's snapshot
+    os.environ["WARM_SNAPSHOT_ENABLED"] = "false"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "1000")
+    os.environ["SERVER_TIMING_ENABLED"] = "true"
+
+
+@contextmanager
+def mock_ldap() -> Iterator[None]:
+    """Run LDAP authentication against ldap3's in-memory MOCK_SYNC strategy.
+
+    Every Connection created by app.core.ldap uses the mock strategy, so
+    logins never touch the network.
+    """
+    import ldap3
+    from ldap3 import MOCK_SYNC, Connection
+
+    def mock_connection(server, *args, **kwargs):
+        kwargs["client_strategy"] = MOCK_SYNC
+        return Connection(server, *args, **kwargs)
+
+    # app.core.ldap imports Connection from ldap3 on every login
+    with mock.patch.object(ldap3, "Connection", mock_connection):
+        yield
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass
+class OperationStats:
+    """Latencies and query counts recorded for one kind of operation."""
+
+    latencies: List[float] = field(default_factory=list)
+    queries: List[int] = field(default_factory=list)
+    errors: int = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the recorded operations.
+
+        Returns:
+            Count, error count, latency percentiles in milliseconds,
+            throughput and DB queries per operation
+        """
+        latencies = sorted(self.latencies)
+        elapsed = (self.finished or 0.0) - (self.started or 0.0)
+        count = len(latencies)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+            "throughput_per_s": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "db_queries_per_op": round(sum(self.queries) / len(self.queries), 2) if self.queries else None,
+        }
+
+
+class Recorder:
+    """Thread-safe collection of operation stats for one scenario."""
+
+    def __init__(self):
+        self.operations: Dict[str, OperationStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, operation: str, started: float, latency: float, ok: bool, queries: Optional[int] = None
+    ) -> None:
+        """Record one finished operation.
+
+        Args:
+            operation: Operation name, such as "check_in"
+            started: perf_counter value when the operation started
+            latency: Duration in seconds
+            ok: Whether the operation succeeded
+            queries: DB statements executed by the operation, if known
+        """
+        with self._lock:
+            stats = self.operations.setdefault(operation, OperationStats())
+            stats.latencies.append(latency)
+            if queries is not None:
+                stats.queries.append(queries)
+            if not ok:
+                stats.errors += 1
+            stats.started = started if stats.started is None else min(stats.started, started)
+            finished = started + latency
+            stats.finished = finished if stats.finished is None else max(stats.finished, finished)
+
+    @contextmanager
+    def measure(self, operation: str) -> Iterator[None]:
+        """Time a block that does not go through HTTP."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(operation, started, time.perf_counter() - started, ok)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.summary() for name, stats in self.operations.items()}
+
+
+class BenchmarkClient:
+    """HTTP client that records the latency and query count of every call.
+
+    Wraps Starlette's TestClient, which runs the ASGI app in-process, so the
+    numbers measure the application and database rather than a network.
+    """
+
+    def __init__(self, client, recorder: Recorder):
+        self.client = client
+        self.recorder = recorder
+
+    def request(
+        self, operation: str, method: str, url: str, token: Optional[str] = None, expected: Iterable[int] = (200,), **kwargs
+    ):
+        """Send a request and record it under an operation name.
+
+        Args:
+            operation: Operation name the request is recorded under
+            method: HTTP method
+            url: Request URL
+            token: Bearer token (optional)
+            expected: Status codes counted as success
+            **kwargs: Passed on to the underlying client
+
+        Returns:
+            The response
+        """
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        started = time.perf_counter()
+        response = self.client.request(method, url, headers=headers, **kwargs)
+        latency = time.perf_counter() - started
+
+        match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        self.recorder.record(
+            operation, started, latency, response.status_code in expected,
+            int(match.group(1)) if match else None,
+        )
+        return response
+
+    def login(self, username: str, password: str = "benchmark") -> str:
+        """Log in through the API and return the access token."""
+        response = self.request(
+            "login", "POST", "/api/v1/auth/login", data={"username": username, "password": password}
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+
+def run_concurrently(func: Callable[[Any], Any], items: Iterable[Any], concurrency: int) -> List[Any]:
+    """Call a function for every item using a pool of threads.
+
+    Args:
+        func: Function to call
+        items: Arguments, one call per item
+        concurrency: Number of threads
+
+    Returns:
+        Results in item order
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(func, items))
+
+
+# Metrics compared against the baseline, with the direction that counts as worse
+GATED_METRICS = {
+    "p95_ms": "higher",
+    "p99_ms": "higher",
+    "throughput_per_s": "lower",
+    "db_queries_per_op": "higher",
+}
+
+
+def compare_to_baseline(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Find metrics that regressed beyond the tolerance.
+
+    Query counts are compared exactly since they do not depend on the machine.
+
+    Args:
+        results: Benchmark results
+        baseline: Stored baseline results in the same format
+        tolerance: Allowed relative change for timing metrics, e.g. 0.2 for 20%
+
+    Returns:
+        One message per regression
+    """
+    regressions = []
+    for scenario, scenario_baseline in baseline.get("scenarios", {}).items():
+        current = results.get("scenarios", {}).get(scenario)
+        if current is None:
+            continue
+        for operation, expected in scenario_baseline.get("operations", {}).items():
+            actual = current["operations"].get(operation)
+            if actual is None:
+                regressions.append(f"{scenario}/{operation}: missing from results")
+                continue
+            for metric, worse in GATED_METRICS.items():
+                before, after = expected.get(metric), actual.get(metric)
+                if before is None or after is None:
+                    continue
+                allowed = 0.0 if metric == "db_queries_per_op" else tolerance
+                if worse == "higher" and after > before * (1 + allowed):
+                    regressions.append(f"{scenario}/{operation}: {metric} {before} -> {after}")
+                elif worse == "lower" and after < before * (1 - allowed):
+                    regressions.append(f"{scenario}/{operation}: {metric} {before} -> {after}")
+    return regressions
@@ -0,0 +1,246 @@
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import insert, select
+
+from benchmarks.harness import BenchmarkClient, Recorder, run_concurrently
+
+# Rough city-centre coordinates the synthetic offices are scattered around
+CITY_CENTRE = (22.5726, 88.3639)
+
+
+@dataclass
+class ScenarioConfig:
+    """Sizes of the benchmark scenarios."""
+
+    seed: int = 42
+    users: int = 500
+    offices: int = 20
+    concurrency: int = 8
+    polls_per_user: int = 5
+    dashboard_refreshes: int = 200
+    history_records: int = 2000
+    history_page_size: int = 50
+    open_sessions: int = 100000
+
+
+@dataclass
+class BenchmarkData:
+    """Rows seeded before the scenarios run."""
+
+    usernames: List[str]
+    offices: List[Tuple[int, float, float]]  # (id, latitude, longitude)
+
+
+def _chunks(rows: List[dict], size: int = 10000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed(config: ScenarioConfig) -> BenchmarkData:
+    """Bulk-insert users and offices.
+
+    Users are created ahead of time so the check-in storm measures logins of
+    existing accounts rather than first-login provisioning.
+
+    Args:
+        config: Scenario sizes
+
+    Returns:
+        The seeded usernames and offices
+    """
+    from app.db.base import SessionLocal
+    from app.models.models import Office, User
+
+    rng = random.Random(config.seed)
+    usernames = [f"bench{i:06d}" for i in range(config.users)]
+    now = datetime.now()
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {
+                "email": f"{username}@example.com",
+                "username": username,
+                "hashed_password": "LDAP_AUTHENTICATED_USER",
+                "full_name": username,
+                "is_active": True,
+                "is_admin": False,
+                "is_super_admin": False,
+                "created_at": now,
+            }
+            for username in usernames
+        ])
+        db.execute(insert(Office), [
+            {
+                "name": f"Office {i}",
+                "address": f"{i} Benchmark Street",
+                "latitude": CITY_CENTRE[0] + rng.uniform(-0.2, 0.2),
+                "longitude": CITY_CENTRE[1] + rng.uniform(-0.2, 0.2),
+                "radius": rng.choice((100.0, 150.0, 200.0, 300.0)),
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(config.offices)
+        ])
+        db.commit()
+        offices = [tuple(row) for row in db.execute(
+            select(Office.id, Office.latitude, Office.longitude).order_by(Office.id)
+        )]
+    finally:
+        db.close()
+
+    return BenchmarkData(usernames=usernames, offices=offices)
+
+
+def check_in_storm(client: BenchmarkClient, data: BenchmarkData, config: ScenarioConfig) -> None:
+    """Every user logs in and checks in at an office within a short window."""
+    rng = random.Random(config.seed)
+    assignments = [(username, rng.choice(data.offices)) for username in data.usernames]
+
+    def arrive(assignment):
+        username, (office_id, latitude, longitude) = assignment
+        token = client.login(username)
+        client.request(
+            "check_in", "POST", "/api/v1/attendance/check-in", token,
+            json={
+                "location_type": "office",
+                "office_id": office_id,
+                "latitude": latitude,
+                "longitude": longitude,
+            },
+        )
+
+    run_concurrently(arrive, assignments, config.concurrency)
+
+
+def check_location_polling(client: BenchmarkClient, data: BenchmarkData, config: ScenarioConfig) -> None:
+    """Clients poll check-location while users walk towards their office."""
+    rng = random.Random(config.seed + 1)
+    users = data.usernames[: max(len(data.usernames) // 10, 1)]
+    tokens = run_concurrently(client.login, users, config.concurrency)
+
+    polls = []
+    for token in tokens:
+        _, latitude, longitude = rng.choice(data.offices)
+        for step in range(config.polls_per_user):
+            # Approach the office from about 1 km away
+            offset = 0.01 * (1 - step / max(config.polls_per_user - 1, 1))
+            polls.append((token, latitude + offset, longitude))
+
+    run_concurrently(
+        lambda poll: client.request(
+            "check_location", "POST", "/api/v1/attendance/check-location", poll[0],
+            json={"latitude": poll[1], "longitude": poll[2]},
+        ),
+        polls,
+        config.concurrency,
+    )
+
+
+def dashboard_refresh(client: BenchmarkClient, data: BenchmarkData, config: ScenarioConfig) -> None:
+    """Admins keep the dashboard open and refresh its stats."""
+    token = client.login(
+        os.getenv("SUPER_ADMIN_USERNAME", "superadmin"), os.getenv("SUPER_ADMIN_PASSWORD", "superadmin123")
+    )
+    run_concurrently(
+        lambda _: client.request("dashboard_stats", "GET", "/api/v1/admin/dashboard-stats", token),
+        range(config.dashboard_refreshes),
+        config.concurrency,
+    )
+
+
+def history_paging(client: BenchmarkClient, data: BenchmarkData, config: ScenarioConfig) -> None:
+    """A long-tenured user pages through their full attendance history."""
+    from app.db.base import SessionLocal
+    from app.models.models import AttendanceRecord, LocationType, User
+
+    username = data.usernames[-1]
+    office_id, latitude, longitude = data.offices[0]
+    start = datetime.now() - timedelta(days=config.history_records + 1)
+
+    db = SessionLocal()
+    try:
+        user_id = db.execute(select(User.id).where(User.username == username)).scalar_one()
+        rows = []
+        for day in range(config.history_records):
+            check_in = start + timedelta(days=day, hours=9)
+            rows.append({
+                "user_id": user_id,
+                "office_id": office_id,
+                "location_type": LocationType.OFFICE,
+                "check_in_time": check_in,
+                "check_out_time": check_in + timedelta(hours=8),
+                "check_in_latitude": latitude,
+                "check_in_longitude": longitude,
+                "check_out_latitude": latitude,
+                "check_out_longitude": longitude,
+            })
+        for chunk in _chunks(rows):
+            db.execute(insert(AttendanceRecord), chunk)
+        db.commit()
+    finally:
+        db.close()
+
+    token = client.login(username)
+    pages = range(0, config.history_records, config.history_page_size)
+    run_concurrently(
+        lambda skip: client.request(
+            "history_page", "GET",
+            f"/api/v1/attendance/history?skip={skip}&limit={config.history_page_size}", token,
+        ),
+        pages,
+        config.concurrency,
+    )
+
+
+def auto_logout_sweep(client: BenchmarkClient, data: BenchmarkData, config: ScenarioConfig) -> None:
+    """Close a large backlog of overdue open sessions in one sweep.
+
+    Runs the same code path as the auto-logout endpoint directly, since the
+    interesting cost is the sweep itself and not the HTTP round trip.
+    """
+    from app.core.scheduler import SessionExpiryScheduler
+    from app.db.base import SessionLocal
+    from app.models.models import AttendanceRecord, LocationType, User
+
+    db = SessionLocal()
+    try:
+        user_ids = db.execute(select(User.id)).scalars().all()
+        office_id, latitude, longitude = data.offices[0]
+        check_in = datetime.now() - timedelta(days=1)
+        rows = [
+            {
+                "user_id": user_ids[i % len(user_ids)],
+                "office_id": office_id,
+                "location_type": LocationType.OFFICE,
+                "check_in_time": check_in,
+                "check_in_latitude": latitude,
+                "check_in_longitude": longitude,
+            }
+            for i in range(config.open_sessions)
+        ]
+        for chunk in _chunks(rows):
+            db.execute(insert(AttendanceRecord), chunk)
+        db.commit()
+
+        recorder: Recorder = client.recorder
+        with recorder.measure("sweep"):
+            closed = SessionExpiryScheduler.close_overdue(db)
+        if len(closed) < config.open_sessions:
+            raise RuntimeError(f"Sweep closed {len(closed)} of {config.open_sessions} sessions")
+    finally:
+        db.close()
+
+
+# Scenarios in the order they run; later ones may rely on rows created earlier
+SCENARIOS: Dict[str, Callable[[BenchmarkClient, BenchmarkData, ScenarioConfig], None]] = {
+    "check_in_storm": check_in_storm,
+    "check_location_polling": check_location_polling,
+    "dashboard_refresh": dashboard_refresh,
+    "history_paging": history_paging,
+    "auto_logout_sweep": auto_logout_sweep,
+}
@@ -0,0 +1,38 @@
+"""Gunicorn configuration for multi-worker deployments.
+
+Run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py
+
+The application is built once in the master, which then warms shared
+read-only state (see app.core.prefork) before forking the workers, so each
+worker starts hot and shares that memory copy-on-write. Background services
+(login audit, revocation sync, auto-logout) still start in each worker.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "app.main:create_app()"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8051")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+preload_app = True
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+# Restart workers periodically; they are forked from the warm master again
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+
+
+def when_ready(server):
+    """Warm shared state in the master once the app is loaded."""
+    from app.core.prefork import warm_master
+
+    warm_master()
+
+
+def post_fork(server, worker):
+    """Reset per-process resources in each new worker."""
+    from app.core.prefork import after_fork
+
+    after_fork()
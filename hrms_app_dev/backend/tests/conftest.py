@@ -0,0 +1,66 @@
+"""Fixtures running the application against a throwaway, migrated SQLite database."""
+
+import os
+import tempfile
+
+import pytest
+
+# Settings are read when app.config is first imported, so point every piece of
+# local state at a fresh directory before any test module imports the app
+_STATE_DIR = tempfile.mkdtemp(prefix="hrms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_STATE_DIR, 'hrms.db')}"
+os.environ["GEOFENCE_INDEX_PATH"] = os.path.join(_STATE_DIR, "geofence.idx")
+os.environ["WARM_SNAPSHOT_PATH"] = os.path.join(_STATE_DIR, "warm.snapshot")
+os.environ["WARM_SNAPSHOT_ENABLED"] = "false"
+os.environ["AUTO_LOGOUT_ENABLED"] = "false"
+# Login history is written before the login response, so tests can read it back
+os.environ["LOGIN_AUDIT_MODE"] = "sync"
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Migrate the test database to the latest revision."""
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic.ini")), "head")
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    """Client of the running application, started once for the session."""
+    from fastapi.testclient import TestClient
+
+    from app.main import create_app
+
+    with TestClient(create_app()) as client:
+        yield client
+
+
+@pytest.fixture
+def db(database):
+    """Database session, closed after the test."""
+    from app.db.base import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def login(client):
+    """Log in as a user, created on first login, and get the headers of their requests."""
+    def login(username: str) -> dict:
+        response = client.post("/api/v1/auth/login", data={"username": username, "password": "secret"})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return login
+
+
+@pytest.fixture
+def admin_headers(login):
+    """Headers of the super admin created at startup."""
+    return login("superadmin")
@@ -0,0 +1,28 @@
+import math
+from typing import Tuple
+
+from app.core.geofence_index import EARTH_RADIUS_METERS
+
+
+def destination(lat: float, lon: float, bearing: float, distance: float) -> Tuple[float, float]:
+    """Get the point at a great circle distance and bearing from a start point.
+
+    Args:
+        lat: Latitude of the start point
+        lon: Longitude of the start point
+        bearing: Initial bearing in radians, clockwise from north
+        distance: Distance in meters
+
+    Returns:
+        Latitude and longitude of the destination, longitude in [-180, 180)
+    """
+    angle = distance / EARTH_RADIUS_METERS
+    lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+    dest_lat = math.asin(
+        math.sin(lat_rad) * math.cos(angle) + math.cos(lat_rad) * math.sin(angle) * math.cos(bearing)
+    )
+    dest_lon = lon_rad + math.atan2(
+        math.sin(bearing) * math.sin(angle) * math.cos(lat_rad),
+        math.cos(angle) - math.sin(lat_rad) * math.sin(dest_lat),
+    )
+    return math.degrees(dest_lat), (math.degrees(dest_lon) + 180) % 360 - 180
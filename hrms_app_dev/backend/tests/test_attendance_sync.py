@@ -0,0 +1,89 @@
+"""Idempotent check-ins and check-outs, and the offline /attendance/sync endpoint."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+CHECK_IN = {"location_type": "other", "latitude": 1.0, "longitude": 2.0}
+CHECK_OUT = {"latitude": 1.0, "longitude": 2.0}
+
+
+@pytest.fixture
+def headers(login):
+    return login(f"sync-{uuid.uuid4().hex[:8]}")
+
+
+def _event(event_type: str, key: str, age: timedelta) -> dict:
+    event = {
+        "event_type": event_type,
+        "idempotency_key": key,
+        "timestamp": (datetime.now() - age).isoformat(),
+        "latitude": 1.0,
+        "longitude": 2.0,
+    }
+    if event_type == "check_in":
+        event["location_type"] = "other"
+    return event
+
+
+def test_retried_check_in_returns_the_original_record(client, headers):
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    first = client.post("/api/v1/attendance/check-in", json=CHECK_IN, headers={**headers, **key})
+    retry = client.post("/api/v1/attendance/check-in", json=CHECK_IN, headers={**headers, **key})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+
+    # Without the key, a second check-in is refused because the first is still open
+    assert client.post("/api/v1/attendance/check-in", json=CHECK_IN, headers=headers).status_code == 400
+
+
+def test_key_of_another_operation_is_refused(client, headers):
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    assert client.post("/api/v1/attendance/check-in", json=CHECK_IN, headers={**headers, **key}).status_code == 200
+    response = client.post("/api/v1/attendance/check-out", json=CHECK_OUT, headers={**headers, **key})
+    assert response.status_code == 422
+
+
+def test_sync_applies_events_in_timestamp_order(client, headers):
+    # Sent newest first, the check-out must still be applied after its check-in
+    events = [
+        _event("check_out", "out", timedelta(minutes=5)),
+        _event("check_in", "in", timedelta(minutes=50)),
+    ]
+    response = client.post("/api/v1/attendance/sync", json={"events": events}, headers=headers)
+    assert response.status_code == 200
+    results = response.json()
+    assert [(r["idempotency_key"], r["status"]) for r in results] == [("in", "applied"), ("out", "applied")]
+    assert results[0]["record"]["id"] == results[1]["record"]["id"]
+    assert results[1]["record"]["check_out_time"] is not None
+
+
+def test_resent_and_repeated_events_are_duplicates(client, headers):
+    events = [_event("check_in", "in", timedelta(minutes=30)), _event("check_out", "out", timedelta(minutes=10))]
+    first = client.post("/api/v1/attendance/sync", json={"events": events}, headers=headers).json()
+
+    # The whole queue again, with one event twice
+    resent = client.post("/api/v1/attendance/sync", json={"events": events + events[:1]}, headers=headers).json()
+    assert [r["status"] for r in resent] == ["duplicate", "duplicate", "duplicate"]
+    assert resent[0]["record"]["id"] == first[0]["record"]["id"]
+
+
+def test_sync_rejects_events_outside_the_window(client, headers):
+    events = [
+        _event("check_in", "old", timedelta(days=10)),
+        _event("check_in", "future", -timedelta(hours=1)),
+        _event("check_out", "unmatched", timedelta(minutes=1)),
+    ]
+    results = client.post("/api/v1/attendance/sync", json={"events": events}, headers=headers).json()
+    assert [r["status"] for r in results] == ["rejected", "rejected", "rejected"]
+    assert all(r["detail"] for r in results)
+
+
+def test_sync_refuses_too_many_events(client, headers):
+    from app.config import settings
+
+    events = [
+        _event("check_in", f"k{i}", timedelta(minutes=i)) for i in range(settings.ATTENDANCE_SYNC_MAX_EVENTS + 1)
+    ]
+    assert client.post("/api/v1/attendance/sync", json={"events": events}, headers=headers).status_code == 400
@@ -0,0 +1,16 @@
+"""Cold-start budget of a fresh worker building the app."""
+
+import pytest
+
+from benchmarks.coldstart import check
+
+pytestmark = pytest.mark.slow
+
+
+def test_app_builds_within_the_cold_start_budget():
+    # The same checks and default budget as `python -m benchmarks coldstart`
+    assert check(runs=3, budget_ms=1500.0) == 0
+
+
+def test_exceeding_the_budget_fails_the_check():
+    assert check(runs=1, budget_ms=0.0) == 1
@@ -0,0 +1,35 @@
+"""Checking a location against every office and the user's home addresses."""
+
+import uuid
+
+from app.core.geofence import GeofenceService
+from app.core.geofence_index import office_geofences
+from app.core.principals import HomeFence
+from app.models.models import LocationType, Office
+from tests.geodesy import destination
+
+SITE = (40.0, -100.0)
+
+
+def test_homes_and_offices_are_sorted_together(db):
+    lat, lon = destination(*SITE, 0.0, 1000.0)
+    office = Office(name=f"office-{uuid.uuid4().hex[:8]}", address="x", latitude=lat, longitude=lon, radius=100.0)
+    db.add(office)
+    db.commit()
+    office_geofences.load(db)
+
+    near_home = HomeFence(1, "primary", *destination(*SITE, 1.0, 200.0), 100.0, True)
+    far_home = HomeFence(2, "secondary", *destination(*SITE, 2.0, 5000.0), 100.0, True)
+    former_home = HomeFence(3, "secondary", *SITE, 100.0, False)
+    results = GeofenceService.check_all_geofences(db, *SITE, [far_home, near_home, former_home], k=1)
+
+    assert [(status.location_type, status.office_id, status.home_address_id) for status in results] == [
+        (LocationType.HOME, None, 1), (LocationType.OFFICE, office.id, None), (LocationType.HOME, None, 2),
+    ]
+    assert [status.distance for status in results] == sorted(status.distance for status in results)
+
+
+def test_distant_homes_are_left_out_with_a_maximum_distance(db):
+    far_home = HomeFence(1, "primary", *destination(*SITE, 0.5, 5000.0), 100.0, True)
+    results = GeofenceService.check_all_geofences(db, *SITE, [far_home], max_distance=2000.0)
+    assert all(status.location_type == LocationType.OFFICE for status in results)
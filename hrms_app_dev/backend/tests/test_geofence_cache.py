@@ -0,0 +1,76 @@
+"""Decisions cached per grid cell against direct checks of the same points."""
+
+import math
+import random
+
+import pytest
+
+from app.core.geofence_cache import GeofenceDecisionCache
+from app.core.geofence_index import DISTANCE_TOLERANCE_METERS, GeofenceIndex, build_index
+from tests.geodesy import destination
+
+LATITUDES = (0.0, 30.0, 51.5, 60.0, 70.0, 80.0, 85.0, 89.0, 89.9, -45.0)
+RADII = (50.0, 100.0, 300.0, 500.0, 2000.0)
+
+
+@pytest.fixture(scope="module")
+def fences():
+    rng = random.Random(42)
+    fences = []
+    for lat in LATITUDES:
+        for radius in RADII:
+            fences.append((len(fences) + 1, "", lat, rng.uniform(-180, 180), radius, None))
+    # A square boundary with a square hole, 200 m and 100 m across
+    side, hole = 200 / 111195, 100 / 111195
+    fences.append((len(fences) + 1, "", 51.5, 0.0, 150.0, [
+        [(51.5, 0.0), (51.5 + side, 0.0), (51.5 + side, side), (51.5, side)],
+        [(51.5 + hole / 2, hole / 2), (51.5 + hole * 1.5, hole / 2), (51.5 + hole * 1.5, hole * 1.5),
+         (51.5 + hole / 2, hole * 1.5)],
+    ]))
+    return fences
+
+
+@pytest.fixture
+def cache():
+    return GeofenceDecisionCache(cell_meters=5.0, ttl_seconds=600.0, max_size=100000)
+
+
+def _clustered_points(rng: random.Random, fences, clusters: int):
+    """Yield points in tight clusters around fence edges, so cells are hit several times and many are ambiguous."""
+    for _ in range(clusters):
+        _, _, lat, lon, radius, _ = rng.choice(fences)
+        center_lat, center_lon = destination(lat, lon, rng.uniform(0, 2 * math.pi), radius + rng.uniform(-20, 20))
+        for _ in range(10):
+            yield destination(center_lat, center_lon, rng.uniform(0, 2 * math.pi), rng.uniform(0, 5))
+
+
+def test_cached_decisions_match_direct_checks(fences, cache):
+    index = GeofenceIndex(build_index(fences, (0, 0, 0), 0.01))
+    rng = random.Random(1)
+    for point_lat, point_lon in _clustered_points(rng, fences, 300):
+        for position, (inside, distance) in enumerate(cache.check(index, point_lat, point_lon)):
+            exact_inside, exact_distance = index.check(position, point_lat, point_lon)
+            # Distances of decided fences come from the cell center; planar distances to far
+            # polygons also move with the latitude they are projected at
+            tolerance = cache.cell_meters * 1.01 + 1e-6 * exact_distance
+            assert inside == exact_inside, (fences[position][:5], point_lat, point_lon)
+            assert abs(distance - exact_distance) <= tolerance, (fences[position][:5], point_lat, point_lon)
+
+
+
+def test_disabled_cache_checks_directly(fences):
+    index = GeofenceIndex(build_index(fences, (0, 0, 0), 0.01))
+    cache = GeofenceDecisionCache(cell_meters=0.0)
+    _, _, lat, lon, _, _ = fences[0]
+    assert cache.check(index, lat, lon) == [index.check(position, lat, lon) for position in range(len(index))]
+    assert not cache._cells
+
+
+def test_new_index_generation_drops_cached_cells(cache):
+    before = GeofenceIndex(build_index([(1, "", 10.0, 20.0, 100.0, None)], (0, 0, 0), 0.01))
+    assert cache.check(before, 10.0, 20.0)[0][0]
+
+    # The office moved away; the cell was decided against the previous generation
+    after = GeofenceIndex(build_index([(1, "", 11.0, 20.0, 100.0, None)], (0, 0, 0), 0.01))
+    assert after.generation != before.generation
+    assert not cache.check(after, 10.0, 20.0)[0][0]
@@ -0,0 +1,79 @@
+"""Accuracy of the tiered geofence distance evaluation and the geofence index.
+
+Points are generated at exact great circle distances and bearings from
+fence centers, including centers near the poles and on both sides of the
+antimeridian, and every result of the fast path is compared with the exact
+haversine distance.
+"""
+
+import math
+import random
+
+import pytest
+
+from app.core.geofence_index import DISTANCE_TOLERANCE_METERS, CircleFence, GeofenceIndex, build_index
+from tests.geodesy import destination
+
+# Latitudes of the fence centers
+LATITUDES = (0.0, 30.0, 51.5, 60.0, 70.0, 80.0, 85.0, 89.0, 89.9, -45.0, -89.9)
+# Longitudes of the fence centers, including both sides of the antimeridian
+LONGITUDES = (0.0, 77.2, 179.9995, -179.9995, 180.0)
+RADII = (50.0, 100.0, 300.0, 500.0, 2000.0)
+# Points per fence center and radius
+SAMPLES = 100
+
+
+def _points(rng: random.Random, lat: float, lon: float, radius: float):
+    """Yield points around a fence with their exact distances, half of them close to the edge."""
+    for i in range(SAMPLES):
+        if i % 2:
+            distance = radius * (1 + rng.choice((-1, 1)) * 10 ** rng.uniform(-12, -1))
+        else:
+            distance = rng.uniform(0, 3 * radius)
+        point_lat, point_lon = destination(lat, lon, rng.uniform(0, 2 * math.pi), distance)
+        yield point_lat, point_lon, distance
+
+
+@pytest.mark.parametrize("lat", LATITUDES)
+def test_planar_error_bound_holds(lat):
+    rng = random.Random(lat)
+    for lon in LONGITUDES:
+        for radius in RADII:
+            fence = CircleFence(lat, lon, radius)
+            for point_lat, point_lon, _ in _points(rng, lat, lon, radius):
+                exact = fence.haversine(point_lat, point_lon)
+                approximate, error = fence.approximate(point_lat, point_lon)
+                if math.isfinite(error):
+                    # Allow for float rounding of the exact distance itself
+                    assert abs(approximate - exact) - (1e-9 * exact + 1e-9) <= error, (lon, radius, point_lat, point_lon)
+
+
+@pytest.mark.parametrize("lat", LATITUDES)
+def test_contains_and_check_match_haversine(lat):
+    rng = random.Random(lat)
+    for lon in LONGITUDES:
+        for radius in RADII:
+            fence = CircleFence(lat, lon, radius)
+            for point_lat, point_lon, _ in _points(rng, lat, lon, radius):
+                exact = fence.haversine(point_lat, point_lon)
+                assert fence.contains(point_lat, point_lon) == (exact <= radius), (lon, radius, point_lat, point_lon)
+                inside, reported = fence.check(point_lat, point_lon)
+                assert inside == (exact <= radius), (lon, radius, point_lat, point_lon)
+                assert abs(reported - exact) <= DISTANCE_TOLERANCE_METERS, (lon, radius, point_lat, point_lon)
+
+
+def test_index_contains_matches_haversine():
+    rng = random.Random(42)
+    fences = []
+    for lat in LATITUDES:
+        for lon in LONGITUDES:
+            for radius in RADII:
+                fences.append((len(fences) + 1, "", lat, lon, radius, None))
+    index = GeofenceIndex(build_index(fences, (0, 0, 0), 0.01))
+    for position, (_, _, lat, lon, radius, _) in enumerate(fences):
+        fence = CircleFence(lat, lon, radius)
+        for _ in range(10):
+            point_lat, point_lon = destination(lat, lon, rng.uniform(0, 2 * math.pi), rng.uniform(0, 2 * radius))
+            exact = fence.haversine(point_lat, point_lon)
+            assert index.contains(position, point_lat, point_lon) == (exact <= radius), (lat, lon, radius)
+
@@ -0,0 +1,145 @@
+"""Per-request SQL timing, slow query logs and their query plans."""
+
+import re
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.db import instrumentation
+from app.db.instrumentation import _explain, instrument_engine, normalize_sql, parameter_shape
+
+
+class _Cursor:
+    """DBAPI cursor of a SQL Server connection, recording what it runs."""
+
+    def __init__(self, executed, fail_on=()):
+        self.executed = executed
+        self.fail_on = fail_on
+        self.description = None
+        self._results = []
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+        if statement in self.fail_on:
+            raise RuntimeError(f"cannot run {statement}")
+        if statement.startswith("SELECT"):
+            self._results = [[(statement,)], [("|--Clustered Index Scan",)]]
+            self.description = ("StmtText",)
+
+    def fetchall(self):
+        return self._results.pop(0)
+
+    def nextset(self):
+        return bool(self._results)
+
+    def close(self):
+        pass
+
+
+class _Dialect:
+    name = "mssql"
+
+
+class _Connection:
+    """Connection of the SQL Server dialect, as passed to engine events."""
+
+    dialect = _Dialect()
+
+    def __init__(self, fail_on=()):
+        self.executed = []
+        self.invalidated = False
+        self.connection = self
+        self._fail_on = fail_on
+
+    def cursor(self):
+        return _Cursor(self.executed, self._fail_on)
+
+    def invalidate(self, exception=None):
+        self.invalidated = True
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+    return engine
+
+
+@pytest.fixture
+def slow_queries(monkeypatch):
+    """Log every statement as slow, with its plan, and collect the messages about the test table.
+
+    Queries of the app's background threads are logged as slow too, through the same logger.
+    """
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_THRESHOLD_MS", 0.0)
+    monkeypatch.setattr(instrumentation.settings, "SLOW_QUERY_EXPLAIN", True)
+    messages = []
+
+    def warning(msg, *args):
+        message = msg % args
+        if " items" in message:
+            messages.append(message)
+
+    monkeypatch.setattr(instrumentation.logger, "warning", warning)
+    return messages
+
+
+def test_normalized_statements_hide_values():
+    statement = "SELECT * FROM items\n WHERE name = 'O''Brien' AND id IN (1, 2, 3) AND price > 2.5"
+    assert normalize_sql(statement) == "SELECT * FROM items WHERE name = ? AND id IN (...) AND price > ?"
+    assert parameter_shape({"id_1": 5, "name": "x"}) == "{id_1: int, name: str}"
+    assert parameter_shape([("a", 1), ("b", 2)], executemany=True) == "2 x (str, int)"
+
+
+def test_slow_select_is_logged_with_its_plan(engine, slow_queries):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": 7})
+    assert len(slow_queries) == 1
+    assert "SELECT name FROM items WHERE id = ? params=(int)" in slow_queries[0]
+    assert "plan:" in slow_queries[0] and "SEARCH items" in slow_queries[0]
+    # Values never reach the log
+    assert "7" not in slow_queries[0].split("params=")[1]
+
+
+def test_failed_explain_keeps_the_transaction(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO items (name) VALUES ('kept')"))
+        plan = _explain(conn, "SELECT * FROM missing_table", ())
+        assert plan.startswith("EXPLAIN failed")
+        conn.execute(text("INSERT INTO items (name) VALUES ('also kept')"))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM items")).scalar() == 2
+
+
+def test_sql_server_plans_with_showplan():
+    conn = _Connection()
+    assert _explain(conn, "SELECT id FROM items", ()) == "SELECT id FROM items\n|--Clustered Index Scan"
+    assert conn.executed == ["SET SHOWPLAN_TEXT ON", "SELECT id FROM items", "SET SHOWPLAN_TEXT OFF"]
+
+
+def test_sql_server_showplan_is_switched_off_after_a_failure():
+    conn = _Connection(fail_on=("SELECT id FROM items",))
+    assert _explain(conn, "SELECT id FROM items", ()).startswith("EXPLAIN failed")
+    assert conn.executed[-1] == "SET SHOWPLAN_TEXT OFF"
+    assert not conn.invalidated
+
+
+def test_connection_stuck_in_showplan_is_invalidated():
+    conn = _Connection(fail_on=("SET SHOWPLAN_TEXT OFF",))
+    _explain(conn, "SELECT id FROM items", ())
+    assert conn.invalidated
+
+
+def test_dialects_without_plans_say_so():
+    conn = _Connection()
+    conn.dialect = type("Dialect", (), {"name": "oracle"})()
+    assert _explain(conn, "SELECT id FROM items", ()) == "Query plans are not supported on oracle"
+    assert conn.executed == []
+
+
+def test_requests_report_their_database_time(client, admin_headers):
+    response = client.get("/api/v1/offices/", headers=admin_headers)
+    timing = response.headers["Server-Timing"]
+    assert re.match(r'db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+', timing), timing
@@ -0,0 +1,74 @@
+"""Live feed events: delivery, overflow and resynchronizing with snapshots."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.core.events import EventBus, attendance_event
+from app.models.models import LocationType
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_events_are_delivered_in_order():
+    async def scenario():
+        bus = EventBus(max_queued=10)
+        bus.publish("login", {"user_id": 1})
+        assert bus.last_id == 0
+
+        subscription = bus.subscribe()
+        bus.publish("login", {"user_id": 2})
+        bus.publish("logout", {"user_id": 2})
+        received = [await subscription.get(1.0), await subscription.get(1.0)]
+        assert await subscription.get(0.01) is None
+
+        bus.unsubscribe(subscription)
+        bus.publish("login", {"user_id": 3})
+        assert await subscription.get(0.01) is None
+        return received
+
+    received = _run(scenario())
+    assert [(event.id, event.kind) for event in received] == [(1, "login"), (2, "logout")]
+    assert received[0].to_sse().startswith("id: 1\nevent: login\ndata: ")
+
+
+def test_overflow_lasts_until_a_snapshot_covers_the_dropped_events():
+    async def scenario():
+        bus = EventBus(max_queued=2)
+        subscription = bus.subscribe()
+        for user_id in range(3):
+            bus.publish("login", {"user_id": user_id})
+        await asyncio.sleep(0)
+        assert subscription.overflowed
+
+        # A snapshot taken before the dropped event does not cover it
+        subscription.discard_through(2)
+        assert subscription.overflowed
+        subscription.discard_through(3)
+        assert not subscription.overflowed
+        return await subscription.get(0.01)
+
+    assert _run(scenario()) is None
+
+
+def test_only_check_ins_of_today_change_the_counters():
+    record = SimpleNamespace(
+        id=1, user_id=2, office_id=3, location_type=LocationType.OFFICE,
+        check_in_time=datetime.now(), check_out_time=None,
+    )
+    assert attendance_event(record)[0::2] == (
+        "check_in", {"attendance.today.total": 1, "attendance.today.office": 1}
+    )
+
+    record.check_in_time -= timedelta(days=2)
+    assert attendance_event(record)[2] == {}
+
+    record.check_out_time = datetime.now()
+    kind, data, deltas = attendance_event(record, auto=True)
+    assert (kind, data["auto"], deltas) == ("check_out", True, {})
+
+
+def test_live_feed_is_for_admins_only(client, login):
+    assert client.get("/api/v1/admin/live", headers=login("live-feed-user")).status_code == 403
@@ -0,0 +1,94 @@
+"""Grid neighbors and cluster radii of check-in clustering against a comparison of all cell pairs."""
+
+import random
+from datetime import datetime
+
+import pytest
+
+from app.core.geofence import GeofenceService
+from app.core.location_clusters import _Cell, _expand, _Grid, _neighbors, _summarize
+from app.models.models import LocationClusterRun
+from tests.geodesy import destination
+
+EPS_METERS = 100.0
+# Sites at mid latitudes, on the antimeridian and next to both poles
+SITES = ((51.5, -0.12), (10.0, 179.9999), (-10.0, -179.9995), (89.9995, 40.0), (-89.9998, 0.0), (60.0, 25.0))
+# Check-ins per site, and scattered over the globe
+SAMPLES = 300
+
+
+@pytest.fixture(scope="module")
+def clustering():
+    rng = random.Random(42)
+    points = []
+    for lat, lon in SITES:
+        for _ in range(SAMPLES):
+            points.append(destination(lat, lon, rng.uniform(0, 360), abs(rng.gauss(0, 40))))
+    for _ in range(SAMPLES):
+        points.append((rng.uniform(-89, 89), rng.uniform(-180, 180)))
+
+    grid = _Grid(EPS_METERS)
+    cells = {}
+    now = datetime.now()
+    for lat, lon in points:
+        key = grid.key(lat, lon)
+        if key not in cells:
+            cells[key] = _Cell(now)
+        cells[key].add(0, now, lat, lon)
+    for cell in cells.values():
+        cell.finish()
+    neighbors = _neighbors(cells, grid)
+    return points, grid, cells, neighbors, _expand(cells, neighbors, 20)
+
+
+def test_grid_neighbors_match_all_pairs(clustering):
+    _, _, cells, neighbors, _ = clustering
+    keys = list(cells)
+    for i, key in enumerate(keys):
+        found = set(neighbors[key])
+        for other in keys[i:]:
+            distance = GeofenceService.haversine_distance(
+                cells[key].lat, cells[key].lon, cells[other].lat, cells[other].lon
+            )
+            if abs(distance - EPS_METERS) > 1e-6:
+                assert (distance <= EPS_METERS) == (other in found), (key, other, distance)
+
+
+def test_sites_form_clusters(clustering):
+    _, _, _, _, clusters = clustering
+    assert len(clusters) == len(SITES)
+
+
+def test_cluster_radius_holds_every_check_in(clustering):
+    points, grid, cells, _, clusters = clustering
+    cluster_of = {key: position for position, members in enumerate(clusters) for key in members}
+    summaries = [_summarize(cells, members, grid) for members in clusters]
+    for lat, lon in points:
+        position = cluster_of.get(grid.key(lat, lon))
+        if position is None:
+            continue
+        center_lat, center_lon, radius, _ = summaries[position]
+        distance = GeofenceService.haversine_distance(center_lat, center_lon, lat, lon)
+        assert distance <= radius + 1e-6, ((lat, lon), (center_lat, center_lon))
+
+
+def test_clustering_run_completes_in_the_background(client, admin_headers):
+    response = client.post("/api/v1/admin/location-clusters", headers=admin_headers)
+    assert response.status_code == 202
+    run = client.get(f"/api/v1/admin/location-clusters/runs/{response.json()['id']}", headers=admin_headers).json()
+    assert run["status"] == "completed"
+
+
+def test_only_one_clustering_run_at_a_time(client, admin_headers, db):
+    running = LocationClusterRun(claim=True, status="running", eps_meters=EPS_METERS, min_check_ins=5)
+    db.add(running)
+    db.commit()
+    try:
+        assert client.post("/api/v1/admin/location-clusters", headers=admin_headers).status_code == 409
+    finally:
+        running.claim, running.status = None, "failed"
+        db.commit()
+
+
+def test_unknown_clustering_run_is_not_found(client, admin_headers):
+    assert client.get("/api/v1/admin/location-clusters/runs/987654", headers=admin_headers).status_code == 404
@@ -0,0 +1,81 @@
+"""Filters and formatters of the queued logging pipeline."""
+
+import json
+import logging
+import sys
+
+import pytest
+
+from app.logger import JsonFormatter, RateLimitFilter, RequestIdFilter, StructuredQueueHandler, request_id_var
+
+
+def _record(level: int = logging.DEBUG, name: str = "app.tests", msg: str = "polled %s") -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, ("x",), None)
+
+
+def _passed(log_filter: RateLimitFilter, count: int, **record) -> int:
+    return sum(log_filter.filter(_record(**record)) for _ in range(count))
+
+
+def test_debug_messages_are_limited_to_the_burst():
+    log_filter = RateLimitFilter(rate_per_second=0.001, burst=5)
+    assert _passed(log_filter, 20) == 5
+    # Limits are per message template
+    assert _passed(log_filter, 1, msg="other %s") == 1
+
+
+def test_suppressed_count_is_reported_on_the_next_record(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("app.logger.time.monotonic", lambda: clock[0])
+    log_filter = RateLimitFilter(rate_per_second=1.0, burst=1)
+    assert _passed(log_filter, 4) == 1
+
+    clock[0] += 1.0
+    record = _record()
+    assert log_filter.filter(record)
+    assert record.suppressed == 3
+
+
+def test_info_and_warnings_pass_by_default():
+    log_filter = RateLimitFilter(rate_per_second=0.001, burst=1)
+    assert _passed(log_filter, 50, level=logging.INFO) == 50
+    assert _passed(log_filter, 50, level=logging.WARNING) == 50
+
+
+def test_overrides_limit_info_but_never_warnings():
+    log_filter = RateLimitFilter(rate_per_second=0.0, burst=2, rate_overrides={"app.chatty": 0.001})
+    assert _passed(log_filter, 10, level=logging.INFO, name="app.chatty") == 2
+    assert _passed(log_filter, 10, level=logging.ERROR, name="app.chatty") == 10
+    # A zero default disables the limit of other loggers
+    assert _passed(log_filter, 10, level=logging.DEBUG) == 10
+
+
+@pytest.mark.parametrize("rate, expected", ((0.0, 0), (1.0, 100)))
+def test_sampling_keeps_a_fraction(rate, expected):
+    log_filter = RateLimitFilter(rate_per_second=0.0, burst=1, sample_rates={"app.tests": rate})
+    assert _passed(log_filter, 100, level=logging.INFO) == expected
+
+
+def test_records_carry_the_request_id_and_exception_as_json():
+    token = request_id_var.set("req-1")
+    try:
+        record = _record(level=logging.ERROR)
+        assert RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record.exc_info = sys.exc_info()
+
+    # As the listener thread receives it
+    prepared = StructuredQueueHandler(None).prepare(record)
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert (entry["message"], entry["request_id"], entry["level"]) == ("polled x", "req-1", "ERROR")
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_records_outside_requests_get_a_placeholder_id():
+    record = _record()
+    RequestIdFilter().filter(record)
+    assert record.request_id == "-"
@@ -0,0 +1,91 @@
+"""Batched login history and last_login writes of the login audit writer."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.audit import LoginAuditWriter
+from app.models.models import User, UserLoginHistory
+
+
+@pytest.fixture
+def user(db):
+    name = f"audit-{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _history(db, session_id: str) -> UserLoginHistory:
+    db.expire_all()
+    return db.query(UserLoginHistory).filter(UserLoginHistory.session_id == session_id).one()
+
+
+def test_buffered_events_are_written_on_flush(db, user):
+    writer = LoginAuditWriter(mode="async", flush_interval_seconds=60)
+    writer.start()
+    try:
+        start = datetime.now().replace(microsecond=0)
+        writer.record_login(user.id, start - timedelta(minutes=5), session_id="early")
+        writer.record_login(user.id, start, "10.0.0.1", "tests", session_id="late")
+        # A logout in the same batch as its login still closes it
+        writer.record_logout("early", start - timedelta(minutes=1))
+        assert db.query(UserLoginHistory).filter(UserLoginHistory.user_id == user.id).count() == 0
+    finally:
+        writer.stop()
+
+    assert _history(db, "early").logout_time == start - timedelta(minutes=1)
+    late = _history(db, "late")
+    assert (late.login_time, late.ip_address, late.logout_time) == (start, "10.0.0.1", None)
+    # last_login is coalesced to the latest login of the batch
+    assert db.get(User, user.id).last_login == start
+
+
+def test_last_login_keeps_updated_at(db, user):
+    updated_at = datetime(2026, 1, 1)
+    user.updated_at = updated_at
+    db.commit()
+    LoginAuditWriter(mode="sync").record_login(user.id, datetime.now(), session_id=uuid.uuid4().hex)
+    db.expire_all()
+    assert db.get(User, user.id).last_login is not None
+    assert db.get(User, user.id).updated_at == updated_at
+
+
+def test_sync_mode_writes_before_returning(db, user):
+    session_id = uuid.uuid4().hex
+    LoginAuditWriter(mode="sync").record_login(user.id, datetime.now(), session_id=session_id)
+    assert _history(db, session_id).user_id == user.id
+
+
+def test_full_buffer_writes_synchronously(db, user, monkeypatch):
+    # A writer whose flush thread has not caught up yet
+    monkeypatch.setattr(LoginAuditWriter, "is_running", property(lambda self: True))
+    writer = LoginAuditWriter(mode="async", max_buffer=1)
+    buffered, overflow = uuid.uuid4().hex, uuid.uuid4().hex
+    writer.record_login(user.id, datetime.now(), session_id=buffered)
+    writer.record_login(user.id, datetime.now(), session_id=overflow)
+    assert _history(db, overflow).user_id == user.id
+
+    assert writer.flush() == 1
+    assert _history(db, buffered).user_id == user.id
+
+
+def test_failed_batch_is_logged_not_raised(db, user, monkeypatch):
+    monkeypatch.setattr(LoginAuditWriter, "is_running", property(lambda self: True))
+    writer = LoginAuditWriter(mode="async")
+
+    def fail(events):
+        raise RuntimeError("database unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(LoginAuditWriter, "_write", staticmethod(fail))
+        writer.record_login(user.id, datetime.now(), session_id=uuid.uuid4().hex)
+        # The flush thread calls this too, and must survive the error
+        assert writer.flush() == 1
+
+    session_id = uuid.uuid4().hex
+    writer.record_login(user.id, datetime.now(), session_id=session_id)
+    assert writer.flush() == 1
+    assert _history(db, session_id).user_id == user.id
@@ -0,0 +1,50 @@
+"""Logouts bound to the login session of their token."""
+
+import uuid
+
+import pytest
+
+from app.core.auth import create_access_token
+from app.models.models import User, UserLoginHistory
+
+
+@pytest.fixture
+def username():
+    return f"logout-{uuid.uuid4().hex[:8]}"
+
+
+def _sessions(db, username: str):
+    db.expire_all()
+    user = db.query(User).filter(User.username == username).one()
+    return db.query(UserLoginHistory).filter(UserLoginHistory.user_id == user.id).order_by(UserLoginHistory.id).all()
+
+
+def test_logout_closes_only_its_own_session(client, db, login, username):
+    phone, laptop = login(username), login(username)
+    assert client.post("/api/v1/auth/logout", headers=phone).status_code == 200
+
+    # The logged out token is revoked, the other device stays logged in
+    assert client.get("/api/v1/auth/me", headers=phone).status_code == 401
+    assert client.get("/api/v1/auth/me", headers=laptop).status_code == 200
+
+    first, second = _sessions(db, username)
+    assert first.session_id and second.session_id
+    assert first.logout_time is not None
+    assert second.logout_time is None
+
+
+def test_token_without_session_closes_the_latest_session(client, db, login, username):
+    login(username)
+    login(username)
+    user_id = _sessions(db, username)[0].user_id
+    legacy = {"Authorization": f"Bearer {create_access_token(subject=user_id)}"}
+
+    assert client.post("/api/v1/auth/logout", headers=legacy).status_code == 200
+    first, second = _sessions(db, username)
+    assert first.logout_time is None
+    assert second.logout_time is not None
+
+
+def test_logout_requires_a_valid_token(client):
+    assert client.post("/api/v1/auth/logout").status_code == 401
+    assert client.post("/api/v1/auth/logout", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
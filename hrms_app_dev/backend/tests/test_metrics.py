@@ -0,0 +1,81 @@
+"""Metrics in the Prometheus text format and the /metrics endpoint."""
+
+import threading
+
+from app.core.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_counter_sums_the_shards_of_all_threads():
+    counter = Counter("test_total", "Test counter.", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc("a")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("b", amount=2.5)
+
+    assert counter.value("a") == 4000
+    assert list(counter.samples()) == ['test_total{kind="a"} 4000.0', 'test_total{kind="b"} 2.5']
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/x")
+
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{route="/x",le="0.1"} 2.0',
+        'test_seconds_bucket{route="/x",le="1.0"} 3.0',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4.0',
+        'test_seconds_sum{route="/x"} 3.65',
+        'test_seconds_count{route="/x"} 4.0',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_total", "Test counter.", ("path",))
+    counter.inc('a"b\\c\nd')
+    assert list(counter.samples()) == ['test_total{path="a\\"b\\\\c\\nd"} 1.0']
+
+
+def test_failing_gauge_callback_does_not_break_the_scrape():
+    registry = MetricsRegistry()
+
+    def fail():
+        raise RuntimeError("pool gone")
+
+    registry.register(Gauge("test_broken", "Broken gauge.", callback=fail))
+    registry.counter("test_total", "Test counter.").inc()
+    assert registry.render().splitlines() == [
+        "# HELP test_broken Broken gauge.",
+        "# TYPE test_broken gauge",
+        "# HELP test_total Test counter.",
+        "# TYPE test_total counter",
+        "test_total 1.0",
+    ]
+
+
+def test_registering_a_taken_name_returns_the_existing_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("test_total", "Test counter.")
+    assert registry.counter("test_total", "Another counter.") is first
+
+
+def test_requests_are_labelled_by_route_template(client, admin_headers):
+    client.get("/api/v1/offices/987654", headers=admin_headers)
+    client.get("/no/such/path")
+    lines = client.get("/metrics").text.splitlines()
+
+    assert any(
+        line.startswith('hrms_http_requests_total{method="GET",route="/api/v1/offices/{office_id}",status="404"}')
+        for line in lines
+    )
+    assert any(
+        line.startswith('hrms_http_requests_total{method="GET",route="unmatched",status="404"}') for line in lines
+    )
+    assert not any("987654" in line for line in lines)
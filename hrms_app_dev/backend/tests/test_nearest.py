@@ -0,0 +1,116 @@
+"""Nearest office searches of the index and the decision cache against a full sort."""
+
+import math
+import random
+
+import pytest
+
+from app.core.geofence_cache import GeofenceDecisionCache
+from app.core.geofence_index import DISTANCE_TOLERANCE_METERS, GeofenceIndex, build_index
+from tests.geodesy import destination
+
+LATITUDES = (0.0, 30.0, 51.5, 60.0, 70.0, 80.0, 85.0, 89.0, 89.9, -45.0)
+RADII = (50.0, 100.0, 300.0, 500.0, 2000.0)
+
+
+@pytest.fixture(scope="module")
+def fences():
+    rng = random.Random(42)
+    fences = []
+    for lat in LATITUDES:
+        for radius in RADII:
+            fences.append((len(fences) + 1, "", lat, rng.uniform(-180, 180), radius, None))
+    # A square boundary with a square hole, 200 m and 100 m across
+    side, hole = 200 / 111195, 100 / 111195
+    fences.append((len(fences) + 1, "", 51.5, 0.0, 150.0, [
+        [(51.5, 0.0), (51.5 + side, 0.0), (51.5 + side, side), (51.5, side)],
+        [(51.5 + hole / 2, hole / 2), (51.5 + hole * 1.5, hole / 2), (51.5 + hole * 1.5, hole * 1.5),
+         (51.5 + hole / 2, hole * 1.5)],
+    ]))
+    return fences
+
+
+@pytest.fixture
+def cache():
+    return GeofenceDecisionCache(cell_meters=5.0, ttl_seconds=600.0, max_size=100000)
+
+
+@pytest.fixture(scope="module")
+def spread_index():
+    """Index of fences spread over the globe, with a cluster on the antimeridian and some polygons."""
+    rng = random.Random(42)
+    fences = []
+    for i in range(3000):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-180, 180)
+        rings = None
+        if i % 50 == 0:
+            size = 0.002
+            rings = [[(lat - size, lon - size), (lat + size, lon - size), (lat + size, lon + size), (lat - size, lon + size)]]
+        fences.append((i + 1, "", lat, lon, rng.uniform(50, 2000), rings))
+    for _ in range(150):
+        lon = rng.choice((179.99, -179.99)) + rng.uniform(-0.01, 0.01)
+        fences.append((len(fences) + 1, "", rng.uniform(-1, 1), lon, 100.0, None))
+    return GeofenceIndex(build_index(fences, (0, 0, 0), 0.01))
+
+
+def test_nearest_matches_full_sort(spread_index):
+    rng = random.Random(7)
+    for i in range(300):
+        if i % 3 == 0:
+            lat, lon = rng.uniform(-1, 1), rng.choice((179.995, -179.995))
+        else:
+            lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        k = rng.choice((1, 5, 20))
+        max_distance = rng.choice((None, 1e5, 5e5))
+
+        found = [distance for _, _, distance in spread_index.nearest(lat, lon, k, max_distance)]
+        distances = sorted(spread_index.check(position, lat, lon)[1] for position in range(len(spread_index)))
+        expected = [distance for distance in distances if max_distance is None or distance <= max_distance][:k]
+        assert len(found) == len(expected), (lat, lon, k, max_distance)
+        for a, b in zip(found, expected):
+            assert abs(a - b) <= DISTANCE_TOLERANCE_METERS, (lat, lon, k, max_distance)
+
+
+def test_cached_nearest_matches_index(fences, cache):
+    rng = random.Random(2)
+    # Overlapping fences around one spot, so the k-th nearest is often close to the next
+    dense = fences + [
+        (len(fences) + i + 1, "", 10 + rng.uniform(-0.01, 0.01), 20 + rng.uniform(-0.01, 0.01),
+         rng.uniform(50, 500), None)
+        for i in range(300)
+    ]
+    index = GeofenceIndex(build_index(dense, (0, 0, 0), 0.01))
+    for i in range(300):
+        if i % 2:
+            lat, lon = 10 + rng.uniform(-0.01, 0.01), 20 + rng.uniform(-0.01, 0.01)
+        else:
+            _, _, fence_lat, fence_lon, radius, _ = rng.choice(dense)
+            lat, lon = destination(fence_lat, fence_lon, rng.uniform(0, 2 * math.pi), radius + rng.uniform(-20, 20))
+        k = rng.choice((1, 5, 20))
+        max_distance = rng.choice((None, 300.0, 1e5))
+        for _ in range(3):
+            point_lat, point_lon = destination(lat, lon, rng.uniform(0, 2 * math.pi), rng.uniform(0, 5))
+            found = cache.nearest(index, point_lat, point_lon, k, max_distance)
+            expected = index.nearest(point_lat, point_lon, k, max_distance)
+            assert len(found) >= len(expected)
+            for (_, _, a), (_, _, b) in zip(found, expected):
+                assert abs(a - b) <= DISTANCE_TOLERANCE_METERS, (point_lat, point_lon, k, max_distance)
+            # Fences containing the point are listed after the nearest ones
+            assert all(inside for _, inside, _ in found[len(expected):])
+            containing = {
+                position for position in range(len(index)) if index.check(position, point_lat, point_lon)[0]
+            }
+            assert containing <= {position for position, _, _ in found}
+
+
+def test_nearest_endpoint_is_sorted_and_limited(client, login):
+    params = {"lat": 10.0, "lon": 20.0, "k": 2}
+    response = client.get("/api/v1/offices/nearest", params=params, headers=login("nearest"))
+    assert response.status_code == 200
+    distances = [office["distance"] for office in response.json()]
+    assert len(distances) <= 2 and distances == sorted(distances)
+
+
+@pytest.mark.parametrize("params", ({"lat": 91.0, "lon": 0.0}, {"lat": 0.0, "lon": 0.0, "k": 0}))
+def test_nearest_endpoint_rejects_invalid_queries(client, login, params):
+    assert client.get("/api/v1/offices/nearest", params=params, headers=login("nearest")).status_code == 422
@@ -0,0 +1,83 @@
+"""Live office occupancy and its reconciles with the attendance table."""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.core.occupancy import OccupancyTracker
+from app.models.models import AttendanceRecord, LocationType, User
+
+
+@pytest.fixture
+def user(db):
+    name = f"occupancy-{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def check_in(db, user):
+    """Open a session directly in the database, as another worker would."""
+    def check_in() -> AttendanceRecord:
+        record = AttendanceRecord(
+            user_id=user.id, location_type=LocationType.OTHER, check_in_latitude=0.0, check_in_longitude=0.0
+        )
+        db.add(record)
+        db.commit()
+        return record
+
+    return check_in
+
+
+def test_reconcile_picks_up_other_workers_sessions(db, check_in):
+    tracker = OccupancyTracker()
+    opened = check_in()
+    tracker.reconcile()
+    total = tracker.total
+
+    newer = check_in()
+    opened.check_out_time = datetime.now()
+    db.commit()
+    assert tracker.reconcile(full=False) == total
+    assert tracker._sessions.keys() >= {newer.id} and opened.id not in tracker._sessions
+
+
+def test_updates_during_a_reconcile_are_kept(db, check_in, monkeypatch):
+    tracker = OccupancyTracker()
+    record = check_in()
+    tracked = check_in()
+    tracked.check_out_time = datetime.now()
+    db.commit()
+
+    # Applied by this worker while the reconcile reads the table
+    original = db.query
+    monkeypatch.setattr("app.core.occupancy.SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+    monkeypatch.setattr(db, "query", lambda *args: (tracker.release(record.id), original(*args))[1])
+    tracker.reconcile()
+    assert record.id not in tracker._sessions
+
+
+def test_sessions_below_the_reconciled_range_wait_for_a_full_reconcile(db, user, check_in):
+    tracker = OccupancyTracker()
+    check_in()
+    tracker.reconcile()
+
+    # Committed late by another worker, with an ID older than every tracked session
+    late = AttendanceRecord(
+        id=-(uuid.uuid4().int % 1_000_000) - 1, user_id=user.id, location_type=LocationType.OTHER,
+        check_in_latitude=0.0, check_in_longitude=0.0,
+    )
+    db.add(late)
+    db.commit()
+    try:
+        tracker.reconcile(full=False)
+        assert late.id not in tracker._sessions
+        tracker.reconcile(full=True)
+        assert late.id in tracker._sessions
+    finally:
+        db.delete(late)
+        db.commit()
@@ -0,0 +1,64 @@
+"""Warming the pre-fork master and resetting forked workers."""
+
+import gc
+
+import pytest
+from sqlalchemy import text
+
+from app.core import prefork
+from app.db.base import get_engine
+
+
+@pytest.fixture
+def unfrozen():
+    """Return frozen objects to the collector after the test."""
+    yield
+    gc.unfreeze()
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    """Messages logged while warming; background threads of the app share the logger."""
+    messages = []
+    for level in ("info", "error"):
+        monkeypatch.setattr(
+            prefork.logger, level, lambda msg, *args, level=level: messages.append((level, msg % args))
+        )
+    return messages
+
+
+def test_master_is_warmed_without_keeping_connections(database, unfrozen, messages):
+    engine = get_engine()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    prefork.warm_master()
+
+    assert gc.get_freeze_count() > 0
+    assert engine.pool.checkedin() == 0
+    assert any(level == "info" and message.startswith("Warmed master") for level, message in messages)
+
+
+def test_unreachable_database_leaves_workers_to_start_cold(monkeypatch, database, unfrozen, messages):
+    def fail():
+        raise RuntimeError("database unreachable")
+
+    monkeypatch.setattr(prefork.office_geofences, "load", fail)
+    prefork.warm_master()
+
+    assert ("error", "Error warming master, workers will start cold: database unreachable") in messages
+    frozen = gc.get_freeze_count()
+    assert ("info", f"Warmed master: 0 office geofences, 0 revoked tokens, {frozen} objects frozen") in messages
+
+
+def test_worker_gets_a_pool_of_its_own(database):
+    engine = get_engine()
+    inherited = engine.pool
+    conn = engine.connect()
+    try:
+        prefork.after_fork()
+        assert engine.pool is not inherited
+        # The master's connection is left open
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        conn.close()
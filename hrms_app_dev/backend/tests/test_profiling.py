@@ -0,0 +1,62 @@
+"""On-demand request profiling and the tokens enabling it."""
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter
+from jose import jwt
+
+from app.config import settings
+from app.core.profiling import PROFILE_ID_HEADER, PROFILE_TOKEN_HEADER, ProfilingRoute, profile_store
+
+
+def _profile_token(client, headers) -> str:
+    response = client.post("/api/v1/admin/profiles/token", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["profile_token"]
+
+
+def test_profiled_request_stores_its_stacks(client, admin_headers):
+    token = _profile_token(client, admin_headers)
+    response = client.get("/api/v1/offices/", headers={**admin_headers, PROFILE_TOKEN_HEADER: token})
+    assert response.status_code == 200
+
+    profile = profile_store.get(response.headers[PROFILE_ID_HEADER])
+    assert profile.route == "/api/v1/offices/"
+    stored = client.get(f"/api/v1/admin/profiles/{profile.id}", headers=admin_headers)
+    assert stored.status_code == 200
+
+
+def test_profiling_token_is_not_a_bearer_token(client, admin_headers):
+    token = _profile_token(client, admin_headers)
+    for path in ("/api/v1/admin/users", "/api/v1/offices/"):
+        assert client.get(path, headers={"Authorization": f"Bearer {token}"}).status_code == 401
+
+
+def test_profiling_token_signed_with_the_secret_key_is_rejected(client, admin_headers):
+    # As profiling tokens were issued before they had their own key
+    legacy = jwt.encode(
+        {"exp": datetime.now() + timedelta(minutes=5), "sub": "1", "purpose": "profile"},
+        settings.SECRET_KEY, algorithm="HS256",
+    )
+    assert client.get("/api/v1/admin/users", headers={"Authorization": f"Bearer {legacy}"}).status_code == 401
+
+
+def test_profiling_token_of_another_user_is_ignored(client, admin_headers, login):
+    token = _profile_token(client, admin_headers)
+    response = client.get("/api/v1/offices/", headers={**login("profiled-other"), PROFILE_TOKEN_HEADER: token})
+    assert response.status_code == 200
+    assert PROFILE_ID_HEADER not in response.headers
+
+
+def test_async_endpoints_are_not_profiled():
+    router = APIRouter(route_class=ProfilingRoute)
+
+    @router.get("/sync")
+    def sync_endpoint():
+        return {}
+
+    @router.get("/async")
+    async def async_endpoint():
+        return {}
+
+    assert [route.profilable for route in router.routes] == [True, False]
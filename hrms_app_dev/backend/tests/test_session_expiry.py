@@ -0,0 +1,118 @@
+"""Session deadlines and the heap of the session expiry scheduler."""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.core.scheduler import SessionExpiryScheduler
+from app.models.models import AttendanceRecord, LocationType, User
+
+
+@pytest.fixture
+def user(db):
+    name = f"expiry-{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def open_session(db, user):
+    """Open a session of the user at a check-in time, returning its record ID."""
+    def open_session(check_in_time: datetime) -> int:
+        record = AttendanceRecord(
+            user_id=user.id,
+            location_type=LocationType.OTHER,
+            check_in_time=check_in_time,
+            check_in_latitude=1.0,
+            check_in_longitude=2.0,
+        )
+        db.add(record)
+        db.commit()
+        return record.id
+
+    return open_session
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = SessionExpiryScheduler(batch_size=2)
+    # Running without its loop: schedule() only fills the heap
+    scheduler.is_running = True
+    return scheduler
+
+
+def test_deadline_prefers_user_then_office_limit():
+    start = datetime(2026, 1, 1, 9)
+    assert SessionExpiryScheduler.deadline_for(start, 3, 5) == start + timedelta(hours=3)
+    assert SessionExpiryScheduler.deadline_for(start, None, 5) == start + timedelta(hours=5)
+    assert SessionExpiryScheduler.deadline_for(start) == start + timedelta(hours=settings.AUTO_LOGOUT_SESSION_HOURS)
+
+
+def test_due_sessions_close_at_their_deadline(db, scheduler, open_session):
+    now = datetime.now()
+    due = [open_session(now - timedelta(hours=3)) for _ in range(3)]
+    later = open_session(now)
+    cancelled = open_session(now - timedelta(hours=3))
+    deadlines = {record_id: now - timedelta(minutes=minutes) for minutes, record_id in enumerate(due)}
+    for record_id, deadline in deadlines.items():
+        scheduler.schedule(record_id, deadline)
+    scheduler.schedule(later, now + timedelta(hours=1))
+    scheduler.schedule(cancelled, now - timedelta(minutes=1))
+    scheduler.cancel(cancelled)
+
+    # Three due sessions take two batches
+    assert scheduler.expire_due() == 3
+    assert scheduler.pending_count == 1
+
+    db.expire_all()
+    for record_id, deadline in deadlines.items():
+        record = db.get(AttendanceRecord, record_id)
+        assert record.check_out_time == deadline
+        assert record.check_out_latitude == record.check_in_latitude
+    assert db.get(AttendanceRecord, later).check_out_time is None
+    assert db.get(AttendanceRecord, cancelled).check_out_time is None
+
+
+def test_sessions_checked_out_meanwhile_are_left_alone(db, scheduler, open_session):
+    record_id = open_session(datetime.now() - timedelta(hours=3))
+    checked_out = datetime.now() - timedelta(hours=1)
+    db.get(AttendanceRecord, record_id).check_out_time = checked_out
+    db.commit()
+
+    scheduler.schedule(record_id, datetime.now() - timedelta(minutes=1))
+    assert scheduler.expire_due() == 0
+    db.expire_all()
+    assert db.get(AttendanceRecord, record_id).check_out_time == checked_out
+
+
+def test_failed_batch_is_retried(db, scheduler, open_session, monkeypatch):
+    record_id = open_session(datetime.now() - timedelta(hours=3))
+    deadline = datetime.now() - timedelta(minutes=1)
+    scheduler.schedule(record_id, deadline)
+
+    def fail(db, deadlines):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(SessionExpiryScheduler, "close_sessions", staticmethod(fail))
+    with pytest.raises(RuntimeError):
+        scheduler.expire_due()
+    assert scheduler.pending_count == 1
+
+    monkeypatch.undo()
+    assert scheduler.expire_due() == 1
+    db.expire_all()
+    assert db.get(AttendanceRecord, record_id).check_out_time == deadline
+
+
+def test_restore_tracks_open_sessions_with_their_limits(db, scheduler, user, open_session):
+    user.session_limit_hours = 1.5
+    db.commit()
+    check_in_time = datetime.now() - timedelta(minutes=10)
+    record_id = open_session(check_in_time)
+
+    scheduler.restore()
+    assert dict(scheduler.export())[record_id] == check_in_time + timedelta(hours=1.5)
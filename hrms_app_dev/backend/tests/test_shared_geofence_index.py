@@ -0,0 +1,53 @@
+"""Refreshing the shared geofence index from the offices table."""
+
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core.geofence_index import SharedGeofenceIndex
+from app.models.models import Office
+
+
+@pytest.fixture
+def offices(db):
+    """Two offices, the second changed a few seconds after the first."""
+    first = Office(name=f"first-{uuid.uuid4().hex[:8]}", address="x", latitude=10.0, longitude=10.0, radius=100.0)
+    second = Office(name=f"second-{uuid.uuid4().hex[:8]}", address="x", latitude=11.0, longitude=11.0, radius=100.0)
+    db.add_all([first, second])
+    db.commit()
+    db.execute(update(Office).where(Office.id == second.id).values(updated_at=first.updated_at + timedelta(seconds=5)))
+    db.commit()
+    return first, second
+
+
+def _index(tmp_path, **kwargs) -> SharedGeofenceIndex:
+    return SharedGeofenceIndex(str(tmp_path / "geofence.idx"), refresh_interval_seconds=0.0, **kwargs)
+
+
+def _radius(shared: SharedGeofenceIndex, db, office: Office) -> float:
+    index = shared.index(db)
+    return index.circle(index.position(office.id)).radius
+
+
+def test_change_committed_after_a_later_stamp_is_picked_up(db, tmp_path, offices):
+    first, second = offices
+    shared = _index(tmp_path)
+    assert _radius(shared, db, first) == 100.0
+
+    # Stamped before the latest change seen, as by a transaction that committed late
+    db.execute(update(Office).where(Office.id == first.id).values(
+        radius=250.0, updated_at=db.get(Office, second.id).updated_at - timedelta(seconds=1)
+    ))
+    db.commit()
+    assert _radius(shared, db, first) == 250.0
+
+
+def test_old_index_is_rebuilt_without_changes(db, tmp_path, offices):
+    shared = _index(tmp_path, max_age_seconds=3600.0)
+    generation = shared.index(db).generation
+    assert shared.index(db).generation == generation
+
+    shared.max_age_seconds = 0.0
+    assert shared.index(db).generation != generation
@@ -0,0 +1,63 @@
+"""Spatial key ranges of check-in searches against the keys of points inside their rectangles."""
+
+import random
+import uuid
+
+import pytest
+
+from app.core.spatial_key import KEY_BITS, key_ranges, spatial_key
+from app.models.models import AttendanceRecord, LocationType, User
+
+
+def test_keys_are_within_bits():
+    assert spatial_key(-90.0, -180.0) == 0
+    assert spatial_key(90.0, 180.0) == (1 << (2 * KEY_BITS)) - 1
+
+
+@pytest.mark.parametrize("size", (1e-4, 2e-3, 2e-2, 0.5, 5.0))
+def test_ranges_cover_rectangles(size):
+    rng = random.Random(size)
+    for _ in range(100):
+        lat, lon = rng.uniform(-89, 89), rng.uniform(-179, 179)
+        bounds = (
+            lat - size * rng.random(), lat + size * rng.random(), lon - size * rng.random(), lon + size * rng.random()
+        )
+        ranges = key_ranges(*bounds)
+        assert len(ranges) <= 16, bounds
+        assert all(last < first_next for (_, last), (first_next, _) in zip(ranges, ranges[1:])), bounds
+        for _ in range(20):
+            point = (rng.uniform(bounds[0], bounds[1]), rng.uniform(bounds[2], bounds[3]))
+            key = spatial_key(*point)
+            assert any(first <= key <= last for first, last in ranges), (bounds, point)
+
+
+@pytest.fixture
+def check_in(db):
+    """A check-in close to the antimeridian, away from every other test's."""
+    name = f"spatial-{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    db.add(user)
+    db.commit()
+    record = AttendanceRecord(
+        user_id=user.id, location_type=LocationType.OTHER, check_in_latitude=-33.3, check_in_longitude=179.9995
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+
+def test_check_ins_are_found_by_distance_and_box(client, admin_headers, check_in):
+    nearby = client.get(
+        "/api/v1/admin/check-ins/nearby", params={"lat": -33.3, "lon": -179.9995, "radius": 200}, headers=admin_headers
+    ).json()
+    assert [(match["id"], round(match["distance"])) for match in nearby["check_ins"]] == [(check_in.id, 93)]
+
+    # Western edge east of the eastern one: the box crosses the antimeridian
+    box = {"min_lat": -33.31, "max_lat": -33.29, "min_lon": 179.99, "max_lon": -179.99}
+    in_bounds = client.get("/api/v1/admin/check-ins/in-bounds", params=box, headers=admin_headers).json()
+    assert [match["id"] for match in in_bounds["check_ins"]] == [check_in.id]
+
+
+def test_inverted_box_is_rejected(client, admin_headers):
+    box = {"min_lat": 1.0, "max_lat": 0.0, "min_lon": 0.0, "max_lon": 1.0}
+    assert client.get("/api/v1/admin/check-ins/in-bounds", params=box, headers=admin_headers).status_code == 400
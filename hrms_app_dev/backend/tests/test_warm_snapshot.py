@@ -0,0 +1,76 @@
+"""Snapshots of the principal cache and how restored users are revalidated."""
+
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core import snapshot
+from app.core.principals import PrincipalCache, principal_cache
+from app.core.snapshot import WarmStateSnapshot
+from app.models.models import User
+
+
+@pytest.fixture
+def user(db):
+    name = f"warm-{uuid.uuid4().hex[:8]}"
+    user = User(email=f"{name}@example.com", username=name, hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def warnings(monkeypatch):
+    """Snapshot warnings; background threads of the app share the logger."""
+    messages = []
+
+    def warning(msg, *args):
+        if "warm state snapshot" in msg:
+            messages.append(msg % args)
+
+    monkeypatch.setattr(snapshot.logger, "warning", warning)
+    return messages
+
+
+def test_cached_users_survive_a_restart(db, tmp_path, user):
+    principal_cache.get(db, user.id)
+    warm = WarmStateSnapshot(str(tmp_path / "warm.snapshot"))
+    warm.write()
+
+    principal_cache.restore(None, [])
+    assert warm.restore()
+    watermark, users = principal_cache.export()
+    assert watermark is not None
+    assert any(values["id"] == user.id and values["username"] == user.username for values in users)
+
+
+def test_corrupt_snapshot_is_ignored(db, tmp_path, warnings):
+    path = tmp_path / "warm.snapshot"
+    WarmStateSnapshot(str(path)).write()
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert not WarmStateSnapshot(str(path)).restore()
+    assert warnings == [f"Ignoring corrupt warm state snapshot {path}"]
+
+
+def test_missing_snapshot_is_not_restored(tmp_path, warnings):
+    assert not WarmStateSnapshot(str(tmp_path / "missing.snapshot")).restore()
+    assert warnings == []
+
+
+def test_change_committed_after_a_later_stamp_reaches_the_cache(db, user):
+    cache = PrincipalCache(refresh_interval_seconds=0.0)
+    assert cache.get(db, user.id).is_active
+    latest = db.query(User.updated_at).order_by(User.updated_at.desc()).limit(1).scalar()
+
+    # Stamped before the latest change seen, as by a transaction that committed late
+    db.execute(update(User).where(User.id == user.id).values(
+        is_active=False, updated_at=latest - timedelta(seconds=1)
+    ))
+    db.commit()
+    db.expire_all()
+    assert not cache.get(db, user.id).is_active
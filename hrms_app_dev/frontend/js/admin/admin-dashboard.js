@@ -20,15 +20,7 @@ class DashboardService {
             }
             
             const stats = await response.json();
-            
-            // Update UI with stats
-            document.getElementById('total-users').textContent = stats.users.total;
-            document.getElementById('active-users').textContent = `${stats.users.active} active`;
-            document.getElementById('admin-users').textContent = `${stats.users.admins} admins`;
-            document.getElementById('total-offices').textContent = stats.offices.total;
-            document.getElementById('today-attendance').textContent = stats.attendance.today.home + stats.attendance.today.office;
-            document.getElementById('active-logins').textContent = stats.logins.active;
-            document.getElementById('today-logins').textContent = `${stats.logins.today} today`;
+            DashboardService.renderStats(stats);
             
             return stats;
         } catch (error) {
@@ -37,6 +29,21 @@ class DashboardService {
         }
     }
 
+    /**
+     * Update the stat cards
+     * @param {Object} stats - Dashboard statistics
+     */
+    static renderStats(stats) {
+        DashboardService.stats = stats;
+        document.getElementById('total-users').textContent = stats.users.total;
+        document.getElementById('active-users').textContent = `${stats.users.active} active`;
+        document.getElementById('admin-users').textContent = `${stats.users.admins} admins`;
+        document.getElementById('total-offices').textContent = stats.offices.total;
+        document.getElementById('today-attendance').textContent = stats.attendance.today.home + stats.attendance.today.office;
+        document.getElementById('active-logins').textContent = stats.logins.active;
+        document.getElementById('today-logins').textContent = `${stats.logins.today} today`;
+    }
+
     /**
      * Load recent activities
      */
@@ -126,11 +133,170 @@ class DashboardService {
         }
     }
 
+    /**
+     * Add an activity to the top of the recent activity table
+     * @param {Object} activity - Activity with username, type, time and details
+     */
+    static prependActivity(activity) {
+        const tableBody = document.getElementById('recent-activity-body');
+        const row = document.createElement('tr');
+        [
+            activity.username,
+            activity.type === 'login' ? 'Login' : 'Attendance',
+            formatTime(activity.time),
+            activity.details
+        ].forEach(text => {
+            const cell = document.createElement('td');
+            cell.textContent = text;
+            row.appendChild(cell);
+        });
+        tableBody.insertBefore(row, tableBody.firstChild);
+        
+        while (tableBody.rows.length > 10) {
+            tableBody.deleteRow(-1);
+        }
+    }
+
+    /**
+     * Apply one live feed event to the dashboard
+     * @param {string} type - Event type
+     * @param {Object} data - Event data
+     */
+    static handleLiveEvent(type, data) {
+        if (type === 'snapshot') {
+            DashboardService.renderStats(data);
+            return;
+        }
+        
+        // Apply counter changes, e.g. {"logins.active": 1}
+        if (DashboardService.stats) {
+            Object.entries(data.deltas || {}).forEach(([path, delta]) => {
+                const keys = path.split('.');
+                const last = keys.pop();
+                const target = keys.reduce((node, key) => node && node[key], DashboardService.stats);
+                if (target && typeof target[last] === 'number') {
+                    target[last] += delta;
+                }
+            });
+            DashboardService.renderStats(DashboardService.stats);
+        }
+        
+        const details = {
+            login: 'Currently logged in',
+            logout: 'Logged out',
+            check_in: 'Currently checked in',
+            check_out: data.auto ? 'Checked out automatically' : 'Checked out'
+        };
+        if (!(type in details)) {
+            return;
+        }
+        DashboardService.prependActivity({
+            username: data.username || `User #${data.user_id}`,
+            type: type === 'login' || type === 'logout' ? 'login' : 'attendance',
+            time: new Date(data.time),
+            details: details[type]
+        });
+    }
+
+    /**
+     * Stream live events instead of polling the dashboard endpoints.
+     * Uses fetch rather than EventSource so the token stays in the
+     * Authorization header; reconnects with backoff until stopped.
+     */
+    static async startLiveFeed() {
+        if (DashboardService.liveFeed) {
+            return;
+        }
+        const controller = new AbortController();
+        DashboardService.liveFeed = controller;
+        let retryDelay = 1000;
+        
+        while (!controller.signal.aborted) {
+            try {
+                const response = await fetch(`${CONFIG.API_URL}/admin/live`, {
+                    method: 'GET',
+                    headers: {
+                        'Authorization': `Bearer ${AuthService.getToken()}`,
+                        'Accept': 'text/event-stream'
+                    },
+                    signal: controller.signal
+                });
+                
+                if (response.status === 401 || response.status === 403) {
+                    break;
+                }
+                if (!response.ok || !response.body) {
+                    throw new Error(`Live feed unavailable (${response.status})`);
+                }
+                
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+                retryDelay = 1000;
+                
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    
+                    // Messages are separated by a blank line
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        const message = buffer.slice(0, boundary);
+                        buffer = buffer.slice(boundary + 2);
+                        
+                        let type = 'message';
+                        const dataLines = [];
+                        message.split('\n').forEach(line => {
+                            if (line.startsWith('event:')) {
+                                type = line.slice(6).trim();
+                            } else if (line.startsWith('data:')) {
+                                dataLines.push(line.slice(5).trim());
+                            }
+                        });
+                        if (dataLines.length) {
+                            DashboardService.handleLiveEvent(type, JSON.parse(dataLines.join('\n')));
+                        }
+                    }
+                }
+            } catch (error) {
+                if (controller.signal.aborted) {
+                    break;
+                }
+                console.warn('Live feed disconnected:', error.message);
+            }
+            
+            await new Promise(resolve => setTimeout(resolve, retryDelay));
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        }
+        
+        if (DashboardService.liveFeed === controller) {
+            DashboardService.liveFeed = null;
+        }
+    }
+
+    /**
+     * Stop the live feed, e.g. when leaving the dashboard
+     */
+    static stopLiveFeed() {
+        if (DashboardService.liveFeed) {
+            DashboardService.liveFeed.abort();
+            DashboardService.liveFeed = null;
+        }
+    }
+
     /**
      * Initialize dashboard
      */
     static async initDashboard() {
         await DashboardService.loadDashboardStats();
         await DashboardService.loadRecentActivity();
+        // Runs in the background and keeps the dashboard current from here on
+        DashboardService.startLiveFeed();
     }
-}
\ No newline at end of file
+}
+
+DashboardService.stats = null;
+DashboardService.liveFeed = null;
\ No newline at end of file
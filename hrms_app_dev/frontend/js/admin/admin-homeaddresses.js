@@ -287,7 +287,7 @@ class HomeAddressService {
         marker.bindPopup(`
             <b>${homeAddress.name}</b><br>
             ${homeAddress.address}<br>
-            Radius: ${CONFIG.GEOFENCE_HOME_RADIUS_METERS}m<br>
+            Radius: ${homeAddress.radius || CONFIG.GEOFENCE_HOME_RADIUS_METERS}m<br>
             <button class="popup-edit-home-address" data-id="${homeAddress.id}">Edit</button>
         `);
         
@@ -297,7 +297,7 @@ class HomeAddressService {
         
         // Create geofence circle
         const circle = L.circle([homeAddress.latitude, homeAddress.longitude], {
-            radius: CONFIG.GEOFENCE_HOME_RADIUS_METERS,
+            radius: homeAddress.radius || CONFIG.GEOFENCE_HOME_RADIUS_METERS,
             fillColor: CONFIG.GEOFENCE_COLOR,
             fillOpacity: CONFIG.GEOFENCE_OPACITY,
             color: CONFIG.GEOFENCE_COLOR,
@@ -394,8 +394,9 @@ class HomeAddressService {
         document.getElementById('home-address-form').reset();
         document.getElementById('home-address-id').value = '';
         
-        // Set default radius
-        document.getElementById('home-address-radius').value = CONFIG.GEOFENCE_HOME_RADIUS_METERS;
+        // Empty radius means the default
+        document.getElementById('home-address-radius').value = '';
+        document.getElementById('home-address-radius').placeholder = `Default (${CONFIG.GEOFENCE_HOME_RADIUS_METERS})`;
         
         // Update modal title
         document.getElementById('home-address-modal-title').textContent = 'Add Home Address';
@@ -432,6 +433,8 @@ class HomeAddressService {
             document.getElementById('home-address-latitude').value = homeAddress.latitude;
             document.getElementById('home-address-longitude').value = homeAddress.longitude;
             document.getElementById('home-address-is-current').value = homeAddress.is_current;
+            document.getElementById('home-address-radius').value = homeAddress.radius ?? '';
+            document.getElementById('home-address-radius').placeholder = `Default (${CONFIG.GEOFENCE_HOME_RADIUS_METERS})`;
 
             // Update modal title
             document.getElementById('home-address-modal-title').textContent = 'Edit Home Address';
@@ -474,6 +477,7 @@ class HomeAddressService {
             latitude: parseFloat(document.getElementById('home-address-latitude').value),
             longitude: parseFloat(document.getElementById('home-address-longitude').value),
             is_current: document.getElementById('home-address-is-current').value,
+            radius: parseFloat(document.getElementById('home-address-radius').value) || null,
         };
         
         try {
@@ -66,6 +66,11 @@ function initNavigation() {
             // Clear action buttons
             document.getElementById('section-actions').innerHTML = '';
             
+            // The live feed only runs while the dashboard is shown
+            if (sectionId !== 'dashboard') {
+                DashboardService.stopLiveFeed();
+            }
+            
             // Initialize section content
             switch (sectionId) {
                 case 'dashboard':
@@ -85,6 +85,9 @@ async function initApp() {
  */
 async function loadAttendanceData() {
     try {
+        // Send check-ins and check-outs queued while offline before showing the status
+        await AttendanceService.syncOfflineEvents();
+        
         // Get current attendance status
         const status = await AttendanceService.getCurrentStatus();
         AttendanceService.updateStatusUI(status);
@@ -70,6 +70,53 @@ class AttendanceService {
         }
     }
 
+    /**
+     * Send an attendance write, retrying with the same idempotency key
+     *
+     * Network errors, conflicts with a concurrent request and server errors
+     * are retried; the server answers a retry of a write it already applied
+     * with the original record.
+     * @param {string} path - Path of the endpoint below /attendance
+     * @param {Object} body - The request body
+     * @param {string} idempotencyKey - Key of the user action, the same for every attempt
+     * @returns {Promise<Object>} The attendance record
+     */
+    static async sendWrite(path, body, idempotencyKey) {
+        for (let attempt = 1; ; attempt++) {
+            let response;
+            try {
+                response = await fetch(`${CONFIG.API_URL}/attendance/${path}`, {
+                    method: 'POST',
+                    headers: {
+                        'Authorization': `Bearer ${AuthService.getToken()}`,
+                        'Content-Type': 'application/json',
+                        'Idempotency-Key': idempotencyKey
+                    },
+                    body: JSON.stringify(body)
+                });
+            } catch (error) {
+                // fetch only rejects when the request did not get a response
+                if (attempt >= CONFIG.ATTENDANCE_RETRY_ATTEMPTS) {
+                    const offlineError = new Error('You appear to be offline');
+                    offlineError.offline = true;
+                    throw offlineError;
+                }
+                await new Promise(resolve => setTimeout(resolve, CONFIG.ATTENDANCE_RETRY_DELAY_MS * attempt));
+                continue;
+            }
+
+            if (response.ok) {
+                return await response.json();
+            }
+            if ((response.status === 409 || response.status >= 500) && attempt < CONFIG.ATTENDANCE_RETRY_ATTEMPTS) {
+                await new Promise(resolve => setTimeout(resolve, CONFIG.ATTENDANCE_RETRY_DELAY_MS * attempt));
+                continue;
+            }
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || 'Request failed');
+        }
+    }
+
     /**
      * Check in at the current location
      * @param {number} locationType - The location type (home or office)
@@ -77,38 +124,27 @@ class AttendanceService {
      * @param {number} officeId - The office ID
      * @param {number} latitude - The latitude
      * @param {number} longitude - The longitude
+     * @param {string} idempotencyKey - Key of the check-in action, reused when it is retried
      * @returns {Promise<Object>} The attendance record
      */
-    static async checkIn(locationType, homeAddressId, officeId, latitude, longitude) {
+    static async checkIn(locationType, homeAddressId, officeId, latitude, longitude, idempotencyKey) {
         try {
             if (!AuthService.isAuthenticated()) {
                 throw new Error('You must be logged in');
             }
             
-            const response = await fetch(`${CONFIG.API_URL}/attendance/check-in`, {
-                method: 'POST',
-                headers: {
-                    'Authorization': `Bearer ${AuthService.getToken()}`,
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    location_type: locationType,
-                    office_id: officeId,
-                    latitude: latitude,
-                    longitude: longitude,
-                    home_address_id: homeAddressId,
-                })
-            });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Check-in failed');
-            }
-            
-            return await response.json();
+            return await AttendanceService.sendWrite('check-in', {
+                location_type: locationType,
+                office_id: officeId,
+                latitude: latitude,
+                longitude: longitude,
+                home_address_id: homeAddressId,
+            }, idempotencyKey);
         } catch (error) {
             console.error('Check-in error:', error);
-            showError(error.message);
+            if (!error.offline) {
+                showError(error.message);
+            }
             throw error;
         }
     }
@@ -117,37 +153,89 @@ class AttendanceService {
      * Check out from the current location
      * @param {number} latitude - The latitude
      * @param {number} longitude - The longitude
+     * @param {string} idempotencyKey - Key of the check-out action, reused when it is retried
      * @returns {Promise<Object>} The attendance record
      */
-    static async checkOut(latitude, longitude) {
+    static async checkOut(latitude, longitude, idempotencyKey) {
         try {
             if (!AuthService.isAuthenticated()) {
                 throw new Error('You must be logged in');
             }
             
-            const response = await fetch(`${CONFIG.API_URL}/attendance/check-out`, {
+            return await AttendanceService.sendWrite('check-out', { latitude, longitude }, idempotencyKey);
+        } catch (error) {
+            console.error('Check-out error:', error);
+            if (!error.offline) {
+                showError(error.message);
+            }
+            throw error;
+        }
+    }
+
+    /**
+     * Get the attendance events waiting to be synced
+     * @returns {Array<Object>} Queued events, oldest first
+     */
+    static getOfflineQueue() {
+        return JSON.parse(localStorage.getItem(CONFIG.STORAGE_SYNC_QUEUE_KEY) || '[]');
+    }
+
+    /**
+     * Queue an attendance event that could not be sent, to sync it later
+     * @param {Object} event - Event in the format of /attendance/sync, with the key of its action
+     */
+    static queueOfflineEvent(event) {
+        const queue = AttendanceService.getOfflineQueue();
+        if (!queue.some(queued => queued.idempotency_key === event.idempotency_key)) {
+            queue.push(event);
+            localStorage.setItem(CONFIG.STORAGE_SYNC_QUEUE_KEY, JSON.stringify(queue));
+        }
+    }
+
+    /**
+     * Send the queued offline events to /attendance/sync
+     *
+     * Events keep the idempotency keys of their actions, so events the server
+     * already applied, including ones whose first attempt did reach it, are
+     * reported as duplicates instead of being applied twice. Events are only
+     * removed from the queue once the server has answered for them.
+     * @returns {Promise<Array>} Results of the synced events, empty if nothing was sent
+     */
+    static async syncOfflineEvents() {
+        const queue = AttendanceService.getOfflineQueue();
+        if (queue.length === 0 || !AuthService.isAuthenticated()) {
+            return [];
+        }
+
+        const batch = queue.slice(0, CONFIG.ATTENDANCE_SYNC_MAX_EVENTS);
+        let response;
+        try {
+            response = await fetch(`${CONFIG.API_URL}/attendance/sync`, {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${AuthService.getToken()}`,
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({
-                    latitude,
-                    longitude
-                })
+                body: JSON.stringify({ events: batch })
             });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Check-out failed');
-            }
-            
-            return await response.json();
         } catch (error) {
-            console.error('Check-out error:', error);
-            showError(error.message);
-            throw error;
+            console.warn('Offline events not synced yet:', error);
+            return [];
         }
+        if (!response.ok) {
+            console.error('Offline sync failed with status', response.status);
+            return [];
+        }
+
+        const results = await response.json();
+        const answered = new Set(results.map(result => result.idempotency_key));
+        const remaining = AttendanceService.getOfflineQueue().filter(event => !answered.has(event.idempotency_key));
+        localStorage.setItem(CONFIG.STORAGE_SYNC_QUEUE_KEY, JSON.stringify(remaining));
+
+        results
+            .filter(result => result.status === 'rejected')
+            .forEach(result => console.warn(`Offline ${result.event_type} rejected: ${result.detail}`));
+        return results;
     }
 
     /**
@@ -267,9 +355,25 @@ document.addEventListener('DOMContentLoaded', () => {
             const officeId = placeType === 'office' ? placeId : 0;
             const homeAddressId = placeType === 'home' ? placeId : 0;
 
+            // One key per check-in action, shared by its retries and by its offline sync
+            const idempotencyKey = generateIdempotencyKey();
             try {
-                await AttendanceService.checkIn(placeType, homeAddressId, officeId, latitude, longitude);
+                await AttendanceService.checkIn(placeType, homeAddressId, officeId, latitude, longitude, idempotencyKey);
             } catch (error) {
+                if (error.offline) {
+                    AttendanceService.queueOfflineEvent({
+                        event_type: 'check_in',
+                        idempotency_key: idempotencyKey,
+                        timestamp: new Date().toISOString(),
+                        latitude,
+                        longitude,
+                        location_type: placeType,
+                        office_id: officeId || null,
+                        home_address_id: homeAddressId || null,
+                    });
+                    showError('You are offline. The check-in will be sent when you are back online.');
+                    return;
+                }
                 console.error('Error checking in: %s', error);
                 showError('Failed to check in');
                 return;
@@ -300,8 +404,24 @@ document.addEventListener('DOMContentLoaded', () => {
             
             const { latitude, longitude } = locationService.currentPosition.coords;
             
-            // Check out
-            await AttendanceService.checkOut(latitude, longitude);
+            // Check out, with one key for the action and its retries
+            const idempotencyKey = generateIdempotencyKey();
+            try {
+                await AttendanceService.checkOut(latitude, longitude, idempotencyKey);
+            } catch (error) {
+                if (!error.offline) {
+                    throw error;
+                }
+                AttendanceService.queueOfflineEvent({
+                    event_type: 'check_out',
+                    idempotency_key: idempotencyKey,
+                    timestamp: new Date().toISOString(),
+                    latitude,
+                    longitude,
+                });
+                showError('You are offline. The check-out will be sent when you are back online.');
+                return;
+            }
             
             // Update UI
             AttendanceService.updateStatusUI(null);
@@ -315,4 +435,12 @@ document.addEventListener('DOMContentLoaded', () => {
             showError(error.message);
         }
     });
-});
\ No newline at end of file
+
+    // Send events queued while offline as soon as the connection is back
+    window.addEventListener('online', async () => {
+        const results = await AttendanceService.syncOfflineEvents();
+        if (results.length > 0) {
+            await loadAttendanceData();
+        }
+    });
+});
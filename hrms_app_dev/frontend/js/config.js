@@ -14,6 +14,12 @@ const CONFIG = {
     // Local storage keys
     STORAGE_TOKEN_KEY: 'attendance_token',
     STORAGE_USER_KEY: 'attendance_user',
+    STORAGE_SYNC_QUEUE_KEY: 'attendance_sync_queue',  // Check-ins and check-outs made while offline
+    
+    // Attendance writes
+    ATTENDANCE_RETRY_ATTEMPTS: 3,  // Attempts per check-in or check-out, all with the same idempotency key
+    ATTENDANCE_RETRY_DELAY_MS: 1000,  // Grows with each attempt
+    ATTENDANCE_SYNC_MAX_EVENTS: 50,  // Offline events per sync request, at most the backend's limit
     
     // Geofence settings
     GEOFENCE_RADIUS_METERS: 150,
@@ -24,7 +30,8 @@ const CONFIG = {
     HOME_ADDRESS_MARKER_COLOR: 'green',
     GEOFENCE_COLOR: 'green',
     GEOFENCE_OPACITY: 0.2,
-    GEOFENCE_HOME_RADIUS_METERS: 200,
+    GEOFENCE_HOME_RADIUS_METERS: 500,  // Default of addresses without a radius of their own
+    NEAREST_OFFICES_COUNT: 5,  // Offices reported by location checks, besides any containing the location
 };
 
 /**
@@ -67,6 +74,17 @@ function calculateDuration(startDate, endDate) {
     return `${hours}h ${minutes}m`;
 }
 
+/**
+ * Generate a unique key for deduplicating retried attendance requests
+ * @returns {string} Random idempotency key
+ */
+function generateIdempotencyKey() {
+    if (window.crypto && window.crypto.randomUUID) {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 /**
  * Display an error message to the user
  * @param {string} message - The error message to display
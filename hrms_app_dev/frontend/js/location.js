@@ -638,7 +638,7 @@ class LocationService {
         this.logger.debug(`Added home address marker for ${address.name} at ${address.latitude}, ${address.longitude}`);
         // Create geofence circle
         const circle = L.circle([address.latitude, address.longitude], {
-            radius: CONFIG.GEOFENCE_HOME_RADIUS_METERS,
+            radius: address.radius || CONFIG.GEOFENCE_HOME_RADIUS_METERS,
             fillColor: CONFIG.GEOFENCE_COLOR,
             fillOpacity: CONFIG.GEOFENCE_OPACITY,
             color: CONFIG.GEOFENCE_COLOR,
@@ -719,7 +719,8 @@ class LocationService {
                     latitude,
                     longitude,
                     office_id, 
-                    home_address_id
+                    home_address_id,
+                    k: CONFIG.NEAREST_OFFICES_COUNT
                 })
             });
             